@@ -2,9 +2,14 @@ import streamlit as st
 import pandas as pd
 import time
 import os
+import functools
 import config
 import data_loader
+import data_manifest
+import dataset_registry
 import heuristics
+import shared_cache
+import coverage_cache
 import report_utils
 import ui_config
 import ui_components
@@ -26,33 +31,34 @@ def main():
     st.markdown(explanation_html, unsafe_allow_html=True)
 
     # --- VERIFICAÇÃO INICIAL DE ARQUIVOS ---
-    # Verificar e baixar arquivos essenciais antes de carregar a interface
-    files_to_check = [
-        ("Dados de Demanda", config.DEMAND_FILE),
-        ("Campi Existentes", config.EXISTING_SITES_FILE),
-        ("Matriz de Distâncias", config.DISTANCES_FILE),
-        ("Coordenadas", config.COORDS_FILE)
-    ]
+    # Verificar (manifesto: tamanho + hash, uma vez por processo) e baixar os arquivos
+    # essenciais antes de carregar a interface. Nos reruns seguintes resta um os.stat por arquivo.
+    files_to_check = [config.DEMAND_FILE, config.EXISTING_SITES_FILE, config.DISTANCES_FILE, config.COORDS_FILE]
+    files_to_check += [os.path.join(config.DATA_DIR, f"BR_Municipios_2024{ext}")
+                       for ext in ('.shp', '.shx', '.dbf', '.prj', '.cpg')]
     
     # Usar um container vazio para a barra de progresso que desaparecerá após a conclusão
     startup_placeholder = st.empty()
     
-    # Verificar se precisamos fazer o check (apenas se algum arquivo faltar)
-    needs_check = any(not os.path.exists(f[1]) or data_loader.is_lfs_pointer(f[1]) for f in files_to_check)
+    # Verificar se precisamos baixar algo (apenas se algum arquivo faltar ou estiver incompleto)
+    pending = data_manifest.pending_files(files_to_check)
     
-    if needs_check:
+    if pending:
         with startup_placeholder.container():
             st.info("Verificando arquivos de dados necessários para o primeiro uso...")
             progress_bar = st.progress(0)
             status_text = st.empty()
-            
-            for i, (name, filepath) in enumerate(files_to_check):
-                status_text.text(f"Verificando/Baixando: {name}...")
-                success = data_loader.check_and_debug_path(filepath)
-                if not success:
-                    st.error(f"Falha ao baixar {name}. Verifique sua conexão ou os IDs do Drive.")
-                    st.stop()
-                progress_bar.progress((i + 1) / len(files_to_check))
+
+            def fetch_progress(done, total, name):
+                if name:
+                    status_text.text(f"Verificando/Baixando: {name}...")
+                progress_bar.progress(done / total)
+
+            failed = data_manifest.ensure_data(pending, progress_callback=fetch_progress)
+            if failed:
+                names = ", ".join(os.path.basename(f) for f in failed)
+                st.error(f"Falha ao baixar {names}. Verifique sua conexão ou os IDs do Drive.")
+                st.stop()
             
             time.sleep(0.5) # Breve pausa para ver o 100%
             
@@ -239,31 +245,10 @@ def main():
             # --- Carregar Dados para Pré-visualização e Seleção de Colunas ---
             df_preview = None
             try:
-                # Determinar fonte
-                if uploaded_demand is not None:
-                    # Reiniciar ponteiro para o início por precaução
-                    uploaded_demand.seek(0)
-                    if uploaded_demand.name.lower().endswith('.parquet'):
-                        df_preview = pd.read_parquet(uploaded_demand)
-                    else:
-                        try:
-                            df_preview = pd.read_csv(uploaded_demand, sep=None, engine='python', encoding='utf-8', dtype=str)
-                        except UnicodeDecodeError:
-                            uploaded_demand.seek(0)
-                            df_preview = pd.read_csv(uploaded_demand, sep=None, engine='python', encoding='latin1', dtype=str)
-                elif config.DEMAND_FILE:
-                    # Garantir que o arquivo padrão exista
-                    # A verificação inicial já garante isso, mas mantemos o check simples
-                    file_ready = True
-                    
-                    if file_ready:
-                        if config.DEMAND_FILE.lower().endswith('.parquet'):
-                            df_preview = pd.read_parquet(config.DEMAND_FILE)
-                        else:
-                            try:
-                                df_preview = pd.read_csv(config.DEMAND_FILE, sep=None, engine='python', encoding='utf-8', dtype=str)
-                            except UnicodeDecodeError:
-                                df_preview = pd.read_csv(config.DEMAND_FILE, sep=None, engine='python', encoding='latin1', dtype=str)
+                # Determinar fonte (upload ou arquivo padrão, garantido pela inicialização)
+                # Registrada uma vez por conteúdo na sessão; reutilizada por load_demand e pelo mapa
+                if demand_file:
+                    df_preview = dataset_registry.get_frame(demand_file)
                 
                 if df_preview is not None:
                     # 3. Seleção de Coluna (Menu Suspenso)
@@ -305,75 +290,26 @@ def main():
             st.markdown("**Baixar Template de Demanda**")
             st.caption("Baixe um arquivo CSV com os municípios pré-listados para preencher sua própria demanda.")
             
-            @st.cache_data
-            def get_template_csv():
-
-                source_file = config.DEMAND_FILE
-                               
-                # Garantir existência antes de gerar template
-                if not os.path.exists(source_file) or data_loader.is_lfs_pointer(source_file):
-                      data_loader.check_and_debug_path(source_file)
-
-                if not os.path.exists(source_file):
-                    return None, f"Arquivo base não encontrado: {source_file}"
-
-                try:
-                    # Tentar ler com engine Python para detectar separador e lidar melhor com encoding
-                    if source_file.lower().endswith('.parquet'):
-                        df_template = pd.read_parquet(source_file)
-                    else:
-                        # Tentar UTF-8 primeiro (padrão para arquivos modernos)
-                        try:
-                            df_template = pd.read_csv(source_file, sep=None, engine='python', encoding='utf-8', dtype=str)
-                        except UnicodeDecodeError:
-                            # Fallback para latin1 se UTF-8 falhar
-                            df_template = pd.read_csv(source_file, sep=None, engine='python', encoding='latin1', dtype=str)
-                    
-                    # 1. Encontrar Coluna de ID
-                    id_candidates = ['id', 'ID', 'Id', 'Cód.', 'Cod.', 'Código', 'Codigo', 'Code']
-                    id_col = None
-                    for cand in id_candidates:
-                        if cand in df_template.columns:
-                            id_col = cand
-                            break
-                    
-                    # 2. Encontrar Colunas de Nome e UF
-                    import unicodedata
-                    def normalize(s):
-                        return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn').lower()
-                    
-                    cols_map = {normalize(c): c for c in df_template.columns}
-                    
-                    name_col = cols_map.get('municipio') or cols_map.get('nome')
-                    uf_col = cols_map.get('uf')
-                    
-                    if id_col and name_col:
-                        # Criar dataframe limpo
-                        new_df = df_template[[id_col, name_col]].copy()
-                        if uf_col:
-                            new_df['UF'] = df_template[uf_col]
-                        
-                        # Renomear para padrão
-                        new_df = new_df.rename(columns={id_col: 'id', name_col: 'Municipio'})
-                        new_df['demanda'] = "" # Coluna vazia
-                        
-                        return new_df.to_csv(index=False, sep=';', encoding='utf-8'), None
-                    else:
-                        return None, f"Colunas obrigatórias não encontradas no arquivo base. (ID: {id_col}, Nome: {name_col})"
-                except Exception as e:
-                    return None, str(e)
+            # Apenas valida as colunas aqui; o CSV só é gerado no clique (data=callable)
+            template_error = None
+            try:
+                df_template_base = dataset_registry.get_frame(config.DEMAND_FILE)
+                id_col, name_col, _ = dataset_registry.template_columns(df_template_base)
+                if not (id_col and name_col):
+                    template_error = f"Colunas obrigatórias não encontradas no arquivo base. (ID: {id_col}, Nome: {name_col})"
+            except Exception as e:
+                template_error = str(e)
 
-            template_csv, error_msg = get_template_csv()
-            if template_csv:
+            if template_error is None:
                 st.download_button(
                     label="📥 Baixar Template (CSV)",
-                    data=template_csv,
+                    data=functools.partial(dataset_registry.template_csv, df_template_base, 'demanda', ""),
                     file_name="template_demanda.csv",
                     mime="text/csv",
                     help="Clique para baixar o arquivo base."
                 )
             else:
-                st.warning(f"Não foi possível gerar o template: {error_msg}")
+                st.warning(f"Não foi possível gerar o template: {template_error}")
 
             st.markdown("---")
             st.subheader("2. Cidades já Cobertas (Cobertura Inicial)")
@@ -412,28 +348,9 @@ def main():
                 # --- Pré-visualização e Validação para Campi Existentes ---
                 df_preview_existing = None
                 try:
-                    if uploaded_existing is not None:
-                        uploaded_existing.seek(0)
-                        if uploaded_existing.name.lower().endswith('.parquet'):
-                            df_preview_existing = pd.read_parquet(uploaded_existing)
-                        else:
-                            try:
-                                df_preview_existing = pd.read_csv(uploaded_existing, sep=None, engine='python', encoding='utf-8', dtype=str)
-                            except UnicodeDecodeError:
-                                uploaded_existing.seek(0)
-                                df_preview_existing = pd.read_csv(uploaded_existing, sep=None, engine='python', encoding='latin1', dtype=str)
-                    elif config.EXISTING_SITES_FILE:
-                         # Arquivo garantido pela inicialização
-                         file_ready_exist = True
-
-                         if file_ready_exist:
-                            if config.EXISTING_SITES_FILE.lower().endswith('.parquet'):
-                                df_preview_existing = pd.read_parquet(config.EXISTING_SITES_FILE)
-                            else:
-                                try:
-                                    df_preview_existing = pd.read_csv(config.EXISTING_SITES_FILE, sep=';', engine='python', encoding='utf-8', dtype=str)
-                                except:
-                                    df_preview_existing = pd.read_csv(config.EXISTING_SITES_FILE, sep=None, engine='python', encoding='latin1', dtype=str)
+                    # Upload ou arquivo padrão (garantido pela inicialização), leitura cacheada
+                    if existing_sites_file:
+                        df_preview_existing = dataset_registry.get_frame(existing_sites_file)
                             
                     if df_preview_existing is not None:
                         with st.expander("Pré-visualizar Dados"):
@@ -455,68 +372,20 @@ def main():
                 # Download de Modelo
                 st.markdown("##### Baixar Modelo")
 
-                template_csv_content = None
-                
-                template_csv_content = None
-                             
-                source_file = config.DEMAND_FILE
-                if True: # Tentar carregar sempre
-                    # Garantir download da fonte se não existir
-                    if not os.path.exists(source_file) or data_loader.is_lfs_pointer(source_file):
-                          data_loader.check_and_debug_path(source_file)
-
-                    if os.path.exists(source_file):
-                        try:
-                            if source_file.lower().endswith('.parquet'):
-                                df_base = pd.read_parquet(source_file)
-                            else:
-                                try:
-                                    df_base = pd.read_csv(source_file, sep=None, engine='python', encoding='utf-8', dtype=str)
-                                except UnicodeDecodeError:
-                                    df_base = pd.read_csv(source_file, sep=None, engine='python', encoding='latin1', dtype=str)
-                        
-                            # Encontrar colunas
-                            id_col = next((c for c in df_base.columns if c in ['id', 'ID', 'Id', 'Cód.', 'Cod.', 'Código', 'Codigo', 'Code']), None)
-                            
-                            # Normalizar para busca por nome
-                            import unicodedata
-                            def normalize(s):
-                                return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn').lower()
-                            cols_map = {normalize(c): c for c in df_base.columns}
-                            name_col = cols_map.get('municipio') or cols_map.get('nome')
-                            uf_col = cols_map.get('uf')
-                            
-                            if id_col and name_col:
-                                df_template_existing = df_base[[id_col, name_col]].copy()
-                                if uf_col:
-                                    df_template_existing['UF'] = df_base[uf_col]
-                                
-                                df_template_existing = df_template_existing.rename(columns={id_col: 'id', name_col: 'Municipio'})
-                                df_template_existing['possui_campus'] = "N" # Default to No
-                                
-                                csv_template = df_template_existing.to_csv(index=False, sep=';', encoding='utf-8')
-                            else:
-                                 # Fallback se colunas não forem encontradas
-                                 template_data = {'id': [], 'possui_campus': []}
-                                 csv_template = pd.DataFrame(template_data).to_csv(index=False, sep=';').encode('utf-8')
-                        except Exception as e:
-                             # Fallback em caso de erro
-                             template_data = {'id': [], 'possui_campus': []}
-                             csv_template = pd.DataFrame(template_data).to_csv(index=False, sep=';').encode('utf-8')
-                else:
-                    # Fallback se arquivo não encontrado
-                    template_data = {
+                # Derivado da tabela de demanda já registrada; gerado apenas no clique
+                try:
+                    df_base = dataset_registry.get_frame(config.DEMAND_FILE)
+                except Exception:
+                    # Fallback se o arquivo base não puder ser lido
+                    df_base = pd.DataFrame({
                         'id': [1100205, 1302603, 5300108],
                         'nome': ['Porto Velho', 'Manaus', 'Brasília'],
-                        'uf': ['RO', 'AM', 'DF'],
-                        'possui_campus': ['S', 'N', 'S']
-                    }
-                    df_template_existing = pd.DataFrame(template_data)
-                    csv_template = df_template_existing.to_csv(index=False, sep=';').encode('utf-8')
+                        'uf': ['RO', 'AM', 'DF']
+                    })
                 
                 st.download_button(
                     label="📥 Baixar Template (CSV)",
-                    data=csv_template,
+                    data=functools.partial(dataset_registry.template_csv, df_base, 'possui_campus', "N"),
                     file_name="template_cobertura_inicial.csv",
                     mime="text/csv",
                     help="Baixe um modelo de arquivo para preencher com os seus dados."
@@ -585,9 +454,6 @@ def calculate_optimization(p, radius, max_time, use_km, target_uf,
     
     # 1. Carregar Dados
     with st.status("Carregando Dados...", expanded=True) as status:
-        st.write("Carregando distâncias...")
-        dist_df = data_loader.load_distances(config.DISTANCES_FILE, uf_filter=target_uf)
-        
         existing_site_ids = set()
         if existing_sites_file:
             st.write("Carregando campi existentes...")
@@ -612,24 +478,15 @@ def calculate_optimization(p, radius, max_time, use_km, target_uf,
     
     # Cobertura e Estruturas Esparsas
     with st.spinner("Preparando Estruturas de Dados (Sparse)..."):
-        # 1. Filtrar DF de Distância (Vetorizado)
-        relevant_origins = set(J) | existing_site_ids
-        mask_valid = dist_df['origem'].isin(relevant_origins) & dist_df['destino'].isin(I)
-        dist_filtered = dist_df[mask_valid].copy()
-        
-        if use_km:
-            dist_filtered = dist_filtered[dist_filtered['distancia'] <= radius]
-        else:
-            dist_filtered = dist_filtered[dist_filtered['tempo'] <= max_time]
-
-        # 2. Identificar Nós Pré-Cobertos
-        pre_covered = set(dist_filtered[dist_filtered['origem'].isin(existing_site_ids)]['destino'].unique())
-        
-        # 3. Construir Matriz Esparsa
-        sparse_structures = heuristics.build_sparse_matrix_from_df(
-            dist_filtered, demand_dict, J, I, radius, max_time, use_km, pre_covered
+        # Cenário repetido: estruturas vêm do cache em disco, sem ler as distâncias
+        sparse_structures, existing_structures = coverage_cache.get_coverage_structures(
+            config.DISTANCES_FILE, demand_dict, J, I, existing_site_ids,
+            target_uf, radius, max_time, use_km
         )
         cov_matrix, demand_vector, cand_to_idx, node_to_idx, initial_coverage = sparse_structures
+        # Inclui a auto-cobertura dos campi existentes (o município-sede conta como coberto),
+        # como no main.py e no mapa de cobertura da interface
+        pre_covered = coverage_cache.pre_covered_nodes(sparse_structures)
 
     # --- Execução das Heurísticas ---
     # Calcular Z Inicial
@@ -773,13 +630,27 @@ def calculate_optimization(p, radius, max_time, use_km, target_uf,
     # Pós-Otimização: Construir Mapa de Cobertura para UI (Apenas para Solução + Existentes)
     with st.spinner("Preparando visualização..."):
         ui_sites = set(s_vns) | existing_site_ids
-        ui_dist_df = dist_filtered[dist_filtered['origem'].isin(ui_sites)]
-        # Reconstruir dicionário para componentes de UI
-        coverage_map = ui_dist_df.groupby('origem')['destino'].apply(set).to_dict()
-        # Garantir auto-cobertura para lógica de UI
-        for s in ui_sites:
-            if s not in coverage_map: coverage_map[s] = set()
-            coverage_map[s].add(s)
+        # Reconstruir dicionário para componentes de UI (com auto-cobertura)
+        coverage_map = coverage_cache.site_coverage(ui_sites, sparse_structures, existing_structures)
+        # Mesma cobertura em forma esparsa, para o status vetorizado do mapa
+        coverage_matrix = coverage_cache.coverage_matrix(ui_sites, sparse_structures, existing_structures)
+
+        # Distâncias Local -> Local (campus mais próximo), sem limite de raio
+        site_dist_df = data_loader.load_distances(
+            config.DISTANCES_FILE, uf_filter=target_uf,
+            origins=s_vns, destinations=ui_sites
+        )
+
+        # Impressão digital do resultado (cenário, arquivos, parâmetros e solução):
+        # chave dos artefatos de mapas e relatórios no store compartilhado
+        fingerprint = shared_cache.digest(
+            coverage_cache.scenario_key(config.DISTANCES_FILE, demand_dict, existing_site_ids,
+                                        target_uf, radius, max_time, use_km),
+            [dataset_registry.content_key(f) if f else None for f in (demand_file, coords_file, existing_sites_file)],
+            demand_col, p, ls_max_iter, ls_strategy,
+            vns_max_iter, vns_k_max, vns_max_no_improv, vns_max_time, vns_ls_strategy,
+            sorted(int(site) for site in s_vns)
+        )
 
     # Limpar barras de progresso para evitar duplicação com render_results
     progress_placeholder.empty()
@@ -792,17 +663,20 @@ def calculate_optimization(p, radius, max_time, use_km, target_uf,
         'history_data': history_data,
         's_vns': s_vns,
         'existing_site_ids': existing_site_ids,
-        'dist_df': dist_df,
+        'dist_df': site_dist_df,
         'demand_dict': demand_dict,
         'names_dict': names_dict,
         'uf_dict': uf_dict,
         'coords_dict': coords_dict,
         'coverage_map': coverage_map,
+        'coverage_matrix': coverage_matrix,
         'pre_covered': pre_covered,
         'use_km': use_km,
+        'fingerprint': fingerprint,
         # Armazenar parâmetros de entrada para garantir consistência durante renderização
         'target_uf': target_uf,
         'demand_file': getattr(demand_file, 'name', str(demand_file)),
+        'demand_source': demand_file,
         'demand_col': demand_col,
         'p': p,
         'radius': radius,
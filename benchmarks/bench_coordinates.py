@@ -0,0 +1,109 @@
+"""
+Benchmark do carregamento de coordenadas: loader antigo (dict via iterrows) x CoordinateStore.
+
+Uso:
+    python benchmarks/bench_coordinates.py [arquivo_coordenadas] [--repeticoes N]
+
+Sem arquivo (ou se o arquivo nacional não estiver disponível, ex.: ponteiro Git LFS),
+usa uma tabela sintética com o mesmo número de municípios do Brasil.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import data_loader
+
+NUM_MUNICIPALITIES = 5570
+
+def legacy_coordinates(df):
+    """Montagem do dict {id: (lat, lon)} como no load_coordinates original."""
+    coords = {}
+    for _, row in df.iterrows():
+        try:
+            coords[int(row['id'])] = (float(row['latitude']), float(row['longitude']))
+        except (ValueError, KeyError):
+            continue
+    return coords
+
+def columnar_coordinates(df):
+    """Mesma conversão de _load_coordinates (sem leitura de arquivo)."""
+    ids = pd.to_numeric(df['id'], errors='coerce')
+    valid = ids.notna()
+    return data_loader.CoordinateStore(
+        ids[valid].to_numpy(dtype=np.int64),
+        pd.to_numeric(df.loc[valid, 'latitude'], errors='coerce').to_numpy(dtype=np.float64),
+        pd.to_numeric(df.loc[valid, 'longitude'], errors='coerce').to_numpy(dtype=np.float64),
+    )
+
+def synthetic_table(n=NUM_MUNICIPALITIES, seed=0):
+    rng = np.random.default_rng(seed)
+    ufs = rng.choice([11, 12, 13, 21, 23, 26, 29, 31, 33, 35, 41, 42, 43, 50, 51, 52, 53], size=n)
+    ids = np.unique(ufs * 100000 + rng.integers(0, 100000, size=n))
+    return pd.DataFrame({
+        'id': ids,
+        'latitude': rng.uniform(-33.7, 5.3, size=len(ids)),
+        'longitude': rng.uniform(-73.9, -34.8, size=len(ids)),
+    })
+
+def load_table(path):
+    if path and os.path.exists(path) and not data_loader.is_lfs_pointer(path):
+        df = pd.read_parquet(path) if path.lower().endswith('.parquet') else pd.read_csv(path)
+        return df.rename(columns={'codigo_ibge': 'id'}), path
+    return synthetic_table(), f"sintético ({NUM_MUNICIPALITIES} municípios)"
+
+def timed(fn, repeats):
+    """Melhor tempo (s) de `repeats` execuções e o último resultado."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def peak_memory(fn):
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: dict via iterrows x CoordinateStore.")
+    parser.add_argument('arquivo', nargs='?', default=config.COORDS_FILE)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    df, source = load_table(args.arquivo)
+    print(f"Coordenadas: {source}, {len(df)} linhas")
+
+    t_old, legacy = timed(lambda: legacy_coordinates(df), args.repeticoes)
+    t_new, store = timed(lambda: columnar_coordinates(df), args.repeticoes)
+    mem_old, _ = peak_memory(lambda: legacy_coordinates(df))
+    mem_new, _ = peak_memory(lambda: columnar_coordinates(df))
+
+    # Consulta típica do mapa: centro de um subconjunto de IDs (metade, em ordem aleatória)
+    ids = np.random.default_rng(1).permutation(np.asarray(list(legacy)))[:len(legacy) // 2].tolist()
+    def legacy_mean():
+        pts = [legacy[i] for i in ids if i in legacy]
+        return sum(p[0] for p in pts) / len(pts), sum(p[1] for p in pts) / len(pts)
+    q_old, center_old = timed(legacy_mean, args.repeticoes)
+    q_new, center_new = timed(lambda: store.mean(ids), args.repeticoes)
+
+    assert set(legacy) == set(store)
+    assert np.allclose(center_old, center_new, atol=1e-4)
+
+    print(f"{'':<24}{'dict (iterrows)':>18}{'CoordinateStore':>18}{'ganho':>10}")
+    print(f"{'Montagem (ms)':<24}{t_old * 1e3:>18.2f}{t_new * 1e3:>18.2f}{t_old / t_new:>9.1f}x")
+    print(f"{'Pico de memória (KB)':<24}{mem_old / 1024:>18.1f}{mem_new / 1024:>18.1f}{mem_old / mem_new:>9.1f}x")
+    print(f"{'Centro de N/2 IDs (ms)':<24}{q_old * 1e3:>18.2f}{q_new * 1e3:>18.2f}{q_old / q_new:>9.1f}x")
+    print(f"{'Tamanho final (KB)':<24}{'-':>18}{store.nbytes / 1024:>18.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Default paths - use cleaned data
@@ -10,10 +11,46 @@ DISTANCES_FILE = str(DATA_DIR / 'df_ matriz_distancias.parquet')
 EXISTING_SITES_FILE = str(DATA_DIR / 'df_campi_existentes.parquet')
 DEMAND_FILE = str(DATA_DIR / 'df_populacao_idade_escolar.parquet')
 COORDS_FILE = str(DATA_DIR / 'municipios.parquet')
+SHAPEFILE = str(DATA_DIR / 'BR_Municipios_2024.shp')
+
+# Expected size and sha256 of each data file (outside clean_data/, which is tracked by Git LFS)
+DATA_MANIFEST_FILE = str(BASE_DIR / 'data_manifest.json')
+
+# Data download (see fetcher.py): backend 'gdrive' | 'local' (directory/mirror) | 'http' (base URL)
+FETCH_BACKEND = os.environ.get('MCLP_FETCH_BACKEND', 'gdrive')
+FETCH_SOURCE = os.environ.get('MCLP_FETCH_SOURCE')   # Directory or base URL for 'local' / 'http'
+FETCH_WORKERS = 4                                     # Concurrent downloads
 
 # Default parameters
 P = 5                   # Number of new sites
 S_DISTANCE = 100.0          # Max coverage radius (km)
 S_TIME = 1.0               # Max coverage time (hours)
 USE_DISTANCE_KM = True     # True for km, False for time
-TARGET_UF = 'MG'           # 'MG' (Minas Gerais) | None = Brazil
\ No newline at end of file
+TARGET_UF = 'MG'           # 'MG' (Minas Gerais) | None = Brazil
+RESULT_FORMATS = ('csv', 'parquet')  # Solution table written by main.py: 'csv' | 'csv.gz' | 'parquet' | 'xlsx'
+
+# Truncation limits of the radius-sorted adjacency (prepare_data.py --adjacencia)
+ADJACENCY_MAX_DISTANCE = 300.0  # km
+ADJACENCY_MAX_TIME = 5.0        # hours
+
+# Simplification tolerances (degrees) of the UF-partitioned GeoParquet store (prepare_data.py --geometria)
+GEOMETRY_TOLERANCES = (0.001, 0.005, 0.02)
+MAP_TOLERANCE = 0.005   # Level of detail used by the maps
+UF_MAP_TOLERANCE = 0.02  # Dissolved UF polygons of the national map (no UF filter, no search)
+
+# On-disk cache of coverage structures per scenario (see coverage_cache.py)
+CACHE_DIR = str(BASE_DIR / 'cache')
+CACHE_MAX_BYTES = 512 * 1024 * 1024   # Total size limit; least recently used scenarios are evicted
+
+# Combined budget (MB) of the two in-memory caches below. The default leaves most of a
+# 512 MB dyno to the interpreter, pandas, geopandas and the solver
+CACHE_MEMORY_BUDGET = int(os.environ.get('MCLP_CACHE_MEMORY_MB', 160)) * 1024 * 1024
+
+# In-memory cache of loaded data shared by all Streamlit sessions (see shared_cache.py)
+SHARED_CACHE_MAX_BYTES = CACHE_MEMORY_BUDGET * 5 // 8
+
+# Process-wide store of artefacts per optimisation result (map layers, Excel, PDF, HTML), keyed by its fingerprint
+ARTIFACT_CACHE_MAX_BYTES = CACHE_MEMORY_BUDGET - SHARED_CACHE_MAX_BYTES
+REPORT_WORKERS = 2          # Background threads generating the exports (see report_pipeline.py)
+REPORT_POLL_SECONDS = 2     # Refresh interval of the download buttons while exports are pending
+REPORT_RETRY_SECONDS = 30   # A failed export is shown as an error for this long, then retried on the next request
@@ -0,0 +1,226 @@
+import os
+import hashlib
+import contextlib
+import tempfile
+import zipfile
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+import config
+import data_loader
+import heuristics
+
+# Cache em disco das estruturas de cobertura (CSR + vetores) por cenário.
+# A chave combina a impressão digital do arquivo de distâncias, a UF, a métrica,
+# o limiar, a demanda (IDs e valores) e o conjunto de campi existentes.
+# Um cenário repetido carrega os arrays do .npz e pula toda a etapa em pandas.
+
+CACHE_VERSION = 1
+
+def scenario_key(distances_file, demand_dict, existing_site_ids, uf_filter, max_dist, max_time, use_km=True):
+    """Chave (hex) do cenário de cobertura."""
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}".encode())
+    # Arquivo de distâncias e formatos derivados (que o data_loader usa quando presentes)
+    h.update(data_loader.distances_fingerprint(distances_file).encode())
+    h.update(repr(data_loader.uf_code(uf_filter)).encode())
+    threshold = ('km', float(max_dist)) if use_km else ('h', float(max_time))
+    h.update(repr(threshold).encode())
+    # A ordem da demanda define os índices de candidatos/nós, então entra na chave
+    h.update(np.asarray(list(demand_dict.keys()), dtype=np.int64).tobytes())
+    h.update(np.asarray(list(demand_dict.values()), dtype=np.float64).tobytes())
+    h.update(np.asarray(sorted(existing_site_ids), dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+def _cache_path(key):
+    return os.path.join(config.CACHE_DIR, f"{key}.npz")
+
+def _save(key, sparse_structures, existing_structures):
+    cov_matrix, demand_vector, cand_to_idx, node_to_idx, initial_coverage = sparse_structures
+    exist_matrix, site_to_idx = existing_structures
+
+    os.makedirs(config.CACHE_DIR, exist_ok=True)
+    path = _cache_path(key)
+    # Temporário exclusivo: sessões (threads do mesmo processo) podem gravar o mesmo cenário
+    with tempfile.NamedTemporaryFile(dir=config.CACHE_DIR, prefix=f"{key}.", suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+        try:
+            np.savez(
+                f,
+                indptr=cov_matrix.indptr, indices=cov_matrix.indices,
+                shape=np.asarray(cov_matrix.shape, dtype=np.int64),
+                demand_vector=demand_vector,
+                cand_ids=np.asarray(list(cand_to_idx), dtype=np.int64),
+                node_ids=np.asarray(list(node_to_idx), dtype=np.int64),
+                initial_coverage=initial_coverage,
+                exist_indptr=exist_matrix.indptr, exist_indices=exist_matrix.indices,
+                exist_ids=np.asarray(list(site_to_idx), dtype=np.int64),
+            )
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+    evict()
+
+def _load(key):
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            shape = tuple(int(x) for x in z['shape'])
+            cand_ids = z['cand_ids'].tolist()
+            node_ids = z['node_ids'].tolist()
+            exist_ids = z['exist_ids'].tolist()
+
+            cov_matrix = _csr(z['indptr'], z['indices'], shape)
+            exist_matrix = _csr(z['exist_indptr'], z['exist_indices'], (len(exist_ids), shape[1]))
+            sparse_structures = (
+                cov_matrix, z['demand_vector'],
+                {c: i for i, c in enumerate(cand_ids)},
+                {n: i for i, n in enumerate(node_ids)},
+                z['initial_coverage'],
+            )
+    except FileNotFoundError:
+        # Removido por evict() de outra sessão entre a verificação e a leitura
+        return None
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(f"⚠️ Cache de cobertura inválido ({e}), reconstruindo...")
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        return None
+
+    # Marca como usado recentemente (LRU pela data de modificação); pode já ter sido removido
+    with contextlib.suppress(FileNotFoundError):
+        os.utime(path)
+    return sparse_structures, (exist_matrix, {s: i for i, s in enumerate(exist_ids)})
+
+def _csr(indptr, indices, shape):
+    data = np.ones(len(indices), dtype=np.int8)
+    return csr_matrix((data, indices, indptr), shape=shape)
+
+def evict(max_bytes=None):
+    """Remove os cenários menos usados recentemente até o cache caber em max_bytes."""
+    max_bytes = config.CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(config.CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(config.CACHE_DIR):
+        if name.endswith('.npz'):
+            path = os.path.join(config.CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Outra sessão do processo removeu o arquivo depois do listdir
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        total -= size
+
+def _build(distances_file, demand_dict, candidates, all_demand_nodes, existing_site_ids,
+           uf_filter, max_dist, max_time, use_km):
+    dist_df = data_loader.load_distances(
+        distances_file, uf_filter=uf_filter,
+        max_dist=max_dist, max_time=max_time, use_km=use_km
+    )
+    relevant_origins = set(candidates) | existing_site_ids
+    mask = dist_df['origem'].isin(relevant_origins) & dist_df['destino'].isin(all_demand_nodes)
+    dist_filtered = dist_df[mask]
+
+    # Cobertura dos campi existentes (com auto-cobertura), que define os nós pré-cobertos
+    existing = sorted(existing_site_ids)
+    if existing:
+        exist_matrix, _, site_to_idx, _, _ = heuristics.build_sparse_matrix_from_df(
+            dist_filtered, demand_dict, existing, all_demand_nodes, max_dist, max_time, use_km
+        )
+    else:
+        exist_matrix = csr_matrix((0, len(all_demand_nodes)), dtype=np.int8)
+        site_to_idx = {}
+    node_ids = np.asarray(all_demand_nodes, dtype=np.int64)
+    pre_covered = set(node_ids[exist_matrix.indices].tolist())
+
+    sparse_structures = heuristics.build_sparse_matrix_from_df(
+        dist_filtered, demand_dict, candidates, all_demand_nodes, max_dist, max_time, use_km, pre_covered
+    )
+    return sparse_structures, (exist_matrix, site_to_idx)
+
+def get_coverage_structures(distances_file, demand_dict, candidates, all_demand_nodes, existing_site_ids,
+                            uf_filter, max_dist, max_time, use_km=True):
+    """
+    Retorna (sparse_structures, existing_structures) do cenário, do cache se disponível.
+    sparse_structures segue o formato de heuristics.build_sparse_matrix_from_df;
+    existing_structures é (matriz CSR dos campi existentes, id -> linha).
+    """
+    key = scenario_key(distances_file, demand_dict, existing_site_ids, uf_filter, max_dist, max_time, use_km)
+    cached = _load(key)
+    if cached is not None:
+        print(f"Estruturas de cobertura carregadas do cache ({key[:12]}).")
+        return cached
+
+    structures = _build(distances_file, demand_dict, candidates, all_demand_nodes, existing_site_ids,
+                        uf_filter, max_dist, max_time, use_km)
+    _save(key, *structures)
+    return structures
+
+def pre_covered_nodes(sparse_structures):
+    """Conjunto de nós já cobertos pelos campi existentes."""
+    _, _, _, node_to_idx, initial_coverage = sparse_structures
+    node_ids = np.fromiter(node_to_idx, dtype=np.int64, count=len(node_to_idx))
+    return set(node_ids[initial_coverage > 0].tolist())
+
+def site_coverage(sites, sparse_structures, existing_structures):
+    """Mapa local -> conjunto de nós cobertos, para candidatos ou campi existentes."""
+    cov_matrix, _, cand_to_idx, node_to_idx, _ = sparse_structures
+    exist_matrix, site_to_idx = existing_structures
+    node_ids = np.fromiter(node_to_idx, dtype=np.int64, count=len(node_to_idx))
+
+    coverage = {}
+    for s in sites:
+        if s in site_to_idx:
+            matrix, row = exist_matrix, site_to_idx[s]
+        elif s in cand_to_idx:
+            matrix, row = cov_matrix, cand_to_idx[s]
+        else:
+            coverage[s] = {s}
+            continue
+        nodes = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+        coverage[s] = set(node_ids[nodes].tolist()) | {s}
+    return coverage
+
+def coverage_matrix(sites, sparse_structures, existing_structures):
+    """
+    Cobertura dos locais informados (candidatos ou campi existentes, com auto-cobertura)
+    como matriz CSR locais x nós de demanda. Retorna (matriz, ids dos locais, ids dos nós).
+    """
+    cov_matrix, _, cand_to_idx, node_to_idx, _ = sparse_structures
+    exist_matrix, site_to_idx = existing_structures
+    node_ids = np.fromiter(node_to_idx, dtype=np.int64, count=len(node_to_idx))
+    site_ids = sorted(sites)
+    n_sites, n_nodes = len(site_ids), len(node_ids)
+
+    # Linhas dos campi existentes e dos candidatos, empilhadas e devolvidas à ordem de site_ids
+    exist_pos = [k for k, s in enumerate(site_ids) if s in site_to_idx]
+    cand_pos = [k for k, s in enumerate(site_ids) if s not in site_to_idx and s in cand_to_idx]
+    other_pos = sorted(set(range(n_sites)) - set(exist_pos) - set(cand_pos))
+    stacked = vstack([
+        exist_matrix[[site_to_idx[site_ids[k]] for k in exist_pos]],
+        cov_matrix[[cand_to_idx[site_ids[k]] for k in cand_pos]],
+        csr_matrix((len(other_pos), n_nodes), dtype=np.int8),
+    ], format='csr')
+    order = np.argsort(np.asarray(exist_pos + cand_pos + other_pos, dtype=np.int64), kind='stable')
+    matrix = stacked[order]
+
+    # Auto-cobertura dos locais que também são nós de demanda
+    self_pos = [k for k, s in enumerate(site_ids) if s in node_to_idx]
+    self_cov = csr_matrix(
+        (np.ones(len(self_pos), dtype=np.int8), (self_pos, [node_to_idx[site_ids[k]] for k in self_pos])),
+        shape=(n_sites, n_nodes)
+    )
+    matrix = ((matrix + self_cov) > 0).astype(np.int32)
+    return matrix, np.asarray(site_ids, dtype=np.int64), node_ids
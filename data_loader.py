@@ -1,74 +1,49 @@
 import pandas as pd
+import numpy as np
 import os
+import io
+import csv
+import codecs
+import json
+import shutil
+import tempfile
+from collections.abc import Mapping
 import geopandas as gpd
 import streamlit as st
 from pathlib import Path
-import gdown
-
-# --- CONFIGURAÇÃO DE DOWNLOAD DO GOOGLE DRIVE ---
-
-GDRIVE_FILE_IDS = {
-    'BR_Municipios_2024.shp': '15dlkV4afTnd7OTKJeWyzaVO7XPymasp6', 
-    'BR_Municipios_2024.shx': '1paVS7mJrrCLctUCFCUuWgz1zgZEp7p4P', 
-    'BR_Municipios_2024.dbf': '1u5TYDCIpF5nZsNQS8l7RY3E30jO-GhF8', 
-    'BR_Municipios_2024.cpg': '1jkdJ1f5aCybnZ7m5A-7bFn7qFAp3jhE_', 
-    'BR_Municipios_2024.prj': '1jb3MaRdHCmg9186qKd4JfGTGxp4h79ib',
-    'BR_Municipios_Simplified.cpg': '1VsUPgHefWCTPIRivBSYAWL6sUwnjUNV-',
-    'BR_Municipios_Simplified.dbf': '1z2Nw1wuntPpnY2F6Y2JRyq7XiWqY6J_C',
-    'BR_Municipios_Simplified.prj': '1W54Phs4ciH09DEv8WKiaEiMzbgDRapKL',
-    'BR_Municipios_Simplified.shp': '1eU818GkbM2ITw3NLxAaoc3T9NAwZliQg',
-    'BR_Municipios_Simplified.shx': '1hGPOMUrcDZblP7HxxWLnujJIeuu4L71v',
-    'df_ matriz_distancias.parquet': '1DbHOFJ5RE-kc534PflH_bX-yHKQzNgiD',
-    'df_campi_existentes.parquet': '1SxrL6y5nPJKS9SnFwvGQmWFeZ33HMY_E',
-    'df_populacao_idade_escolar.parquet': '1GqBOZbMvjcDe5mxpeD4ccNSOqpsPRVvg',
-    'municipios.parquet': '1sFdSnamM9_KDnCFmbV8vZuOpcew2ddII'
-}
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shared_cache
+import data_manifest
+import fetcher
+
+# --- DOWNLOAD DOS DADOS ---
+# Os IDs do Google Drive e as demais origens ficam em fetcher.py.
 
-def ensure_file_from_drive(filepath):
+def ensure_file_from_drive(filepath, force=False):
     """
     Verifica se o arquivo existe e é válido. Se for um ponteiro LFS ou não existir,
-    tenta baixar do Google Drive usando o ID configurado.
+    baixa pela origem configurada (fetcher.py; Google Drive por padrão).
+    force: baixa novamente mesmo que o arquivo exista (ex.: incompleto segundo o manifesto).
     """
     path = Path(filepath)
-    filename = path.name
     
     # Se o arquivo existe e NÃO é um ponteiro LFS, ok.
-    if path.exists() and not is_lfs_pointer(filepath):
+    if not force and path.exists() and not is_lfs_pointer(filepath):
         return True
-        
-    # Se chegamos aqui, precisamos baixar
-    file_id = GDRIVE_FILE_IDS.get(filename)
-    
-    if not file_id:
-        # Tenta verificar se é um arquivo auxiliar de shapefile (.shx, .dbf...) e se temos o ID dele
-        pass 
-        
-    if not file_id:
-        print(f"⚠️ Aviso: ID do Google Drive não configurado para '{filename}'. Não é possível baixar automaticamente.")
-        return False
-        
-    url = f'https://drive.google.com/uc?id={file_id}'
-    output = str(filepath)
-    
-    # Cria diretório se não existir
-    path.parent.mkdir(parents=True, exist_ok=True)
-    
-    print(f"⬇️ Baixando {filename} do Google Drive...")
-    try:
-        gdown.download(url, output, quiet=False)
-        # Verifica se baixou algo válido
-        if path.exists() and path.stat().st_size > 1000:
-            return True
-    except Exception as e:
-        print(f"❌ Falha ao baixar {filename}: {e}")
-        
-    return False
 
+    return not fetcher.fetch_files([str(filepath)])
 
 def is_lfs_pointer(filepath):
     """
     Verifica se um arquivo é um ponteiro Git LFS.
     """
+    # Já verificado contra o manifesto e inalterado: não reabrir o arquivo
+    if data_manifest.is_verified(filepath):
+        return False
     try:
         # Ponteiros LFS são arquivos de texto pequenos (geralmente < 200 bytes)
         # começando com "version https://git-lfs.github.com/spec/v1"
@@ -97,7 +72,7 @@ def display_lfs_error_ui(filepath):
     O arquivo `{filepath}` não foi encontrado ou é apenas um atalho do Git LFS.
     
     **Solução Automática:**
-    O sistema tentou baixar do Google Drive mas falhou. Verifique se os IDs estão corretos em `data_loader.py`.
+    O sistema tentou baixar do Google Drive mas falhou. Verifique se os IDs estão corretos em `fetcher.py`.
     
     **Solução Manual:**
     1. Baixe os dados manualmente da pasta de dados do projeto no Google Drive ou Repo.
@@ -108,6 +83,9 @@ def check_and_debug_path(filepath):
     """
     Verifica se um arquivo existe. Se não, imprime/registra informações de depuração sobre o diretório.
     """
+    if data_manifest.is_verified(filepath):
+        return True
+
     path = Path(filepath)
     
     # Tentativa de Auto-Correção (Download)
@@ -144,12 +122,529 @@ def check_and_debug_path(filepath):
         return False
     return True
 
-def load_distances(filepath, uf_filter=None):
+# --- FILTRO DE UF ---
+# Os 2 primeiros dígitos do código IBGE do município (7 dígitos) identificam a UF,
+# então o filtro é feito por divisão inteira (id // 100000), sem conversão para string.
+
+UF_CODES = {
+    'RO': 11, 'AC': 12, 'AM': 13, 'RR': 14, 'PA': 15, 'AP': 16, 'TO': 17,
+    'MA': 21, 'PI': 22, 'CE': 23, 'RN': 24, 'PB': 25, 'PE': 26, 'AL': 27, 'SE': 28, 'BA': 29,
+    'MG': 31, 'ES': 32, 'RJ': 33, 'SP': 35,
+    'PR': 41, 'SC': 42, 'RS': 43,
+    'MS': 50, 'MT': 51, 'GO': 52, 'DF': 53
+}
+
+def uf_code(uf_filter):
+    """
+    Converte o filtro de UF (sigla 'MG' ou código '31'/31) para o código IBGE inteiro.
+    Retorna None se não houver filtro.
+    """
+    if uf_filter is None:
+        return None
+    uf_str = str(uf_filter).strip().upper()
+    if not uf_str:
+        return None
+    if uf_str.isdigit():
+        return int(uf_str)
+    if uf_str in UF_CODES:
+        return UF_CODES[uf_str]
+    raise ValueError(f"UF '{uf_filter}' não reconhecida. Use a sigla (ex: MG) ou o código IBGE (ex: 31).")
+
+def uf_mask(ids, code):
+    """Máscara vetorizada dos IDs de município pertencentes à UF `code`."""
+    return (ids // 100000) == code
+
+def _uf_range_filters(code, columns=('origem', 'destino')):
+    """Filtros de leitura Parquet (pyarrow) equivalentes a uf_mask em cada coluna."""
+    filters = []
+    for col in columns:
+        filters.append((col, '>=', code * 100000))
+        filters.append((col, '<', (code + 1) * 100000))
+    return filters
+
+# --- FILTROS DE LEITURA DA MATRIZ DE DISTÂNCIAS ---
+# Os mesmos critérios (UF, limiar de cobertura, origens/destinos) são aplicados
+# como expressão Arrow na leitura do Parquet/dataset e em cada bloco do CSV,
+# para que pares descartados nunca cheguem ao pandas.
+
+def _threshold(max_dist=None, max_time=None, use_km=True):
+    """Retorna (coluna, limite) do critério de cobertura, ou (None, None) sem limite."""
+    if use_km and max_dist is not None:
+        return 'distancia', float(max_dist)
+    if not use_km and max_time is not None:
+        return 'tempo', float(max_time)
+    return None, None
+
+def _id_list(ids):
+    return None if ids is None else sorted(int(i) for i in ids)
+
+def _dataset_filter(uf, threshold_col, threshold, origins, destinations, partitioned=True, names=None):
+    """
+    Expressão pyarrow dos filtros de leitura (ou None). partitioned: filtra a UF pelas
+    colunas de partição (poda de partições); senão, pela faixa de IDs em origem/destino.
+    names: nome de cada coluna no arquivo, quando difere (ex.: origem_cod).
+    """
+    names = names or {}
+    def field(col):
+        return ds.field(names.get(col, col))
+    expr = None
+    def _and(e):
+        return e if expr is None else expr & e
+    if uf is not None and partitioned:
+        expr = _and((ds.field('origem_uf') == uf) & (ds.field('destino_uf') == uf))
+    elif uf is not None:
+        for col, op, value in _uf_range_filters(uf):
+            expr = _and(field(col) >= value if op == '>=' else field(col) < value)
+    if threshold_col:
+        expr = _and(field(threshold_col) <= threshold)
+    if origins is not None:
+        expr = _and(field('origem').isin(origins))
+    if destinations is not None:
+        expr = _and(field('destino').isin(destinations))
+    return expr
+
+# Tipos compactos da matriz de distâncias (os mesmos já usados na leitura do CSV):
+# códigos IBGE de 7 dígitos cabem em int32 e float32 sobra para km/horas.
+# A conversão acontece na varredura (projeção Arrow com cast, bloco a bloco), então a
+# tabela nunca existe inteira nos tipos largos do arquivo ao lado da cópia compacta.
+COMPACT_DISTANCE_DTYPES = {'origem': 'int32', 'destino': 'int32', 'distancia': 'float32', 'tempo': 'float32'}
+_COMPACT_ARROW_TYPES = {'origem': pa.int32(), 'destino': pa.int32(), 'distancia': pa.float32(), 'tempo': pa.float32()}
+_LEGACY_DISTANCE_NAMES = {'origem': 'origem_cod', 'destino': 'destino_cod'}
+
+def _source_name(schema, col):
+    """Nome da coluna no arquivo (aceita os nomes legados origem_cod/destino_cod)."""
+    if col in schema.names:
+        return col
+    legacy = _LEGACY_DISTANCE_NAMES.get(col)
+    return legacy if legacy in schema.names else None
+
+def _distance_projection(schema, compact=True):
+    """Projeção da varredura: colunas da matriz renomeadas e, com compact, já convertidas."""
+    columns = {}
+    for col in DISTANCE_COLUMNS:
+        name = _source_name(schema, col)
+        if name:
+            columns[col] = ds.field(name).cast(_COMPACT_ARROW_TYPES[col]) if compact else ds.field(name)
+    return columns
+
+def _log_distance_memory(num_rows, source_row_bytes, nbytes, compact):
+    """Registra a memória da matriz nos tipos do arquivo e na forma carregada."""
+    after = nbytes / 1024**2
+    if not compact:
+        print(f"Memória da matriz de distâncias: {after:.1f} MB.")
+        return
+    before = num_rows * source_row_bytes / 1024**2
+    print(f"Memória da matriz de distâncias: {before:.1f} MB -> {after:.1f} MB (tipos compactos na leitura).")
+
+def _distance_frame(table, source_schema, compact=True):
+    """DataFrame da tabela Arrow lida com _distance_projection, com o log de memória."""
+    row_bytes = sum(source_schema.field(_source_name(source_schema, c)).type.byte_width for c in table.column_names)
+    _log_distance_memory(table.num_rows, row_bytes, table.nbytes, compact)
+    # self_destruct: cada coluna Arrow é liberada ao ser convertida (sem duas cópias inteiras)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+# --- DATASET PARTICIONADO DA MATRIZ DE DISTÂNCIAS ---
+# Layout hive: <dataset>/origem_uf=31/destino_uf=31/part-0.parquet
+# Dentro de cada partição as linhas são ordenadas por distância, então os row groups
+# acima do raio são descartados pelas estatísticas de coluna (min/max) na leitura.
+
+DISTANCE_COLUMNS = ['origem', 'destino', 'distancia', 'tempo']
+DATASET_ROW_GROUP_SIZE = 64 * 1024
+
+_DISTANCE_PARTITIONING = ds.partitioning(
+    pa.schema([('origem_uf', pa.int16()), ('destino_uf', pa.int16())]),
+    flavor='hive'
+)
+
+def partitioned_path(filepath):
+    """Diretório do dataset particionado correspondente a um arquivo de distâncias."""
+    base, _ = os.path.splitext(str(filepath))
+    return base + '_particionado'
+
+def _resolve_distance_dataset(filepath):
+    """Retorna o diretório do dataset particionado se existir (ou se filepath já for um)."""
+    if os.path.isdir(filepath):
+        return str(filepath)
+    dataset_dir = partitioned_path(filepath)
+    if os.path.isdir(dataset_dir):
+        return dataset_dir
+    return None
+
+def convert_distances_to_dataset(filepath, dataset_dir=None):
+    """
+    Converte a matriz de distâncias (Parquet) em um dataset hive particionado por
+    UF de origem e UF de destino (código IBGE de 2 dígitos), ordenado por distância.
+    Processa uma UF de origem por vez para limitar o uso de memória.
+    """
+    dataset_dir = os.path.abspath(dataset_dir or partitioned_path(filepath))
+    print(f"Convertendo {filepath} para dataset particionado em {dataset_dir}...")
+
+    # Gravado em um diretório temporário ao lado do destino e trocado no fim: uma conversão
+    # interrompida nunca deixa um dataset parcial, e partições antigas não sobram
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(dataset_dir), prefix=os.path.basename(dataset_dir) + '.', suffix='.tmp')
+    try:
+        total_rows, num_ufs = _write_distance_partitions(filepath, tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if os.path.isdir(dataset_dir):
+        old_dir = tempfile.mkdtemp(dir=os.path.dirname(dataset_dir), prefix=os.path.basename(dataset_dir) + '.', suffix='.old')
+        os.replace(dataset_dir, os.path.join(old_dir, 'dataset'))
+        os.replace(tmp_dir, dataset_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.replace(tmp_dir, dataset_dir)
+
+    print(f"Dataset particionado gravado: {total_rows} pares em {num_ufs} UFs de origem.")
+    return dataset_dir
+
+def _write_distance_partitions(filepath, dataset_dir):
+    """Grava as partições (origem_uf, destino_uf) em dataset_dir; retorna (pares, UFs de origem)."""
+    source = ds.dataset(filepath, format='parquet')
+    names = source.schema.names
+    orig_col = 'origem' if 'origem' in names else 'origem_cod'
+    dest_col = 'destino' if 'destino' in names else 'destino_cod'
+    columns = {'origem': ds.field(orig_col), 'destino': ds.field(dest_col)}
+    for col in ('distancia', 'tempo'):
+        if col in names:
+            columns[col] = ds.field(col)
+
+    # Códigos de UF presentes (prefixo de 2 dígitos do ID IBGE)
+    origins = source.to_table(columns={'o': ds.field(orig_col)})['o']
+    uf_codes = sorted(pc.unique(pc.divide(origins, 100000)).to_pylist())
+    del origins
+
+    total_rows = 0
+    for orig_uf in uf_codes:
+        in_uf = (ds.field(orig_col) >= orig_uf * 100000) & (ds.field(orig_col) < (orig_uf + 1) * 100000)
+        table = source.to_table(columns=columns, filter=in_uf)
+        dest_uf = pc.divide(table['destino'], 100000)
+
+        for d_uf in pc.unique(dest_uf).to_pylist():
+            part = table.filter(pc.equal(dest_uf, d_uf)).sort_by('distancia')
+            part_dir = os.path.join(dataset_dir, f"origem_uf={orig_uf}", f"destino_uf={d_uf}")
+            os.makedirs(part_dir, exist_ok=True)
+            pq.write_table(part, os.path.join(part_dir, 'part-0.parquet'), row_group_size=DATASET_ROW_GROUP_SIZE)
+            total_rows += part.num_rows
+    return total_rows, len(uf_codes)
+
+def _load_distances_dataset(dataset_dir, filter_expr=None, compact=True):
+    """
+    Lê o dataset particionado com filtros empurrados para o pyarrow:
+    uma execução de UF única lê apenas a partição (origem_uf, destino_uf) correspondente,
+    e row groups acima do limiar são descartados pelas estatísticas de coluna.
+    """
+    print(f"Carregando distâncias do dataset particionado {dataset_dir}...")
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning=_DISTANCE_PARTITIONING)
+
+    table = dataset.to_table(columns=_distance_projection(dataset.schema, compact), filter=filter_expr)
+    print(f"Carregados {table.num_rows} pares de distância do dataset particionado.")
+    return _distance_frame(table, dataset.schema, compact)
+
+# --- ADJACÊNCIA ORDENADA POR RAIO (FORMATO BINÁRIO) ---
+# CSR sobre índices densos de município (ids.npy, ordenado). Para cada métrica há
+# uma cópia da adjacência com as linhas ordenadas pela métrica e truncadas no raio
+# máximo da conversão. A chave de busca é a métrica quantizada em uint16 (escala em
+# meta.json); distância e tempo são guardados também na precisão do arquivo de origem.
+# Os pares dentro de um raio r são o prefixo de cada linha: a chave localiza os
+# candidatos (searchsorted) e o limiar exato é aplicado aos valores completos, então
+# o resultado é o mesmo da leitura do Parquet. Tudo lido via memmap, sem parsing.
+
+ADJACENCY_METRICS = ('distancia', 'tempo')
+ADJACENCY_VERSION = 2
+_UINT16_MAX = np.iinfo(np.uint16).max
+
+def adjacency_path(filepath):
+    """Diretório da adjacência ordenada derivada de um arquivo de distâncias."""
+    base, _ = os.path.splitext(filepath)
+    return base + '_adjacencia'
+
+def _resolve_adjacency(filepath):
+    adj_dir = adjacency_path(filepath)
+    meta_path = os.path.join(adj_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        if json.load(f).get('version') != ADJACENCY_VERSION:
+            print(f"⚠️ Adjacência em {adj_dir} está em formato antigo; regenere com prepare_data.py --adjacencia.")
+            return None
+    return adj_dir
+
+def convert_distances_to_adjacency(filepath, max_dist, max_time, adj_dir=None):
+    """
+    Converte a matriz de distâncias (Parquet) na adjacência ordenada por raio.
+    Mantém apenas pares com distancia <= max_dist ou tempo <= max_time.
+    """
+    adj_dir = adj_dir or adjacency_path(filepath)
+    print(f"Convertendo {filepath} para adjacência ordenada em {adj_dir}...")
+
+    source = ds.dataset(filepath, format='parquet')
+    names = source.schema.names
+    orig_col = 'origem' if 'origem' in names else 'origem_cod'
+    dest_col = 'destino' if 'destino' in names else 'destino_cod'
+
+    # Índice denso: todos os municípios presentes, mesmo sem pares dentro do raio
+    all_ids = source.to_table(columns={'o': ds.field(orig_col), 'd': ds.field(dest_col)})
+    ids = np.union1d(pc.unique(all_ids['o']).to_numpy(), pc.unique(all_ids['d']).to_numpy()).astype(np.int64)
+    del all_ids
+
+    limits = {'distancia': float(max_dist), 'tempo': float(max_time)}
+    keep = (ds.field('distancia') <= limits['distancia']) | (ds.field('tempo') <= limits['tempo'])
+    table = source.to_table(
+        columns={'origem': ds.field(orig_col), 'destino': ds.field(dest_col),
+                 'distancia': ds.field('distancia'), 'tempo': ds.field('tempo')},
+        filter=keep
+    )
+    rows = np.searchsorted(ids, table['origem'].to_numpy())
+    cols = np.searchsorted(ids, table['destino'].to_numpy()).astype(np.int32)
+    # Valores na precisão de origem: o limiar é aplicado sobre eles na leitura
+    values = {m: table[m].to_numpy() for m in ADJACENCY_METRICS}
+    del table
+
+    # Escala da chave por métrica: o raio máximo ocupa o topo do uint16
+    scales = {m: limits[m] / _UINT16_MAX or 1.0 for m in ADJACENCY_METRICS}
+
+    os.makedirs(adj_dir, exist_ok=True)
+    np.save(os.path.join(adj_dir, 'ids.npy'), ids)
+    for metric in ADJACENCY_METRICS:
+        sel = np.flatnonzero(values[metric] <= limits[metric])
+        sel = sel[np.lexsort((values[metric][sel], rows[sel]))]
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[sel], minlength=len(ids)), out=indptr[1:])
+
+        np.save(os.path.join(adj_dir, f"{metric}_indptr.npy"), indptr)
+        np.save(os.path.join(adj_dir, f"{metric}_indices.npy"), cols[sel])
+        key = np.rint(values[metric][sel] / scales[metric]).astype(np.uint16)
+        np.save(os.path.join(adj_dir, f"{metric}_key.npy"), key)
+        for col in ADJACENCY_METRICS:
+            np.save(os.path.join(adj_dir, f"{metric}_{col}.npy"), values[col][sel])
+        print(f"  Ordenação por {metric}: {len(sel)} pares até {limits[metric]}.")
+
+    with open(os.path.join(adj_dir, 'meta.json'), 'w') as f:
+        json.dump({'version': ADJACENCY_VERSION, 'limits': limits, 'scales': scales}, f, indent=2)
+    return adj_dir
+
+def load_adjacency(adj_dir, metric):
+    """Abre (memmap, somente leitura) a adjacência ordenada pela métrica informada."""
+    with open(os.path.join(adj_dir, 'meta.json')) as f:
+        meta = json.load(f)
+
+    def _open(name):
+        return np.load(os.path.join(adj_dir, f"{name}.npy"), mmap_mode='r')
+
+    adj = {
+        'ids': _open('ids'),
+        'indptr': _open(f"{metric}_indptr"),
+        'indices': _open(f"{metric}_indices"),
+        'key': _open(f"{metric}_key"),
+        'metric': metric,
+        'limit': meta['limits'][metric],
+        'scale': meta['scales'][metric],
+    }
+    for col in ADJACENCY_METRICS:
+        adj[col] = _open(f"{metric}_{col}")
+    return adj
+
+def adjacency_prefix(adj, rows, threshold):
+    """
+    Para cada linha, a posição final do prefixo com valor <= threshold (exato).
+    A chave uint16 delimita os candidatos com folga de uma escala; o corte final
+    é feito sobre os valores completos, que seguem a mesma ordem.
+    """
+    q = np.rint(threshold / adj['scale']) + 1
+    indptr, keys, values = adj['indptr'], adj['key'], adj[adj['metric']]
+    ends = np.empty(len(rows), dtype=np.int64)
+    for k, r in enumerate(rows):
+        start, stop = indptr[r], indptr[r + 1]
+        candidates = start + np.searchsorted(keys[start:stop], q, side='right')
+        ends[k] = start + np.searchsorted(values[start:candidates], threshold, side='right')
+    return ends
+
+def _load_distances_adjacency(adj_dir, uf, threshold_col, threshold, origins, destinations, compact=True):
+    """Pares dentro do limiar a partir da adjacência; None se o limiar excede a truncagem."""
+    adj = load_adjacency(adj_dir, threshold_col)
+    if threshold > adj['limit']:
+        return None
+    print(f"Carregando distâncias da adjacência ordenada {adj_dir}...")
+
+    ids = np.asarray(adj['ids'])
+    if origins is not None:
+        rows = np.searchsorted(ids, origins)
+        rows = rows[(rows < len(ids)) & (ids[np.minimum(rows, len(ids) - 1)] == origins)]
+    else:
+        rows = np.arange(len(ids))
+    if uf is not None:
+        rows = rows[uf_mask(ids[rows], uf)]
+
+    starts = np.asarray(adj['indptr'][rows])
+    lengths = adjacency_prefix(adj, rows, threshold) - starts
+    # Posições absolutas de todos os prefixos concatenados
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    pos = offsets + np.arange(offsets.size)
+
+    origem = np.repeat(ids[rows], lengths)
+    destino = ids[adj['indices'][pos]]
+    keep = np.ones(len(pos), dtype=bool)
+    if uf is not None:
+        keep &= uf_mask(destino, uf)
+    if destinations is not None:
+        keep &= np.isin(destino, destinations)
+    pos = pos[keep]
+
+    # Uma coluna por vez, já no tipo final (sem montar a tabela nos tipos do arquivo)
+    dtypes = COMPACT_DISTANCE_DTYPES if compact else {}
+    columns = {
+        'origem': origem[keep].astype(dtypes.get('origem', origem.dtype), copy=False),
+        'destino': destino[keep].astype(dtypes.get('destino', destino.dtype), copy=False),
+    }
+    del origem, destino
+    for col in ADJACENCY_METRICS:
+        columns[col] = adj[col][pos].astype(dtypes.get(col, adj[col].dtype), copy=False)
+    df = pd.DataFrame(columns, copy=False)
+
+    print(f"Carregados {len(df)} pares de distância da adjacência.")
+    row_bytes = 2 * ids.itemsize + sum(adj[col].itemsize for col in ADJACENCY_METRICS)
+    _log_distance_memory(len(df), row_bytes, sum(a.nbytes for a in columns.values()), compact)
+    return df
+
+# --- LEITURA CSV COM PYARROW ---
+# O CSV (sep=';') é lido em blocos pelo pyarrow.csv, com parsing em várias threads,
+# tipos int32/float32 explícitos e apenas as colunas da matriz. Cada bloco é
+# filtrado (UF, limiar, origens/destinos) como expressão Arrow antes de acumular.
+# convert_distances_csv grava uma cópia Parquet, usada no lugar do CSV quando
+# estiver atualizada.
+
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+_CSV_COLUMN_NAMES = {'origem_cod': 'origem', 'destino_cod': 'destino'}
+_CSV_COLUMN_TYPES = _COMPACT_ARROW_TYPES
+
+def _open_distances_csv(filepath):
+    """Leitor em streaming (lotes Arrow) do CSV de distâncias, com colunas já renomeadas."""
+    with open(filepath, encoding='utf-8', errors='replace') as f:
+        header = f.readline().strip().lstrip('\ufeff').split(';')
+    names = [_CSV_COLUMN_NAMES.get(c.strip(), c.strip()) for c in header]
+    columns = [c for c in DISTANCE_COLUMNS if c in names]
+
+    return pacsv.open_csv(
+        filepath,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE,
+                                       column_names=names, skip_rows=1),
+        parse_options=pacsv.ParseOptions(delimiter=';'),
+        convert_options=pacsv.ConvertOptions(
+            column_types={c: _CSV_COLUMN_TYPES[c] for c in columns},
+            include_columns=columns
+        )
+    )
+
+def _read_distances_csv(filepath, filter_expr=None):
+    """Lê o CSV de distâncias em uma tabela Arrow, filtrando bloco a bloco."""
+    reader = _open_distances_csv(filepath)
+    tables = []
+    for batch in reader:
+        table = pa.Table.from_batches([batch])
+        if filter_expr is not None:
+            table = table.filter(filter_expr)
+        if table.num_rows:
+            tables.append(table)
+    return pa.concat_tables(tables) if tables else reader.schema.empty_table()
+
+def csv_parquet_path(filepath):
+    """Cópia Parquet gerada a partir de um CSV de distâncias."""
+    base, _ = os.path.splitext(str(filepath))
+    return base + '.parquet'
+
+def _resolve_csv_parquet(filepath):
+    """Cópia Parquet de um CSV, se existir e não for mais antiga que o CSV."""
+    if not str(filepath).lower().endswith('.csv'):
+        return None
+    parquet_path = csv_parquet_path(filepath)
+    if not os.path.exists(parquet_path):
+        return None
+    if os.path.exists(filepath) and os.path.getmtime(parquet_path) < os.path.getmtime(filepath):
+        return None
+    return parquet_path
+
+def convert_distances_csv(filepath, parquet_path=None):
+    """
+    Converte o CSV de distâncias em Parquet (tipos compactos, colunas padronizadas),
+    em streaming: apenas um bloco do CSV fica em memória por vez.
+    """
+    parquet_path = parquet_path or csv_parquet_path(filepath)
+    print(f"Convertendo {filepath} para Parquet em {parquet_path}...")
+
+    reader = _open_distances_csv(filepath)
+    # Temporário exclusivo no mesmo diretório (conversões simultâneas não se misturam)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(parquet_path)), suffix='.tmp')
+    os.close(fd)
+    total_rows = 0
+    try:
+        with pq.ParquetWriter(tmp_path, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                total_rows += batch.num_rows
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, parquet_path)
+
+    print(f"Parquet gravado: {total_rows} pares.")
+    return parquet_path
+
+def distances_fingerprint(filepath):
+    """Impressão digital do arquivo de distâncias e dos formatos derivados presentes."""
+    return '|'.join(
+        shared_cache.file_fingerprint(path)
+        for path in (filepath, partitioned_path(filepath), adjacency_path(filepath), csv_parquet_path(filepath))
+    )
+
+def load_distances(filepath, uf_filter=None, max_dist=None, max_time=None, use_km=True,
+                   origins=None, destinations=None, compact=True):
+    """
+    Carrega a matriz de distâncias via cache compartilhado do processo (ver _load_distances).
+    """
+    origins, destinations = _id_list(origins), _id_list(destinations)
+    params = (uf_code(uf_filter), _threshold(max_dist, max_time, use_km),
+              origins and tuple(origins), destinations and tuple(destinations), compact)
+    return shared_cache.cached(
+        'distancias', distances_fingerprint(filepath), params,
+        lambda: _load_distances(filepath, uf_filter, max_dist, max_time, use_km, origins, destinations, compact)
+    )
+
+def _load_distances(filepath, uf_filter=None, max_dist=None, max_time=None, use_km=True,
+                    origins=None, destinations=None, compact=True):
     """
     Carrega a matriz de distâncias de CSV ou Parquet.
     Retorna um DataFrame com colunas ['origem', 'destino', 'distancia', 'tempo'].
-    Otimizado para ler em chunks (CSV) ou usar poda de colunas (Parquet).
+    CSV: leitura multi-thread via pyarrow.csv (ou a cópia Parquet de convert_distances_csv,
+    quando atualizada); Parquet: poda de colunas e filtros na leitura.
+    Se existir o dataset particionado (ver convert_distances_to_dataset), ele é usado.
+    Com limiar informado e adjacência ordenada disponível (ver convert_distances_to_adjacency),
+    os pares vêm diretamente dela.
+
+    Filtros opcionais, aplicados durante a leitura:
+    max_dist/max_time + use_km: mantém apenas pares dentro do limiar de cobertura.
+    origins/destinations: mantém apenas pares entre os IDs informados.
+    compact: IDs em int32 e distância/tempo em float32 (False mantém os tipos do arquivo).
     """
+    uf = uf_code(uf_filter)
+    threshold_col, threshold = _threshold(max_dist, max_time, use_km)
+    origins, destinations = _id_list(origins), _id_list(destinations)
+    filter_args = (uf, threshold_col, threshold, origins, destinations)
+
+    adj_dir = _resolve_adjacency(filepath) if threshold_col else None
+    if adj_dir:
+        df = _load_distances_adjacency(adj_dir, *filter_args, compact=compact)
+        if df is not None:
+            return df
+
+    dataset_dir = _resolve_distance_dataset(filepath)
+    if dataset_dir:
+        return _load_distances_dataset(dataset_dir, _dataset_filter(*filter_args), compact)
+
+    csv_parquet = _resolve_csv_parquet(filepath)
+    if csv_parquet:
+        filepath = csv_parquet
+
     if not check_and_debug_path(filepath):
         # Retorna dataframe vazio para evitar quebra, mas erro já é mostrado
         return pd.DataFrame(columns=['origem', 'destino', 'distancia', 'tempo'])
@@ -163,113 +658,102 @@ def load_distances(filepath, uf_filter=None):
     _, ext = os.path.splitext(filepath)
     
     if ext.lower() == '.parquet':
-        # Carregar arquivo Parquet - OTIMIZADO PARA MEMÓRIA
-        # Carregar apenas colunas necessárias.
-        cols_to_load = ['origem', 'destino', 'distancia', 'tempo']
-        
-        # Verificar se colunas existem
-        
+        # Apenas as colunas da matriz (nomes legados renomeados), convertidas na varredura,
+        # com filtros empurrados para a leitura (faixa de IDs da UF, limiar, origens/destinos)
+        source = ds.dataset(filepath, format='parquet')
+        columns = _distance_projection(source.schema, compact)
+        names = {c: _source_name(source.schema, c) or c for c in DISTANCE_COLUMNS}
+        table = source.to_table(columns=columns, filter=_dataset_filter(*filter_args, partitioned=False, names=names))
+
+        print(f"Carregados {table.num_rows} pares de distância do Parquet.")
+        return _distance_frame(table, source.schema, compact)
+
+    # CSV: parsing multi-thread e filtros Arrow por bloco (tipos compactos já no parsing)
+    table = _read_distances_csv(filepath, _dataset_filter(*filter_args, partitioned=False))
+    print(f"Carregados {table.num_rows} pares de distância (filtrados do stream).")
+    return _distance_frame(table, table.schema, compact)
+
+# --- LEITURA DE TABELAS (ARQUIVOS PADRÃO E UPLOADS) ---
+# Demanda, campi e coordenadas (CSV ou Parquet, caminho ou upload do Streamlit) são
+# lidos por read_table: separador e encoding são detectados nos primeiros KB e o
+# arquivo é lido uma única vez pelo engine C, com tipos inferidos por coluna.
+# O DataFrame fica no cache compartilhado, indexado pelo conteúdo/arquivo.
+
+SNIFF_BYTES = 16 * 1024
+SNIFF_DELIMITERS = ';,\t|'
+
+def sniff_csv(sample):
+    """Detecta (separador, encoding) a partir dos primeiros bytes de um CSV."""
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
         try:
-            df = pd.read_parquet(filepath, columns=cols_to_load)
-        except Exception as e:
-            print(f"Erro ao carregar colunas específicas: {e}. Tentando carga completa...")
-            df = pd.read_parquet(filepath)
-
-        # Renomear colunas se necessário (suporte legado)
-        rename_map = {}
-        if 'origem_cod' in df.columns: rename_map['origem_cod'] = 'origem'
-        if 'destino_cod' in df.columns: rename_map['destino_cod'] = 'destino'
-        
-        if rename_map:
-            df = df.rename(columns=rename_map)
-            
-        # Filtrar por UF se solicitado
-        if uf_filter:
-            uf_str = str(uf_filter)
-            # ... logica de filtro ...
-            # Como não carregamos colunas de UF, devemos confiar nos prefixos de ID
-            if uf_str.isdigit():
-                 mask_orig = df['origem'].astype(str).str.zfill(7).str[:2] == uf_str
-                 mask_dest = df['destino'].astype(str).str.zfill(7).str[:2] == uf_str
-                 df = df[mask_orig & mask_dest]
-            else:
-                # Se filtro UF é 'MG' mas não carregamos 'origem_uf', não podemos filtrar facilmente a menos que inferimos do ID.
-                pass 
-                
-        # Manter apenas colunas necessárias (redundante se carregamos apenas elas, mas seguro)
-        cols_to_keep = ['origem', 'destino', 'distancia', 'tempo']
-        cols_to_keep = [c for c in cols_to_keep if c in df.columns]
-        df = df[cols_to_keep]
-        
-        print(f"Carregados {len(df)} pares de distância do Parquet.")
-        return df
+            sample.decode('utf-8')
+            encoding = 'utf-8'
+        except UnicodeDecodeError as e:
+            # Caractere multibyte cortado no fim da amostra não invalida o UTF-8
+            encoding = 'utf-8' if e.start >= len(sample) - 3 else 'latin1'
 
-    # Lógica de Carregamento CSV (Existente)
-    chunks = []
-    chunk_size = 500000
-    total_rows = 0
-    
-    # Usaremos engine C com separador explícito para velocidade
+    lines = sample.decode(encoding, errors='ignore').splitlines()
+    if len(sample) >= SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]   # última linha possivelmente incompleta
     try:
-        reader = pd.read_csv(
-            filepath, 
-            sep=';', 
-            chunksize=chunk_size,
-            engine='c',
-            dtype={
-                'origem_cod': 'int32',
-                'destino_cod': 'int32',
-                'distancia': 'float32',
-                'tempo': 'float32'
-            }
-        )
-    except ValueError:
-        # Fallback se dtype falhar ou colunas forem diferentes
-        print("Aviso: Não foi possível usar dtypes otimizados, voltando para padrão")
-        reader = pd.read_csv(filepath, sep=';', chunksize=chunk_size, engine='c')
-
-    for chunk in reader:
-        # Padronizar nomes de colunas
-        chunk = chunk.rename(columns={
-            'origem_cod': 'origem',
-            'destino_cod': 'destino'
-        })
-        
-        # Filter by UF if requested
-        if uf_filter:
-            uf_str = str(uf_filter)
-            
-            if uf_str.isdigit():
-                 mask_orig = chunk['origem'].astype(str).str.zfill(7).str[:2] == uf_str
-                 mask_dest = chunk['destino'].astype(str).str.zfill(7).str[:2] == uf_str
-                 chunk = chunk[mask_orig & mask_dest]
-            else:
-                if 'origem_uf' in chunk.columns and 'destino_uf' in chunk.columns:
-                     mask_orig = chunk['origem_uf'].astype(str) == uf_str
-                     mask_dest = chunk['destino_uf'].astype(str) == uf_str
-                     chunk = chunk[mask_orig & mask_dest]
-                else:
-                     mask_orig = chunk['origem'].astype(str).str.zfill(7).str[:2] == uf_str
-                     mask_dest = chunk['destino'].astype(str).str.zfill(7).str[:2] == uf_str
-                     chunk = chunk[mask_orig & mask_dest]
-        
-        if not chunk.empty:
-            # Manter apenas colunas necessárias
-            cols_to_keep = ['origem', 'destino', 'distancia', 'tempo']
-            # Garantir que colunas existem antes de selecionar
-            cols_to_keep = [c for c in cols_to_keep if c in chunk.columns]
-            chunks.append(chunk[cols_to_keep])
-            total_rows += len(chunk)
-            
-    if chunks:
-        df = pd.concat(chunks, ignore_index=True)
+        sep = csv.Sniffer().sniff('\n'.join(lines), delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        header = lines[0] if lines else ''
+        sep = max(SNIFF_DELIMITERS, key=header.count)
+        if not header.count(sep):
+            sep = ','
+    return sep, encoding
+
+def _read_table(source):
+    """Lê CSV ou Parquet de um caminho ou upload (objeto com getvalue/name)."""
+    if hasattr(source, 'getvalue'):
+        content = source.getvalue()
+        name = getattr(source, 'name', '')
+        open_source = lambda: io.BytesIO(content)
+        sample = content[:SNIFF_BYTES]
     else:
-        df = pd.DataFrame(columns=['origem', 'destino', 'distancia', 'tempo'])
-    
-    print(f"Carregados {len(df)} pares de distância (filtrados do stream).")
+        name = str(source)
+        open_source = lambda: name
+        sample = None
+
+    if name.lower().endswith('.parquet'):
+        return pd.read_parquet(open_source())
+
+    if sample is None:
+        with open(name, 'rb') as f:
+            sample = f.read(SNIFF_BYTES)
+    sep, encoding = sniff_csv(sample)
+    try:
+        df = pd.read_csv(open_source(), sep=sep, encoding=encoding, engine='c', low_memory=False)
+    except UnicodeDecodeError:
+        # Início em UTF-8 válido, mas o restante do arquivo não
+        encoding = 'latin1'
+        df = pd.read_csv(open_source(), sep=sep, encoding=encoding, engine='c', low_memory=False)
+    print(f"Lido {name} (separador {sep!r}, {encoding}): {len(df)} linhas.")
     return df
 
+def read_table(source, fingerprint=None):
+    """
+    DataFrame de um CSV/Parquet (caminho ou upload), lido uma vez e reutilizado por
+    todos os consumidores via cache compartilhado. Não altere o resultado no lugar
+    (colunas novas/renomeadas são seguras: é uma cópia rasa).
+    fingerprint: impressão digital já calculada (evita re-hashear uploads).
+    """
+    return shared_cache.cached(
+        'tabela', fingerprint or shared_cache.source_fingerprint(source), None,
+        lambda: _read_table(source)
+    )
+
 def load_existing_sites(filepath, uf_filter=None):
+    """Carrega locais existentes via cache compartilhado do processo (ver _load_existing_sites)."""
+    return shared_cache.cached(
+        'campi', shared_cache.source_fingerprint(filepath), uf_code(uf_filter),
+        lambda: _load_existing_sites(filepath, uf_filter)
+    )
+
+def _load_existing_sites(filepath, uf_filter=None):
     """
     Carrega locais existentes.
     Retorna um DataFrame com informações do local.
@@ -277,27 +761,13 @@ def load_existing_sites(filepath, uf_filter=None):
     print(f"Carregando locais existentes de {filepath}...")
     
     # Handle Streamlit UploadedFile
-    if hasattr(filepath, 'name'):
-        filename = filepath.name
-        if hasattr(filepath, 'seek'): filepath.seek(0)
-    else:
+    if not hasattr(filepath, 'getvalue'):
         if not check_and_debug_path(filepath):
             return pd.DataFrame(columns=['id', 'possui_campus'])
-        filename = str(filepath)
-        
-    if is_lfs_pointer(filepath):
-        handle_lfs_error(filepath)
-        
-    _, ext = os.path.splitext(filename)
-    
-    if ext.lower() == '.parquet':
-        df = pd.read_parquet(filepath)
-    else:
-        try:
-            df = pd.read_csv(filepath, sep=';', encoding='utf-8')
-        except UnicodeDecodeError:
-            if hasattr(filepath, 'seek'): filepath.seek(0)
-            df = pd.read_csv(filepath, sep=';', encoding='latin1')
+        if is_lfs_pointer(filepath):
+            handle_lfs_error(filepath)
+
+    df = read_table(filepath)
     
     # Padronizar coluna ID
     if 'cód.ibge' in df.columns:
@@ -318,19 +788,21 @@ def load_existing_sites(filepath, uf_filter=None):
         df = df[df[possui_col].astype(str).str.lower().isin(valid_values)].copy()
         print(f"Filtrado por '{possui_col}': {len(df)} locais encontrados.")
 
-    if uf_filter:
-        uf_str = str(uf_filter)
-        if uf_str.isdigit():
-             df = df[df['id'].astype(str).str.zfill(7).str[:2] == uf_str].copy()
-        elif 'uf' in df.columns:
-             df = df[df['uf'].astype(str) == uf_str].copy()
-        else:
-             df = df[df['id'].astype(str).str.zfill(7).str[:2] == uf_str].copy()
+    uf = uf_code(uf_filter)
+    if uf is not None:
+        df = df[uf_mask(df['id'], uf)].copy()
              
     print(f"Carregados {len(df)} locais existentes.")
     return df
 
 def load_demand(filepath, id_col, value_cols, uf_filter=None):
+    """Carrega dados de demanda via cache compartilhado do processo (ver _load_demand)."""
+    return shared_cache.cached(
+        'demanda', shared_cache.source_fingerprint(filepath), (id_col, tuple(value_cols), uf_code(uf_filter)),
+        lambda: _load_demand(filepath, id_col, value_cols, uf_filter)
+    )
+
+def _load_demand(filepath, id_col, value_cols, uf_filter=None):
     """
     Carrega dados de demanda.
     filepath: Caminho para CSV
@@ -338,33 +810,16 @@ def load_demand(filepath, id_col, value_cols, uf_filter=None):
     value_cols: Lista de nomes de colunas para somar para demanda total
     """
     print(f"Carregando demanda de {filepath}...")
-    print(f"Carregando demanda de {filepath}...")
     
     # Handle Streamlit UploadedFile
-    if hasattr(filepath, 'name'):
-        filename = filepath.name
-        # Resetar ponteiro se for objeto tipo arquivo
-        if hasattr(filepath, 'seek'):
-            filepath.seek(0)
-    else:
+    if not hasattr(filepath, 'getvalue'):
         if not check_and_debug_path(filepath):
              return {}, {}, {}
-        filename = str(filepath)
-
-    if is_lfs_pointer(filepath):
-        handle_lfs_error(filepath)
+        if is_lfs_pointer(filepath):
+            handle_lfs_error(filepath)
 
-    _, ext = os.path.splitext(filename)
-    
-    if ext.lower() == '.parquet':
-        df = pd.read_parquet(filepath)
-    else:
-        # Auto-detectar separador (lida com vírgula e ponto e vírgula)
-        try:
-            df = pd.read_csv(filepath, sep=None, engine='python', encoding='utf-8')
-        except UnicodeDecodeError:
-             if hasattr(filepath, 'seek'): filepath.seek(0)
-             df = pd.read_csv(filepath, sep=None, engine='python', encoding='latin1')
+    # Separador e encoding detectados automaticamente (vírgula, ponto e vírgula...)
+    df = read_table(filepath)
     
     # Auto-detectar coluna ID se não encontrada
     if id_col not in df.columns:
@@ -393,16 +848,9 @@ def load_demand(filepath, id_col, value_cols, uf_filter=None):
         
     df['total_demand'] = df[value_cols].sum(axis=1)
     
-    if uf_filter:
-        uf_str = str(uf_filter)
-        if uf_str.isdigit():
-             df = df[df['id'].astype(str).str.zfill(7).str[:2] == uf_str].copy()
-        elif 'UF' in df.columns:
-             df = df[df['UF'].astype(str) == uf_str].copy()
-        elif 'uf' in df.columns:
-             df = df[df['uf'].astype(str) == uf_str].copy()
-        else:
-             df = df[df['id'].astype(str).str.zfill(7).str[:2] == uf_str].copy()
+    uf = uf_code(uf_filter)
+    if uf is not None:
+        df = df[uf_mask(df['id'], uf)].copy()
 
     # Criar dicionário {id: demanda}
     demand_dict = df.set_index('id')['total_demand'].to_dict()
@@ -441,72 +889,222 @@ def load_demand(filepath, id_col, value_cols, uf_filter=None):
     print(f"Carregada demanda para {len(demand_dict)} locais.")
     return demand_dict, names_dict, uf_dict
 
-@st.cache_data
+class CoordinateStore(Mapping):
+    """
+    Coordenadas em colunas: IDs int32 ordenados e lat/lon float32.
+    Consultas vetorizadas via searchsorted (lookup, mean); também funciona como
+    o antigo dict {id: (lat, lon)} (get, in, [], items...) para os chamadores existentes.
+    """
+
+    def __init__(self, ids, lat, lon):
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        ids = ids[order]
+        # IDs repetidos: vale a última ocorrência, como na montagem do dict
+        last = np.append(ids[1:] != ids[:-1], True) if len(ids) else np.zeros(0, dtype=bool)
+
+        self.ids = ids[last].astype(np.int32)
+        self.lat = np.asarray(lat, dtype=np.float32)[order][last]
+        self.lon = np.asarray(lon, dtype=np.float32)[order][last]
+        for arr in (self.ids, self.lat, self.lon):
+            arr.flags.writeable = False
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.lat.nbytes + self.lon.nbytes
+
+    def positions(self, ids):
+        """Posições dos IDs no store e máscara de encontrados."""
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, ids)
+        pos = np.minimum(pos, max(len(self.ids) - 1, 0))
+        found = (self.ids[pos] == ids) if len(self.ids) else np.zeros(ids.shape, dtype=bool)
+        return pos, found
+
+    def lookup(self, ids):
+        """Arrays (lat, lon) para os IDs informados; NaN para IDs ausentes."""
+        pos, found = self.positions(ids)
+        lat = np.full(found.shape, np.nan)
+        lon = np.full(found.shape, np.nan)
+        lat[found] = self.lat[pos[found]]
+        lon[found] = self.lon[pos[found]]
+        return lat, lon
+
+    def mean(self, ids=None):
+        """(lat, lon) médios dos IDs informados (ou de todos); None se nenhum for encontrado."""
+        if ids is None:
+            lat, lon = self.lat, self.lon
+        else:
+            lat, lon = self.lookup(list(ids))
+        if not np.isfinite(lat).any():
+            return None
+        return float(np.nanmean(lat)), float(np.nanmean(lon))
+
+    def __getitem__(self, key):
+        try:
+            key = int(key)
+        except (TypeError, ValueError):
+            raise KeyError(key)
+        pos, found = self.positions([key])
+        if not found[0]:
+            raise KeyError(key)
+        return float(self.lat[pos[0]]), float(self.lon[pos[0]])
+
+    def __contains__(self, key):
+        try:
+            return bool(self.positions([int(key)])[1][0])
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.ids)
+
 def load_coordinates(filepath, uf_filter=None):
+    """Carrega coordenadas via cache compartilhado do processo (ver _load_coordinates)."""
+    return shared_cache.cached(
+        'coordenadas', shared_cache.source_fingerprint(filepath), uf_code(uf_filter),
+        lambda: _load_coordinates(filepath, uf_filter)
+    )
+
+def _load_coordinates(filepath, uf_filter=None):
     """
     Carrega coordenadas (lat, lon) de CSV.
     Colunas esperadas: codigo_ibge, latitude, longitude
-    Retorna: dict {id: (lat, lon)}
+    Retorna: CoordinateStore (compatível com dict {id: (lat, lon)})
     """
     print(f"Carregando coordenadas de {filepath}...")
     try:
         # Lidar com Streamlit UploadedFile
-        if hasattr(filepath, 'name'):
-            filename = filepath.name
-            if hasattr(filepath, 'seek'): filepath.seek(0)
-        else:
+        if not hasattr(filepath, 'getvalue'):
             if not check_and_debug_path(filepath):
-                return {}
-            filename = str(filepath)
-            
-        if is_lfs_pointer(filepath):
-            if not ensure_file_from_drive(filepath):
-                handle_lfs_error(filepath)
-            
-        _, ext = os.path.splitext(filename)
-        
-        if ext.lower() == '.parquet':
-            df = pd.read_parquet(filepath)
-        else:
-            try:
-                df = pd.read_csv(filepath, encoding='utf-8')
-            except UnicodeDecodeError:
-                if hasattr(filepath, 'seek'): filepath.seek(0)
-                df = pd.read_csv(filepath, encoding='latin1')
+                return CoordinateStore([], [], [])
+            if is_lfs_pointer(filepath):
+                if not ensure_file_from_drive(filepath):
+                    handle_lfs_error(filepath)
+
+        df = read_table(filepath)
         
         # Padronizar colunas
         if 'codigo_ibge' in df.columns:
             df = df.rename(columns={'codigo_ibge': 'id'})
         
-        # Filtrar por UF se necessário (assumindo que primeiros 2 dígitos de ID são código UF)
-        if uf_filter:
-            uf_str = str(uf_filter)
-            if uf_str.isdigit():
-                 df = df[df['id'].astype(str).str.zfill(7).str[:2] == uf_str].copy()
-            # Se UF for string (ex: 'MG'), podemos precisar de mapeamento ou verificar outras colunas
-            # Mas geralmente prefixo de ID é mais seguro se disponível.
-            # Assumimos que entrada é código de 2 dígitos ou pulamos se não encontrado.
-        
-        coords = {}
-        for _, row in df.iterrows():
-            try:
-                coords[int(row['id'])] = (float(row['latitude']), float(row['longitude']))
-            except (ValueError, KeyError):
-                continue
-                
+        if not {'id', 'latitude', 'longitude'} <= set(df.columns):
+            print(f"Colunas de coordenadas não encontradas em {filepath}. Colunas disponíveis: {list(df.columns)}")
+            return CoordinateStore([], [], [])
+
+        # Conversão vetorizada; linhas com ID inválido são descartadas
+        ids = pd.to_numeric(df['id'], errors='coerce')
+        valid = ids.notna()
+
+        # Filtrar por UF se necessário (primeiros 2 dígitos de ID são o código UF)
+        uf = uf_code(uf_filter)
+        if uf is not None:
+            valid &= uf_mask(ids, uf)
+
+        coords = CoordinateStore(
+            ids[valid].to_numpy(dtype=np.int64),
+            pd.to_numeric(df.loc[valid, 'latitude'], errors='coerce').to_numpy(dtype=np.float64),
+            pd.to_numeric(df.loc[valid, 'longitude'], errors='coerce').to_numpy(dtype=np.float64),
+        )
         print(f"Carregadas coordenadas para {len(coords)} locais.")
         return coords
     except Exception as e:
         print(f"Erro ao carregar coordenadas: {e}")
-        return {}
+        return CoordinateStore([], [], [])
+
+# --- MALHA PRÉ-SIMPLIFICADA (GEOPARQUET POR UF) ---
+# Layout: <malha>_geometria/tolerancia=0.005/uf=31/part-0.parquet
+# Geometrias já simplificadas em cada nível de detalhe e IDs já inteiros: o mapa lê
+# apenas a partição da UF no nível pedido, sem abrir o shapefile nem simplificar.
+
+def geometry_store_path(filepath):
+    """Diretório da malha GeoParquet derivada de um shapefile."""
+    base, _ = os.path.splitext(str(filepath))
+    return base + '_geometria'
+
+def _geometry_level_dir(filepath, tolerance):
+    return os.path.join(geometry_store_path(filepath), f"tolerancia={float(tolerance or 0)}")
+
+def _geometry_part(filepath, tolerance, uf):
+    """Arquivo (UF informada) ou diretório do nível (todas as UFs) a ser lido."""
+    level_dir = _geometry_level_dir(filepath, tolerance)
+    if uf is None:
+        return level_dir
+    return os.path.join(level_dir, f"uf={uf}", 'part-0.parquet')
+
+def convert_shapefile_to_geoparquet(filepath, tolerances, store_dir=None):
+    """
+    Grava a malha municipal simplificada em cada tolerância como GeoParquet
+    particionado por UF (código IBGE de 2 dígitos), com 'id' já em int32.
+    """
+    store_dir = store_dir or geometry_store_path(filepath)
+    print(f"Convertendo {filepath} para GeoParquet em {store_dir}...")
+
+    gdf = gpd.read_file(filepath)
+    if 'CD_MUN' in gdf.columns:
+        gdf = gdf.rename(columns={'CD_MUN': 'id'})
+    gdf['id'] = gdf['id'].astype('int32')
+    uf_codes = (gdf['id'] // 100000).to_numpy()
+
+    for tolerance in tolerances:
+        level = gdf.copy()
+        if tolerance and tolerance > 0:
+            level['geometry'] = level.simplify(tolerance=tolerance)
+        level_dir = os.path.join(store_dir, f"tolerancia={float(tolerance or 0)}")
+        for uf in np.unique(uf_codes):
+            part_dir = os.path.join(level_dir, f"uf={uf}")
+            os.makedirs(part_dir, exist_ok=True)
+            level[uf_codes == uf].reset_index(drop=True).to_parquet(os.path.join(part_dir, 'part-0.parquet'))
+        print(f"  Tolerância {tolerance}: {len(level)} shapes em {len(np.unique(uf_codes))} UFs.")
+    return store_dir
+
+def _load_geometry_store(filepath, uf, tolerance):
+    """Malha da UF (ou de todas) no nível pedido; None se a partição não existir."""
+    part = _geometry_part(filepath, tolerance, uf)
+    if uf is not None:
+        return gpd.read_parquet(part) if os.path.exists(part) else None
+    if not os.path.isdir(part):
+        return None
+    files = sorted(
+        os.path.join(root, name) for root, _, names in os.walk(part) for name in names if name.endswith('.parquet')
+    )
+    if not files:
+        return None
+    return pd.concat([gpd.read_parquet(f) for f in files], ignore_index=True)
+
+def shapefile_fingerprint(filepath, uf_filter=None, tolerance=0.005):
+    """Impressão digital do shapefile e da partição GeoParquet correspondente à UF/nível."""
+    part = _geometry_part(filepath, tolerance, uf_code(uf_filter))
+    return '|'.join((shared_cache.source_fingerprint(filepath), shared_cache.file_fingerprint(part)))
 
-@st.cache_data
 def load_shapefile(filepath, uf_filter=None, tolerance=0.005):
+    """Carrega a malha municipal via cache compartilhado do processo (ver _load_shapefile)."""
+    return shared_cache.cached(
+        'malha', shapefile_fingerprint(filepath, uf_filter, tolerance), (uf_code(uf_filter), tolerance),
+        lambda: _load_shapefile(filepath, uf_filter, tolerance)
+    )
+
+def _load_shapefile(filepath, uf_filter=None, tolerance=0.005):
     """
     Carrega shapefile de municípios usando Geopandas.
     Colunas esperadas: CD_MUN (id), SIGLA_UF (uf)
     Retorna: GeoDataFrame
+    Se existir a malha GeoParquet no nível pedido (ver convert_shapefile_to_geoparquet),
+    lê apenas a partição da UF, já simplificada.
     """
+    uf = uf_code(uf_filter)
+    try:
+        gdf = _load_geometry_store(filepath, uf, tolerance)
+    except Exception as e:
+        print(f"Erro ao ler malha GeoParquet: {e}. Usando o shapefile...")
+        gdf = None
+    if gdf is not None:
+        print(f"Carregados {len(gdf)} shapes da malha GeoParquet (tolerância {tolerance}).")
+        return gdf
+
     print(f"Carregando shapefile de {filepath}...")
     if not check_and_debug_path(filepath):
         return None
@@ -517,12 +1115,11 @@ def load_shapefile(filepath, uf_filter=None, tolerance=0.005):
     # Validar arquivos auxiliares do Shapefile
     if filepath.lower().endswith('.shp'):
         base = os.path.splitext(filepath)[0]
-        # Extensões obrigatórias e opcionais
-        for ext in ['.shx', '.dbf', '.prj', '.cpg']:
-            aux_file = base + ext
-            path_aux = Path(aux_file)
-            if not path_aux.exists() or is_lfs_pointer(aux_file):
-                ensure_file_from_drive(aux_file)
+        # Extensões obrigatórias e opcionais (os ausentes são baixados em paralelo)
+        aux_files = [base + ext for ext in ['.shx', '.dbf', '.prj', '.cpg']]
+        missing_aux = [f for f in aux_files if not Path(f).exists() or is_lfs_pointer(f)]
+        if missing_aux:
+            fetcher.fetch_files(missing_aux)
 
     try:
         gdf = gpd.read_file(filepath)
@@ -534,14 +1131,9 @@ def load_shapefile(filepath, uf_filter=None, tolerance=0.005):
         # Converter ID para int para correspondência
         gdf['id'] = gdf['id'].astype(int)
         
-        # Filtrar por UF
-        if uf_filter:
-            uf_str = str(uf_filter)
-            if 'SIGLA_UF' in gdf.columns:
-                 gdf = gdf[gdf['SIGLA_UF'] == uf_str].copy()
-            else:
-                 # Fallback para prefixo de ID
-                 gdf = gdf[gdf['id'].astype(str).str.zfill(7).str[:2] == uf_str].copy()
+        # Filtrar por UF (prefixo do ID, aceita sigla ou código)
+        if uf is not None:
+            gdf = gdf[uf_mask(gdf['id'], uf)].copy()
                  
         # Simplificar Geometria
         if tolerance and tolerance > 0:
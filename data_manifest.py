@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import threading
+import config
+
+# Manifesto de integridade dos dados de entrada (data_manifest.json):
+#   {"arquivos": {"<nome em clean_data>": {"tamanho": <bytes>, "sha256": "<hex>"}}}
+# Cada arquivo é verificado (tamanho + hash) uma única vez por processo. O resultado
+# fica registrado com o (tamanho, mtime) do arquivo, então reruns do Streamlit e os
+# loaders só fazem um os.stat, sem abrir/ler o arquivo, enquanto o mtime não mudar.
+# O manifesto fica fora de clean_data/, que é inteiro rastreado pelo Git LFS.
+
+LFS_HEADER = b'version https://git-lfs.github.com/spec/v1'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_manifest = None
+_results = {}   # caminho absoluto -> ((tamanho, mtime_ns), verificação ok?)
+
+def file_sha256(filepath):
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def parse_lfs_pointer(filepath):
+    """Retorna {'tamanho', 'sha256'} de um ponteiro Git LFS, ou None se não for ponteiro."""
+    if os.path.getsize(filepath) > 1024:
+        return None
+    with open(filepath, 'rb') as f:
+        content = f.read()
+    if LFS_HEADER not in content:
+        return None
+    fields = dict(line.split(' ', 1) for line in content.decode().splitlines() if ' ' in line)
+    return {'tamanho': int(fields['size']), 'sha256': fields['oid'].split(':', 1)[1]}
+
+def build_manifest(data_dir=None, manifest_file=None):
+    """
+    Gera o manifesto a partir da pasta de dados: usa o oid/size dos ponteiros LFS
+    ou, para arquivos já baixados, calcula tamanho e hash.
+    """
+    data_dir = data_dir or config.DATA_DIR
+    manifest_file = manifest_file or config.DATA_MANIFEST_FILE
+
+    files = {}
+    for name in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, name)
+        if not os.path.isfile(path):
+            continue
+        entry = parse_lfs_pointer(path)
+        if entry is None:
+            entry = {'tamanho': os.path.getsize(path), 'sha256': file_sha256(path)}
+        files[name] = entry
+
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({'arquivos': files}, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+    print(f"Manifesto gravado em {manifest_file} ({len(files)} arquivos).")
+    return files
+
+def load_manifest():
+    """Entradas do manifesto por nome de arquivo ({} se não houver manifesto)."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(config.DATA_MANIFEST_FILE, encoding='utf-8') as f:
+                _manifest = json.load(f)['arquivos']
+        except FileNotFoundError:
+            _manifest = {}
+    return _manifest
+
+def manifest_entry(filepath):
+    """Entrada do manifesto para um caminho em DATA_DIR, ou None."""
+    path = os.path.abspath(str(filepath))
+    if os.path.dirname(path) != os.path.abspath(config.DATA_DIR):
+        return None
+    return load_manifest().get(os.path.basename(path))
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def _recorded(path):
+    """Resultado registrado para o arquivo, se ele não mudou desde a verificação (um os.stat)."""
+    result = _results.get(path)
+    if result is not None and result[0] == _stamp(path):
+        return result[1]
+    return None
+
+def is_verified(filepath):
+    """True se o arquivo já passou na verificação neste processo e não mudou desde então."""
+    return _recorded(os.path.abspath(str(filepath))) is True
+
+def verify_file(filepath):
+    """
+    Verifica o arquivo contra o manifesto (tamanho e sha256) e registra o resultado.
+    Arquivos fora do manifesto não são verificados (retorna None).
+    """
+    path = os.path.abspath(str(filepath))
+    entry = manifest_entry(path)
+    if entry is None:
+        return None
+    recorded = _recorded(path)
+    if recorded is not None:
+        return recorded
+
+    stamp = _stamp(path)
+    ok = stamp is not None and stamp[0] == entry['tamanho'] and file_sha256(path) == entry['sha256']
+    with _lock:
+        _results[path] = (stamp, ok)
+    if not ok:
+        print(f"⚠️ Arquivo ausente ou diferente do manifesto: {path}")
+    return ok
+
+def mark_verified(filepath):
+    """Registra como verificado um arquivo cujo hash já foi conferido (ex.: pelo fetcher)."""
+    path = os.path.abspath(str(filepath))
+    with _lock:
+        _results[path] = (_stamp(path), True)
+
+def needs_fetch(filepath):
+    """
+    Arquivo precisa ser baixado: ausente, ponteiro LFS ou com tamanho diferente do manifesto.
+    Um arquivo local completo com hash diferente é mantido (apenas avisado).
+    """
+    entry = manifest_entry(filepath)
+    stamp = _stamp(filepath)
+    return stamp is None or (entry is not None and stamp[0] != entry['tamanho'])
+
+def missing_files(filepaths):
+    """Arquivos que ainda não passaram na verificação do manifesto."""
+    return [p for p in filepaths if verify_file(p) is False]
+
+def pending_files(filepaths):
+    """Arquivos que precisam ser baixados (após a primeira verificação, custa um os.stat por arquivo)."""
+    return [p for p in missing_files(filepaths) if needs_fetch(p)]
+
+def ensure_data(filepaths, progress_callback=None):
+    """
+    Etapa única de obtenção dos dados: baixa em paralelo (fetcher) o que estiver
+    ausente ou incompleto. Retorna a lista de arquivos que continuam pendentes.
+    """
+    # Import local: o fetcher usa este módulo para validar os downloads
+    import fetcher
+
+    to_fetch = pending_files(filepaths)
+    fetcher.fetch_files(to_fetch, progress_callback=progress_callback)
+    return pending_files(to_fetch)
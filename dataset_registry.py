@@ -0,0 +1,71 @@
+import unicodedata
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+import shared_cache
+import data_loader
+
+# Registro, por sessão, das tabelas usadas na barra lateral (demanda e campi, padrão
+# ou upload), indexado pelo hash do conteúdo. Cada arquivo é lido uma única vez
+# (data_loader.read_table) e a sessão recebe sempre visões somente leitura do mesmo
+# DataFrame (cópias rasas: com Copy-on-Write, alterações não chegam ao original).
+# O hash de um upload é calculado uma vez por file_id: reruns da barra lateral não
+# releem nem re-hasheiam os arquivos (para caminhos resta um os.stat).
+
+MAX_SESSION_DATASETS = 8
+
+ID_CANDIDATES = ['id', 'ID', 'Id', 'Cód.', 'Cod.', 'Código', 'Codigo', 'Code']
+
+def _registry():
+    if '_dataset_registry' not in st.session_state:
+        st.session_state['_dataset_registry'] = {'hashes': {}, 'frames': OrderedDict()}
+    return st.session_state['_dataset_registry']
+
+def content_key(source):
+    """Chave do conteúdo: hash do upload (calculado uma vez) ou impressão digital do arquivo."""
+    if not hasattr(source, 'getvalue'):
+        return shared_cache.file_fingerprint(source)
+    hashes = _registry()['hashes']
+    upload_id = getattr(source, 'file_id', None) or (getattr(source, 'name', ''), getattr(source, 'size', None))
+    if upload_id not in hashes:
+        hashes[upload_id] = shared_cache.source_fingerprint(source)
+    return hashes[upload_id]
+
+def get_frame(source):
+    """Visão somente leitura da tabela (caminho ou upload), lida uma vez por conteúdo."""
+    registry = _registry()
+    frames = registry['frames']
+    key = content_key(source)
+    if key not in frames:
+        frames[key] = data_loader.read_table(source, fingerprint=key)
+        # Mantém apenas as tabelas mais recentes da sessão
+        while len(frames) > MAX_SESSION_DATASETS:
+            old_key, _ = frames.popitem(last=False)
+            registry['hashes'] = {u: k for u, k in registry['hashes'].items() if k != old_key}
+    frames.move_to_end(key)
+    return frames[key].copy(deep=False)
+
+def _normalize(s):
+    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn').lower()
+
+def template_columns(df):
+    """Colunas (id, nome, uf) do arquivo base usadas nos templates; None quando ausentes."""
+    id_col = next((c for c in ID_CANDIDATES if c in df.columns), None)
+    cols_map = {_normalize(c): c for c in df.columns}
+    name_col = cols_map.get('municipio') or cols_map.get('nome')
+    return id_col, name_col, cols_map.get('uf')
+
+def template_csv(df_base, value_col, fill_value):
+    """
+    CSV (sep=';') com id, Municipio, UF e uma coluna a preencher (value_col = fill_value).
+    Pensado para st.download_button(data=callable): só é gerado no clique.
+    """
+    id_col, name_col, uf_col = template_columns(df_base)
+    if not (id_col and name_col):
+        return pd.DataFrame({'id': [], value_col: []}).to_csv(index=False, sep=';').encode('utf-8')
+
+    template = df_base[[id_col, name_col]].rename(columns={id_col: 'id', name_col: 'Municipio'})
+    if uf_col:
+        template['UF'] = df_base[uf_col]
+    template[value_col] = fill_value
+    return template.to_csv(index=False, sep=';').encode('utf-8')
@@ -0,0 +1,190 @@
+import os
+import shutil
+import http.client
+import urllib.request
+import urllib.error
+import gdown
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import config
+import data_manifest
+
+# Download dos arquivos de dados em paralelo (pool limitado de threads), com:
+#   - retomada: o download vai para '<arquivo>.part' e continua de onde parou;
+#   - verificação de tamanho e sha256 contra o manifesto (data_manifest.json);
+#   - escrita atômica: o .part só substitui o arquivo final (os.replace) se válido.
+# A origem é plugável (Google Drive, diretório local/espelho ou HTTP), escolhida em
+# config.FETCH_BACKEND / config.FETCH_SOURCE (ou variáveis de ambiente).
+
+GDRIVE_FILE_IDS = {
+    'BR_Municipios_2024.shp': '15dlkV4afTnd7OTKJeWyzaVO7XPymasp6',
+    'BR_Municipios_2024.shx': '1paVS7mJrrCLctUCFCUuWgz1zgZEp7p4P',
+    'BR_Municipios_2024.dbf': '1u5TYDCIpF5nZsNQS8l7RY3E30jO-GhF8',
+    'BR_Municipios_2024.cpg': '1jkdJ1f5aCybnZ7m5A-7bFn7qFAp3jhE_',
+    'BR_Municipios_2024.prj': '1jb3MaRdHCmg9186qKd4JfGTGxp4h79ib',
+    'BR_Municipios_Simplified.cpg': '1VsUPgHefWCTPIRivBSYAWL6sUwnjUNV-',
+    'BR_Municipios_Simplified.dbf': '1z2Nw1wuntPpnY2F6Y2JRyq7XiWqY6J_C',
+    'BR_Municipios_Simplified.prj': '1W54Phs4ciH09DEv8WKiaEiMzbgDRapKL',
+    'BR_Municipios_Simplified.shp': '1eU818GkbM2ITw3NLxAaoc3T9NAwZliQg',
+    'BR_Municipios_Simplified.shx': '1hGPOMUrcDZblP7HxxWLnujJIeuu4L71v',
+    'df_ matriz_distancias.parquet': '1DbHOFJ5RE-kc534PflH_bX-yHKQzNgiD',
+    'df_campi_existentes.parquet': '1SxrL6y5nPJKS9SnFwvGQmWFeZ33HMY_E',
+    'df_populacao_idade_escolar.parquet': '1GqBOZbMvjcDe5mxpeD4ccNSOqpsPRVvg',
+    'municipios.parquet': '1sFdSnamM9_KDnCFmbV8vZuOpcew2ddII'
+}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class FetchError(Exception):
+    """Falha ao obter ou validar um arquivo de dados."""
+
+# --- ORIGENS (BACKENDS) ---
+# Interface: fetch(name, part_path, offset) grava o conteúdo de `name` em part_path,
+# continuando a partir de `offset` bytes quando possível (ou reescrevendo do início).
+# Qualquer falha da origem (rede, biblioteca, disco) é levantada como FetchError.
+
+class GoogleDriveBackend:
+    """Google Drive via gdown, pelos IDs em GDRIVE_FILE_IDS."""
+
+    def __init__(self, file_ids=None):
+        self.file_ids = GDRIVE_FILE_IDS if file_ids is None else file_ids
+
+    def fetch(self, name, part_path, offset):
+        file_id = self.file_ids.get(name)
+        if not file_id:
+            raise FetchError(f"ID do Google Drive não configurado para '{name}'.")
+        url = f'https://drive.google.com/uc?id={file_id}'
+        try:
+            try:
+                # gdown retoma sozinho a partir do .part existente
+                result = gdown.download(url, part_path, quiet=True, resume=True)
+            except TypeError:
+                # Versões antigas do gdown sem retomada: recomeça do zero
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                result = gdown.download(url, part_path, quiet=True)
+        except Exception as e:
+            # gdown levanta exceções próprias (FileURLRetrievalError), do requests e do http.client
+            raise FetchError(f"gdown falhou ao baixar '{name}': {e}") from e
+        if result is None:
+            raise FetchError(f"gdown não conseguiu baixar '{name}'.")
+
+class LocalDirectoryBackend:
+    """Diretório local ou espelho montado com os mesmos nomes de arquivo."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def fetch(self, name, part_path, offset):
+        source = os.path.join(self.root, name)
+        if not os.path.isfile(source):
+            raise FetchError(f"'{name}' não encontrado em {self.root}.")
+        try:
+            with open(source, 'rb') as src, open(part_path, 'ab') as dst:
+                src.seek(offset)
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        except OSError as e:
+            raise FetchError(f"Falha ao copiar '{name}' de {self.root}: {e}") from e
+
+class HttpBackend:
+    """Servidor HTTP(S) com os arquivos em <base_url>/<nome>; retoma via cabeçalho Range."""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def fetch(self, name, part_path, offset):
+        url = f"{self.base_url}/{urllib.request.quote(name)}"
+        request = urllib.request.Request(url, headers={'Range': f'bytes={offset}-'} if offset else {})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                # 206: servidor honrou o Range; 200: conteúdo completo, reescrever do início
+                mode = 'ab' if response.status == 206 else 'wb'
+                with open(part_path, mode) as dst:
+                    shutil.copyfileobj(response, dst, COPY_CHUNK_SIZE)
+        except urllib.error.HTTPError as e:
+            if e.code == 416:   # Range além do fim: .part já está completo
+                return
+            raise FetchError(f"HTTP {e.code} ao baixar '{name}' de {url}.") from e
+        except urllib.error.URLError as e:
+            raise FetchError(f"Falha de conexão ao baixar '{name}' de {url}: {e.reason}") from e
+        except (http.client.HTTPException, OSError) as e:
+            # Resposta interrompida (IncompleteRead), timeout ou conexão encerrada no meio da leitura
+            raise FetchError(f"Download de '{name}' interrompido ({type(e).__name__}): {e}") from e
+
+BACKENDS = {
+    'gdrive': lambda source: GoogleDriveBackend(),
+    'local': LocalDirectoryBackend,
+    'http': HttpBackend,
+}
+
+def get_backend(name=None, source=None):
+    """Backend configurado (config.FETCH_BACKEND / config.FETCH_SOURCE por padrão)."""
+    name = (name or config.FETCH_BACKEND).lower()
+    source = source or config.FETCH_SOURCE
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de download desconhecido: '{name}'. Opções: {', '.join(BACKENDS)}")
+    if name != 'gdrive' and not source:
+        raise ValueError(f"Backend '{name}' requer uma origem (config.FETCH_SOURCE / MCLP_FETCH_SOURCE).")
+    return BACKENDS[name](source)
+
+# --- DOWNLOAD ---
+
+def fetch_file(filepath, backend=None):
+    """
+    Baixa um arquivo para '<filepath>.part' (retomando), valida contra o manifesto e
+    o move atomicamente para filepath. Levanta FetchError em caso de falha.
+    """
+    backend = backend or get_backend()
+    name = os.path.basename(filepath)
+    part_path = f"{filepath}.part"
+    entry = data_manifest.manifest_entry(filepath)
+
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if entry and offset > entry['tamanho']:
+        os.remove(part_path)
+        offset = 0
+
+    print(f"⬇️ Baixando {name}" + (f" (retomando em {offset} bytes)" if offset else "") + "...")
+    backend.fetch(name, part_path, offset)
+
+    if not os.path.exists(part_path):
+        raise FetchError(f"Nenhum conteúdo recebido para '{name}'.")
+    if entry:
+        size = os.path.getsize(part_path)
+        if size != entry['tamanho']:
+            # Incompleto: mantém o .part para retomar na próxima tentativa
+            raise FetchError(f"'{name}' incompleto: {size} de {entry['tamanho']} bytes.")
+        if data_manifest.file_sha256(part_path) != entry['sha256']:
+            os.remove(part_path)
+            raise FetchError(f"Hash de '{name}' não confere com o manifesto.")
+
+    os.replace(part_path, filepath)
+    if entry:
+        data_manifest.mark_verified(filepath)
+    print(f"✅ {name} pronto.")
+
+def fetch_files(filepaths, backend=None, max_workers=None, progress_callback=None):
+    """
+    Baixa vários arquivos em paralelo. progress_callback(concluídos, total, nome) é chamado
+    na thread de quem chamou (seguro para o Streamlit). Retorna {caminho: erro} das falhas.
+    """
+    backend = backend or get_backend()
+    max_workers = max_workers or config.FETCH_WORKERS
+    failures = {}
+    if not filepaths:
+        return failures
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(filepaths))) as pool:
+        futures = {pool.submit(fetch_file, path, backend): path for path in filepaths}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                # Uma falha (mesmo inesperada) não derruba a inicialização: o arquivo fica pendente
+                print(f"❌ Falha ao baixar {os.path.basename(path)}: {e}")
+                failures[path] = e
+            if progress_callback:
+                progress_callback(done, len(filepaths), os.path.basename(path))
+    return failures
@@ -9,6 +9,15 @@ from rich.progress import track, Progress, SpinnerColumn, TextColumn, BarColumn,
 
 console = Console()
 
+# Backend opcional (Numba) para os kernels de troca/ganho.
+# Se numba não estiver instalado, usa-se o caminho numpy (resultados idênticos).
+try:
+    import numba_kernels
+except ImportError:
+    numba_kernels = None
+
+KERNEL_BACKEND = 'numba' if numba_kernels is not None else 'numpy'
+
 def build_coverage_map(distance_df, max_dist, max_time, use_km=True, candidates=None):
     """
     Constrói um dicionário mapeando cada local candidato j para o conjunto de nós de demanda i que ele cobre.
@@ -140,6 +149,117 @@ def build_sparse_matrix_from_df(distance_df, demand_dict, candidates, all_demand
                 
     return cov_matrix, demand_vector, cand_to_idx, node_to_idx, initial_coverage
 
+# --- Kernels de Linha (CSR) ---
+# Operam diretamente sobre fatias de indptr/indices, sem densificar linhas.
+# O custo de cada chamada é proporcional ao nnz das linhas/colunas tocadas.
+
+def build_column_index(cov_matrix):
+    """
+    Constrói o índice transposto (CSC) da matriz de cobertura.
+    Retorna (col_indptr, col_indices): para cada nó, os candidatos que o cobrem.
+    """
+    csc = cov_matrix.tocsc()
+    csc.sort_indices()
+    return csc.indptr, csc.indices
+
+def _row_nodes(indptr, indices, row):
+    """Nós cobertos pelo candidato `row` (view, sem cópia)."""
+    return indices[indptr[row]:indptr[row + 1]]
+
+def _add_row_coverage(coverage, indptr, indices, row, amount=1):
+    """Incrementa (ou decrementa) a contagem de cobertura nos nós da linha."""
+    np.add.at(coverage, _row_nodes(indptr, indices, row), amount)
+
+def _scatter_demand(out, col_indptr, col_indices, nodes, weights):
+    """
+    Acumula out[c] += weights[k] para cada candidato c que cobre nodes[k].
+    Percorre apenas as colunas dos nós informados.
+    """
+    if nodes.size == 0:
+        return
+    starts = col_indptr[nodes]
+    lengths = col_indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return
+    # Posições em col_indices de todas as fatias concatenadas
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+    np.add.at(out, col_indices[offsets], np.repeat(weights, lengths))
+
+def _unique_nodes(current_coverage, indptr, indices, row):
+    """Nós cobertos APENAS pelo candidato `row` (perdidos se ele sair)."""
+    nodes = _row_nodes(indptr, indices, row)
+    return nodes[current_coverage[nodes] == 1]
+
+def _swap_deltas(rem_idx, current_coverage, potential_gains, demand_vector,
+                 indptr, indices, col_indptr, col_indices, delta_buf):
+    """
+    Preenche delta_buf com o ganho líquido de trocar `rem_idx` por cada candidato:
+    delta = ganho_potencial - perda_unica + recuperacao.
+    Retorna a perda única (demanda coberta somente por `rem_idx`).
+    """
+    unique = _unique_nodes(current_coverage, indptr, indices, rem_idx)
+    unique_demand = demand_vector[unique]
+    loss = unique_demand.sum()
+    np.subtract(potential_gains, loss, out=delta_buf)
+    _scatter_demand(delta_buf, col_indptr, col_indices, unique, unique_demand)
+    return loss
+
+def _apply_swap(rem_idx, add_idx, current_coverage, potential_gains, demand_vector,
+                indptr, indices, col_indptr, col_indices, node_marker):
+    """
+    Aplica a troca (rem_idx -> add_idx) atualizando in-place a cobertura
+    e os ganhos potenciais de todos os candidatos.
+    node_marker: vetor booleano auxiliar (todo False na entrada e na saída).
+    """
+    add_nodes = _row_nodes(indptr, indices, add_idx)
+
+    # Nós que PERDEM cobertura (eram cobertos apenas pelo removido)
+    lost = _unique_nodes(current_coverage, indptr, indices, rem_idx)
+
+    # Nós que GANHAM cobertura (não eram cobertos OU ficaram livres e o novo cobriu)
+    node_marker[lost] = True
+    gained = add_nodes[(current_coverage[add_nodes] == 0) | node_marker[add_nodes]]
+    node_marker[lost] = False
+
+    # O ganho AUMENTA para candidatos que cobrem nós que perdemos
+    # e DIMINUI para candidatos que cobrem nós que acabamos de cobrir
+    _scatter_demand(potential_gains, col_indptr, col_indices, lost, demand_vector[lost])
+    _scatter_demand(potential_gains, col_indptr, col_indices, gained, -demand_vector[gained])
+
+    _add_row_coverage(current_coverage, indptr, indices, rem_idx, -1)
+    _add_row_coverage(current_coverage, indptr, indices, add_idx, 1)
+
+def _commit_row(row, current_coverage, gains, demand_vector, indptr, indices, col_indptr, col_indices):
+    """
+    Adiciona o candidato `row` à solução (Greedy): quem cobre os nós recém-cobertos
+    perde esse ganho, e a cobertura da linha é incrementada.
+    """
+    nodes = _row_nodes(indptr, indices, row)
+    newly_covered = nodes[current_coverage[nodes] == 0]
+    _scatter_demand(gains, col_indptr, col_indices, newly_covered, -demand_vector[newly_covered])
+    _add_row_coverage(current_coverage, indptr, indices, row)
+
+def set_kernel_backend(backend):
+    """Define o backend padrão dos kernels: 'numpy' ou 'numba'."""
+    global KERNEL_BACKEND
+    _get_kernels(backend)
+    KERNEL_BACKEND = backend
+
+def _get_kernels(backend=None):
+    """
+    Retorna (swap_deltas, apply_swap, commit_row) do backend solicitado.
+    Todos têm a mesma assinatura e operam in-place sobre os mesmos buffers.
+    """
+    backend = backend or KERNEL_BACKEND
+    if backend == 'numba':
+        if numba_kernels is None:
+            raise ImportError("Backend 'numba' solicitado, mas numba não está instalado.")
+        return numba_kernels.swap_deltas, numba_kernels.apply_swap, numba_kernels.commit_row
+    if backend == 'numpy':
+        return _swap_deltas, _apply_swap, _commit_row
+    raise ValueError(f"Backend de kernels desconhecido: {backend}")
+
 def calculate_z(solution, cov_matrix, demand_vector, cand_to_idx, initial_coverage):
     """
     Calcula Z usando matriz esparsa.
@@ -157,27 +277,29 @@ def calculate_z(solution, cov_matrix, demand_vector, cand_to_idx, initial_covera
     # Calcular Z
     return np.sum(demand_vector[current_coverage > 0])
 
-def greedy_heuristic(candidates, p, cov_matrix, demand_vector, cand_to_idx, initial_coverage, progress_callback=None):
+def greedy_heuristic(candidates, p, cov_matrix, demand_vector, cand_to_idx, initial_coverage, progress_callback=None, backend=None):
     """
     Heurística Greedy OTIMIZADA com Matrizes Esparsas.
+    backend: 'numpy' ou 'numba' (padrão: KERNEL_BACKEND).
     """
     console.print(f"\n[bold green]Running Greedy Heuristic (Sparse) (p={p})...[/bold green]")
     
-    num_cand = cov_matrix.shape[0]
-    
+    _, _, commit_row = _get_kernels(backend)
+    indptr, indices = cov_matrix.indptr, cov_matrix.indices
+    col_indptr, col_indices = build_column_index(cov_matrix)
+
     sol_indices = []
-    current_coverage = initial_coverage.copy() # Dense array 1D
-    
-    # Máscara de candidatos (True = Disponível)
-    candidates_available = np.ones(num_cand, dtype=bool)
-    
-    # Remove candidates that are already fully pre-covered? 
-    # Not strictly necessary but self-coverage logic implies. 
-    # Just standard greedy: pick best gain.
-    
+    current_coverage = initial_coverage.astype(np.int32, copy=True) # Dense array 1D
+
     # Pré-calcular Z atual (opcional)
     current_z = np.sum(demand_vector[current_coverage > 0])
-    
+
+    # Ganhos Potenciais para TODOS os candidatos (calculado uma única vez)
+    # Matriz (Candidatos x Nós) @ Vetor (Nós) -> Vetor (Candidatos)
+    # Isso fornece exatamente quanto de demanda cada candidato cobriria entre os nós não cobertos
+    uncovered_demand_vector = demand_vector * (current_coverage == 0)
+    gains = np.asarray(cov_matrix @ uncovered_demand_vector, dtype=np.int64)
+
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -189,23 +311,7 @@ def greedy_heuristic(candidates, p, cov_matrix, demand_vector, cand_to_idx, init
         task = progress.add_task("[cyan]Greedy Construction...", total=p, z=f"{current_z:,.0f}")
         
         for step in range(p):
-            # 1. Identify Uncovered Demand
-            # Dense boolean mask
-            uncovered_mask = (current_coverage == 0)
-            
-            # 2. Demand Vector of Uncovered Nodes
-            # Dense int array
-            uncovered_demand_vector = demand_vector * uncovered_mask
-            
-            # 3. Calcular Ganhos Potenciais para TODOS os candidatos
-            # Matriz (Candidatos x Nós) @ Vetor (Nós) -> Vetor (Candidatos)
-            # Isso fornece exatamente quanto de demanda cada candidato cobriria entre os nós não cobertos
-            gains = cov_matrix @ uncovered_demand_vector
-            
-            # 4. Mascarar candidatos já selecionados
-            gains[~candidates_available] = -1
-            
-            # 5. Escolher o melhor
+            # 1. Escolher o melhor (candidatos já selecionados ficam com ganho negativo)
             best_idx = np.argmax(gains)
             best_gain = gains[best_idx]
             
@@ -214,16 +320,13 @@ def greedy_heuristic(candidates, p, cov_matrix, demand_vector, cand_to_idx, init
                 progress.update(task, completed=p)
                 break
                 
-            # 6. Atualizar
+            # 2. Atualizar
             sol_indices.append(best_idx)
-            candidates_available[best_idx] = False
-            
-            # Atualizar cobertura
-            # Pegar linha do melhor candidato
-            best_row = cov_matrix[best_idx].toarray().flatten()
-            current_coverage = current_coverage + best_row # >0 implies covered
-            # (We keep it as count or bool, here assumes int count but >0 check handles it)
-            
+
+            # 3. Atualização incremental dos ganhos e da cobertura (>0 implica coberto)
+            commit_row(best_idx, current_coverage, gains, demand_vector, indptr, indices, col_indptr, col_indices)
+            gains[sol_indices] = -1 # Mascarar candidatos já selecionados
+
             current_z += best_gain
             
             if progress_callback:
@@ -236,9 +339,12 @@ def greedy_heuristic(candidates, p, cov_matrix, demand_vector, cand_to_idx, init
     
     return solution
 
-def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to_idx, initial_coverage, max_iter=1000, strategy='best', show_progress=False, progress_callback=None, random_tie_break=False):
+def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to_idx, initial_coverage, max_iter=1000, strategy='best', show_progress=False, progress_callback=None, random_tie_break=False,
+                 column_index=None, backend=None):
     """
     Busca Local OTIMIZADA para MATRIZES ESPARSAS.
+    column_index: (col_indptr, col_indices) de build_column_index, para reutilizar entre chamadas.
+    backend: 'numpy' ou 'numba' (padrão: KERNEL_BACKEND).
     """
     # Índices
     # Índices com tipo inteiro explícito para evitar erros se array vazio
@@ -250,9 +356,18 @@ def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to
     is_in_sol[sol_indices] = True
     pool_indices = all_cand_indices[~is_in_sol]
 
+    # Estruturas CSR/CSC para os kernels de linha
+    swap_deltas, apply_swap, _ = _get_kernels(backend)
+    indptr, indices = cov_matrix_sparse.indptr, cov_matrix_sparse.indices
+    if column_index is None:
+        column_index = build_column_index(cov_matrix_sparse)
+    col_indptr, col_indices = column_index
+
     # Cobertura Atual
-    current_coverage = initial_coverage.copy() + np.array(cov_matrix_sparse[sol_indices].sum(axis=0)).flatten()
-    
+    current_coverage = initial_coverage.astype(np.int32, copy=True)
+    for idx in sol_indices:
+        _add_row_coverage(current_coverage, indptr, indices, idx)
+
     # Calcular Z
     current_z = np.sum(demand_vector[current_coverage > 0])
 
@@ -286,7 +401,12 @@ def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to
     # 0. Pré-calcular Ganho Potencial Inicial
     uncovered_mask = (current_coverage == 0)
     uncovered_demand = demand_vector * uncovered_mask
-    potential_gains = cov_matrix_sparse @ uncovered_demand
+    potential_gains = np.asarray(cov_matrix_sparse @ uncovered_demand, dtype=np.int64)
+
+    # Buffers pré-alocados reutilizados a cada movimento
+    delta_buf = np.empty(len(all_cand_indices), dtype=np.int64)
+    pool_deltas = np.empty(len(pool_indices), dtype=np.int64)
+    node_marker = np.zeros(len(current_coverage), dtype=bool)
 
     try:
         while improved and iteration < max_iter:
@@ -305,20 +425,12 @@ def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to
             for i_rem in check_order:
                 rem_idx = sol_indices[i_rem]
                 
-                rem_coverage_row = cov_matrix_sparse[rem_idx].toarray().flatten()
-                
-                is_unique_mask = (current_coverage == 1) & (rem_coverage_row == 1)
-                loss = np.sum(demand_vector[is_unique_mask])
-                
-                unique_demand_vector = demand_vector * is_unique_mask
-                
-                recoveries = cov_matrix_sparse @ unique_demand_vector
-                
-                # C. Delta
-                deltas = potential_gains - loss + recoveries
+                # Delta = ganho potencial - perda única + recuperação (in-place em delta_buf)
+                swap_deltas(rem_idx, current_coverage, potential_gains, demand_vector,
+                            indptr, indices, col_indptr, col_indices, delta_buf)
                 
                 # Verificar Pool
-                pool_deltas = deltas[pool_indices]
+                np.take(delta_buf, pool_indices, out=pool_deltas)
                 
                 # --- Visualização: Amostrar algumas "tentativas" ---
                 if progress_callback and iteration % 1 == 0: # Log frequently
@@ -340,21 +452,9 @@ def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to
                         add_idx = pool_indices[local_idx_in_pool]
                         delta = pool_deltas[local_idx_in_pool]
                         
-                        # --- Preparação para Atualização Incremental ---
-                        add_coverage_row = cov_matrix_sparse[add_idx].toarray().flatten()
-                        rem_coverage_row = cov_matrix_sparse[rem_idx].toarray().flatten()
-
-                        # Identificar nós que PERDEM cobertura (eram cobertos apenas pelo removido)
-                        nodes_losing_coverage_mask = is_unique_mask
-                        lost_demand_vector = demand_vector * nodes_losing_coverage_mask
-                        
-                        # Identificar nós que GANHAM cobertura (não eram cobertos OU ficaram livres e o novo cobriu)
-                        # Fix: Incluir is_unique_mask para considerar nós transferidos diretamente de rem para add
-                        nodes_gaining_coverage_mask = ((current_coverage == 0) | is_unique_mask) & (add_coverage_row == 1)
-                        gained_demand_vector = demand_vector * nodes_gaining_coverage_mask
-                        
-                        # --- Aplicar Troca na Solução ---
-                        current_coverage = current_coverage - rem_coverage_row + add_coverage_row
+                        # --- Aplicar Troca e Atualização Incremental dos Ganhos Potenciais ---
+                        apply_swap(rem_idx, add_idx, current_coverage, potential_gains, demand_vector,
+                                   indptr, indices, col_indptr, col_indices, node_marker)
                         
                         sol_indices[i_rem] = add_idx
                         pool_indices[local_idx_in_pool] = rem_idx
@@ -362,12 +462,6 @@ def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to
                         current_z += delta
                         improved = True
                         
-                        # --- Aplicar Atualização Incremental nos Ganhos Potenciais ---
-                        # O ganho AUMENTA para candidatos que cobrem nós que perdemos (nova oportunidade)
-                        # O ganho DIMINUI para candidatos que cobrem nós que acabamos de cobrir (perda de oportunidade)
-                        net_demand_change = lost_demand_vector - gained_demand_vector
-                        potential_gains += cov_matrix_sparse @ net_demand_change
-                        
                         break 
                 
                 else: # Best
@@ -397,29 +491,14 @@ def local_search(solution, candidates, cov_matrix_sparse, demand_vector, cand_to
                 i_rem, add_idx, local_idx_in_pool = best_move
                 rem_idx = sol_indices[i_rem]
                 
-                add_coverage_row = cov_matrix_sparse[add_idx].toarray().flatten()
-                rem_coverage_row = cov_matrix_sparse[rem_idx].toarray().flatten()
-                
-                # --- Cálculo da Atualização Incremental (Reconstruir máscaras para o melhor movimento) ---
-                is_unique_mask = (current_coverage == 1) & (rem_coverage_row == 1)
-                nodes_losing_coverage_mask = is_unique_mask
-                lost_demand_vector = demand_vector * nodes_losing_coverage_mask
-                
-                # Fix: Incluir is_unique_mask para considerar nós transferidos diretamente de rem para add
-                nodes_gaining_coverage_mask = ((current_coverage == 0) | is_unique_mask) & (add_coverage_row == 1)
-                gained_demand_vector = demand_vector * nodes_gaining_coverage_mask
-                
-                # Aplicar Troca
-                current_coverage = current_coverage - rem_coverage_row + add_coverage_row
+                # Aplicar Troca e Atualização Incremental
+                apply_swap(rem_idx, add_idx, current_coverage, potential_gains, demand_vector,
+                           indptr, indices, col_indptr, col_indices, node_marker)
                 sol_indices[i_rem] = add_idx
                 pool_indices[local_idx_in_pool] = rem_idx
                 
                 current_z += best_delta
                 
-                # Aplicar Atualização Incremental
-                net_demand_change = lost_demand_vector - gained_demand_vector
-                potential_gains += cov_matrix_sparse @ net_demand_change
-                
                 improved = True
                 
                 if progress_callback:
@@ -461,10 +540,11 @@ def get_random_neighbor(solution, candidates_set, k):
 
 def vns(initial_solution, candidates, coverage_map, demand_dict, pre_covered_nodes, 
         k_max=10, max_iter=5000, max_no_improv=500, max_time_seconds=300, ls_strategy='best', progress_callback=None,
-        sparse_structures=None):
+        sparse_structures=None, backend=None):
     """
     VNS com Matrizes Esparsas e Limite de Tempo.
     Aceita sparse_structures pré-calculadas para evitar reprocessamento.
+    backend: 'numpy' ou 'numba' (padrão: KERNEL_BACKEND), repassado à Busca Local.
     """
     console.print(f"\n[bold green]Executando VNS (Esparso + Limite de Tempo {max_time_seconds}s + Estratégia {ls_strategy})...[/bold green]")
     
@@ -487,6 +567,9 @@ def vns(initial_solution, candidates, coverage_map, demand_dict, pre_covered_nod
         )
         console.print(f"  [blue]Formato da Matriz Esparsa: {cov_matrix_sparse.shape}[/blue]")
 
+    # Índice transposto (CSC) construído uma única vez para todas as buscas locais
+    column_index = build_column_index(cov_matrix_sparse)
+
     # Cálculo de Z Inicial
     current_z = calculate_z(initial_solution, cov_matrix_sparse, demand_vector, cand_to_idx, initial_coverage)
 
@@ -546,7 +629,9 @@ def vns(initial_solution, candidates, coverage_map, demand_dict, pre_covered_nod
                     s_prime, candidates, cov_matrix_sparse, demand_vector, cand_to_idx, initial_coverage,
                     max_iter=500, strategy=ls_strategy, show_progress=False,
                     progress_callback=progress_callback,
-                    random_tie_break=True
+                    random_tie_break=True,
+                    column_index=column_index,
+                    backend=backend
                 )
                 
                 # 3. Mudança de Vizinhança
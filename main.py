@@ -4,6 +4,8 @@ import pandas as pd
 import config
 import data_loader
 import heuristics
+import coverage_cache
+import report_utils
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -55,10 +57,6 @@ def main():
     start_time = time.time()
     
     with console.status("[bold green]Carregando dados...[/bold green]") as status:
-        # Carregar Distâncias
-        status.update("[bold green]Carregando distâncias...[/bold green]")
-        dist_df = data_loader.load_distances(config.DISTANCES_FILE, uf_filter=target_uf)
-        
         # Carregar Locais Existentes
         status.update("[bold green]Carregando locais existentes...[/bold green]")
         sites_df = data_loader.load_existing_sites(config.EXISTING_SITES_FILE, uf_filter=target_uf)
@@ -89,44 +87,20 @@ def main():
     
     console.print(stats_table)
     
-    # 3. Construir Mapa de Cobertura (Para exportação e visualização futura)
-    # Precisamos saber quais nós cobrem quais outros nós
-    # Mas primeiro, vamos lidar com a cobertura existente
-    
-    relevant_origins = set(J) | existing_site_ids
-    mask = dist_df['origem'].isin(relevant_origins) & dist_df['destino'].isin(I)
-    dist_filtered = dist_df[mask].copy()
-    
-    # Manter coverage_map para uso na exportação do CSV
-    coverage_map = heuristics.build_coverage_map(
-        dist_filtered,
-        s_dist,
-        s_time,
-        use_km,
-        candidates=J
+    # 3. Construir Estruturas de Cobertura
+    # Cenário repetido (mesmos dados, UF, métrica, raio e campi existentes): carregado do cache em disco
+    console.print("[bold blue]Construindo estruturas esparsas para otimização...[/bold blue]")
+    sparse_structures, existing_structures = coverage_cache.get_coverage_structures(
+        config.DISTANCES_FILE, demand_dict, J, I, existing_site_ids,
+        target_uf, s_dist, s_time, use_km
     )
+    cov_matrix_sparse, demand_vector, cand_to_idx, node_to_idx, initial_coverage_vector = sparse_structures
 
     # Calcular cobertura inicial a partir de locais existentes (para exibição)
-    console.print("[bold blue]Calculando cobertura inicial...[/bold blue]")
-    pre_covered = set()
-    for site in existing_site_ids:
-        if site in coverage_map:
-            pre_covered.update(coverage_map[site])
-        if site in demand_dict:
-            pre_covered.add(site)
-            
+    pre_covered = coverage_cache.pre_covered_nodes(sparse_structures)
     initial_z = sum(demand_dict.get(i, 0) for i in pre_covered)
     console.print(f"Z Inicial (Locais Existentes): [bold]{initial_z:,.0f}[/bold]")
 
-    # === CONSTRUÇÃO ESPARSA PARA OTIMIZAÇÃO (NOVO) ===
-    console.print("[bold blue]Construindo estruturas esparsas para otimização...[/bold blue]")
-    # Usando o DataFrame filtrado no passo anterior
-    cov_matrix_sparse, demand_vector, cand_to_idx, node_to_idx, initial_coverage_vector = heuristics.build_sparse_matrix_from_df(
-        dist_filtered, demand_dict, J, I, s_dist, s_time, use_km, pre_covered
-    )
-    # Agrupar para fácil passagem
-    sparse_structures = (cov_matrix_sparse, demand_vector, cand_to_idx, node_to_idx, initial_coverage_vector)
-
     # Tabela de Resultados
     results_table = Table(title="Resultados das Heurísticas")
     results_table.add_column("Método", style="cyan")
@@ -153,7 +127,7 @@ def main():
     # VNS (Já era Esparso, mas agora explicitamente unificado)
     t0 = time.time()
     s_vns, z_vns = heuristics.vns(
-        s_local, J, coverage_map, demand_dict, pre_covered, 
+        s_local, J, None, demand_dict, pre_covered, 
         ls_strategy=ls_strategy_vns,
         sparse_structures=sparse_structures
     )
@@ -174,13 +148,18 @@ def main():
     all_sites = existing_site_ids | set(s_vns)
     
     # Pré-calcular campus mais próximo para cada local da solução
-    # Para garantir, vamos filtrar dist_df novamente para distâncias Local -> Local
-    mask_sites = dist_df['origem'].isin(s_vns) & dist_df['destino'].isin(all_sites)
-    dist_sites = dist_df[mask_sites].copy()
+    # As estruturas de cobertura só têm pares dentro do raio; carregar distâncias Local -> Local sem limite
+    dist_sites = data_loader.load_distances(
+        config.DISTANCES_FILE, uf_filter=target_uf,
+        origins=s_vns, destinations=all_sites
+    )
     
     # Create a lookup for distances: (orig, dest) -> (dist, time)
     dist_lookup = dist_sites.set_index(['origem', 'destino'])[['distancia', 'tempo']].to_dict('index')
 
+    # Nós cobertos por cada local da solução (para a exportação do CSV)
+    coverage_map = coverage_cache.site_coverage(s_vns, sparse_structures, existing_structures)
+
     for site_id in s_vns:
         # 1. Inf. Básicas
         name = names_dict.get(site_id, 'Desconhecido')
@@ -256,10 +235,11 @@ def main():
     
     # Gerar nome de arquivo com timestamp
     timestamp = time.strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(results_dir, f'solution_vns_{timestamp}.csv')
-    
-    df_sol.to_csv(output_file, index=False, sep=';')
-    console.print(f"Solução salva em [underline]{output_file}[/underline]")
+    # Gravada em blocos direto no disco, em cada formato configurado
+    for fmt in config.RESULT_FORMATS:
+        output_file = os.path.join(results_dir, f'solution_vns_{timestamp}.{fmt}')
+        report_utils.export_table(df_sol, output_file, fmt)
+        console.print(f"Solução salva em [underline]{output_file}[/underline]")
     
     console.print(f"\n[bold green]Tempo Total de Execução: {time.time() - start_time:.2f}s[/bold green]")
 
@@ -1,21 +1,350 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pydeck as pdk
 import os
+import functools
 import config
 import data_loader
+import dataset_registry
+import shared_cache
 import report_utils
-import math
-import json
+import report_pipeline
 
-@st.cache_data(show_spinner=False)
-def get_cached_excel(_gdf, demand_col, run_id):
-    return report_utils.generate_excel_download(_gdf, demand_col)
+# --- ARTEFATOS POR RESULTADO ---
+# Camadas dos mapas, Excel, PDF e HTML ficam no store de artefatos do processo
+# (shared_cache.cached_artifact), com chave na impressão digital do resultado
+# (data['fingerprint']): cenários idênticos, de qualquer sessão, reutilizam os mesmos artefatos.
 
-@st.cache_data(show_spinner=False)
-def get_cached_pdf(_gdf, demand_col, total_demand, covered_demand, coverage_percent, params, _solution_df, run_results, run_id):
-    return report_utils.generate_pdf_report(
-        _gdf, demand_col, total_demand, covered_demand, coverage_percent, params, _solution_df, run_results
+FEATURE_BYTES = 512   # Estimativa por feature (propriedades da execução) para o limite do store
+
+class LayerArtifact:
+    """Camada pydeck pronta, com estimativa de memória (nbytes) para o store de artefatos."""
+
+    def __init__(self, layer, n_features):
+        self.layer = layer
+        self.nbytes = n_features * FEATURE_BYTES
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+TABLE_FORMATS = [('parquet', "Parquet", "application/vnd.apache.parquet"), ('csv.gz', "CSV.gz", "application/gzip")]
+
+def render_export_buttons(exports):
+    """
+    Botões de download dos artefatos gerados em segundo plano (report_pipeline).
+    exports: [(coluna, título, rótulo, arquivo, mime, (tipo, impressão digital, parâmetros, construtor))].
+    Enquanto houver artefato pendente, o fragmento se atualiza a cada REPORT_POLL_SECONDS.
+    """
+    pipeline = report_pipeline.get_report_pipeline()
+    pending = any(pipeline.request(*job)[0] == report_pipeline.RUNNING for *_, job in exports)
+
+    @st.fragment(run_every=config.REPORT_POLL_SECONDS if pending else None)
+    def export_buttons():
+        columns = st.columns(2)
+        titles = set()
+        still_pending = False
+        for column, title, label, file_name, mime, job in exports:
+            with columns[column]:
+                if (column, title) not in titles:
+                    st.markdown(f"##### {title}")
+                    titles.add((column, title))
+                state, value = pipeline.request(*job)
+                if state == report_pipeline.READY:
+                    st.download_button(label=label, data=value, file_name=file_name, mime=mime)
+                elif state == report_pipeline.FAILED:
+                    st.error(f"Erro ao gerar {file_name}: {value}")
+                else:
+                    still_pending = True
+                    st.button(f"⏳ Gerando {file_name}...", disabled=True, key=f"pendente_{file_name}")
+        # Tudo pronto: uma execução completa desliga a atualização periódica
+        if pending and not still_pending:
+            st.rerun()
+
+    export_buttons()
+
+
+# --- GEOMETRIA ESTÁTICA DOS MAPAS ---
+# A malha (polígonos em GeoJSON, EPSG:4326) não muda entre execuções: é serializada
+# uma vez por UF e nível de detalhe e fica no cache compartilhado. A cada execução
+# apenas os atributos (status, cor, demanda, campi) são montados e anexados às
+# mesmas geometrias, sem copiar/reprojetar/serializar o GeoDataFrame inteiro.
+
+STATIC_PROPERTIES = ['NM_MUN', 'SIGLA_UF']
+
+class StaticGeometry:
+    """Features GeoJSON da malha (geometria + propriedades fixas), alinhadas por 'id'."""
+
+    def __init__(self, gdf):
+        if gdf.crs is not None and gdf.crs != "EPSG:4326":
+            gdf = gdf.to_crs("EPSG:4326")
+        self.ids = gdf['id'].to_numpy(dtype=np.int64)
+        self.geometries = [f['geometry'] for f in gdf.geometry.__geo_interface__['features']]
+        static_cols = [c for c in STATIC_PROPERTIES if c in gdf.columns]
+        static = gdf[static_cols].astype(object).where(gdf[static_cols].notna(), None)
+        self.properties = static.to_dict('records')
+        # Estimativa para o limite do cache: ~64 bytes por vértice em listas Python
+        self.nbytes = int(gdf.geometry.count_coordinates().sum()) * 64 + len(self.ids) * 256
+
+    def feature_collection(self, frame, columns, ids=None):
+        """
+        FeatureCollection com as geometrias em cache e as colunas de `frame`
+        (alinhadas pelo 'id') como propriedades. ids: restringe às features informadas.
+        frame=None: apenas geometria e propriedades fixas.
+        """
+        columns = [c for c in columns if c in frame.columns] if frame is not None else []
+        values = {}
+        if columns:
+            attrs = frame.drop_duplicates('id').set_index('id').reindex(self.ids)[columns]
+            values = {c: attrs[c].astype(object).where(attrs[c].notna(), None).tolist() for c in columns}
+
+        rows = range(len(self.ids)) if ids is None else np.flatnonzero(np.isin(self.ids, list(ids)))
+        features = []
+        for k in rows:
+            props = dict(self.properties[k])
+            for c in columns:
+                props[c] = values[c][k]
+            features.append({'type': 'Feature', 'geometry': self.geometries[k], 'properties': props})
+        return {'type': 'FeatureCollection', 'features': features}
+
+def get_static_geometry(shp_file, target_uf, tolerance, gdf_base):
+    """StaticGeometry da malha da UF/nível, construída uma vez por processo."""
+    return shared_cache.cached(
+        'geojson', data_loader.shapefile_fingerprint(shp_file, target_uf, tolerance),
+        (data_loader.uf_code(target_uf), tolerance),
+        lambda: StaticGeometry(gdf_base)
+    )
+
+
+# --- BUSCA (ZOOM) E TOOLTIPS ---
+# A busca não invalida as camadas em cache: gera só um novo ViewState e uma camada
+# de destaque com a feature do município, montados sobre as camadas já prontas.
+
+SEARCH_ZOOM = 9
+
+TOOLTIP_STYLE = {
+    "backgroundColor": "#333333",
+    "color": "white",
+    "maxWidth": "350px",
+    "whiteSpace": "normal"
+}
+
+def coverage_tooltip(demand_col):
+    return {
+        "html": "<b>{NM_MUN} - {SIGLA_UF}</b><br/>"
+                "Status: {status}<br/>"
+                "Demanda: {" + demand_col + "}<br/>"
+                "Coberto por: {covering_campuses}",
+        "style": TOOLTIP_STYLE
+    }
+
+def demand_tooltip(demand_col):
+    return {
+        "html": "<b>{NM_MUN} - {SIGLA_UF}</b><br/>"
+                "Demanda: {" + demand_col + "}",
+        "style": TOOLTIP_STYLE
+    }
+
+def search_view(default_view, static_geometry, coords_dict, selected_id):
+    """(ViewState, camadas de destaque) do município buscado; sem busca, a vista padrão."""
+    if selected_id is None:
+        return default_view, []
+    center = coords_dict.mean([selected_id])
+    view_state = default_view
+    if center:
+        view_state = pdk.ViewState(latitude=center[0], longitude=center[1], zoom=SEARCH_ZOOM, pitch=0)
+
+    geojson_highlight = static_geometry.feature_collection(None, [], ids=[selected_id])
+    if not geojson_highlight['features']:
+        return view_state, []
+    highlight_layer = pdk.Layer(
+        "GeoJsonLayer",
+        geojson_highlight,
+        pickable=False,
+        stroked=True,
+        filled=False,                      # Preenchimento transparente
+        get_line_color=[0, 255, 255, 255], # Ciano
+        line_width_min_pixels=3,
+        opacity=1.0
+    )
+    return view_state, [highlight_layer]
+
+
+# --- STATUS DE COBERTURA (VETORIZADO) ---
+# Códigos inteiros por município; rótulos e cores saem de tabelas indexadas pelo código.
+
+STATUS_LABELS = np.array([
+    'Existing_Site', 'Existing_Covered', 'New_Site', 'New_Site_Overlapping', 'New_Covered', 'Uncovered'
+], dtype=object)
+STATUS_PALETTE = np.array([
+    [0, 0, 139, 200],       # Existing_Site
+    [100, 149, 237, 150],   # Existing_Covered
+    [0, 100, 0, 200],       # New_Site
+    [255, 215, 0, 200],     # New_Site_Overlapping
+    [144, 238, 144, 150],   # New_Covered
+    [200, 200, 200, 50],    # Uncovered
+], dtype=np.uint8)
+UNCOVERED = 5
+
+def coverage_status(matrix, site_ids, node_ids, existing_ids, new_ids):
+    """
+    Códigos de status (índices de STATUS_LABELS) por nó de demanda. As contagens de
+    campi existentes/novos que cobrem cada nó saem de um único produto esparso
+    (matriz locais x nós transposta vezes os indicadores dos locais).
+    """
+    existing_ids, new_ids = list(existing_ids), list(new_ids)
+    indicators = np.column_stack([np.isin(site_ids, existing_ids), np.isin(site_ids, new_ids)]).astype(np.int32)
+    counts = np.asarray(matrix.T @ indicators)
+    covered_existing, covered_new = counts[:, 0] > 0, counts[:, 1] > 0
+
+    is_new = np.isin(node_ids, new_ids)
+    codes = np.full(len(node_ids), UNCOVERED, dtype=np.int8)
+    codes[covered_new] = 4
+    codes[covered_existing] = 1
+    codes[is_new] = np.where(covered_existing[is_new], 3, 2)
+    codes[np.isin(node_ids, existing_ids)] = 0
+    return codes
+
+def covering_labels(matrix, site_labels):
+    """Rótulos (ordenados) dos locais que cobrem cada nó, percorrendo a matriz em CSC; 'Nenhum' se vazio."""
+    # Linhas reordenadas pelo rótulo: cada coluna da CSC já sai em ordem alfabética
+    order = sorted(range(len(site_labels)), key=site_labels.__getitem__)
+    sorted_labels = np.asarray([site_labels[k] for k in order], dtype=object)
+    csc = matrix[order].tocsc()
+    csc.sort_indices()
+
+    labels = np.full(matrix.shape[1], "Nenhum", dtype=object)
+    indptr, indices = csc.indptr, csc.indices
+    for j in np.flatnonzero(np.diff(indptr)):
+        labels[j] = ", ".join(sorted_labels[indices[indptr[j]:indptr[j + 1]]])
+    return labels
+
+
+# --- ESCALA DE CALOR DA DEMANDA (VETORIZADA) ---
+# Gradiente amarelo claro (255, 255, 200) -> vermelho (255, 0, 0) em escala logarítmica,
+# pré-calculado em 256 níveis; demanda zero/ausente fica cinza.
+
+HEAT_LEVELS = np.linspace(0.0, 1.0, 256)
+HEAT_LUT = np.column_stack([
+    np.full(256, 255),
+    (255 * (1 - HEAT_LEVELS)).astype(int),
+    (200 * (1 - HEAT_LEVELS)).astype(int),
+    np.full(256, 200),
+]).astype(np.uint8)
+NO_DEMAND_COLOR = np.array([200, 200, 200, 50], dtype=np.uint8)
+
+def heat_colors(values):
+    """Cores RGBA (uint8, n x 4) da demanda: log normalizado entre o menor e o maior valor positivo."""
+    values = np.asarray(values, dtype=np.float64)
+    colors = np.tile(NO_DEMAND_COLOR, (len(values), 1))
+    positive = values > 0
+    if positive.any():
+        logs = np.log(np.maximum(values[positive], 1))
+        min_log, max_log = logs.min(), logs.max()
+        norm = np.full(logs.shape, 0.5) if max_log == min_log else (logs - min_log) / (max_log - min_log)
+        colors[positive] = HEAT_LUT[np.rint(norm * 255).astype(np.intp)]
+    return colors
+
+def get_heat_colors(demand_key, shp_file, target_uf, demand_col, values):
+    """
+    heat_colors dos municípios da malha, por (demanda, UF, coluna): não depende da solução,
+    então é calculado uma vez por processo. Retorna (cores, maior demanda).
+    """
+    fingerprint = '|'.join((demand_key,
+                            data_loader.shapefile_fingerprint(shp_file, target_uf, config.MAP_TOLERANCE)))
+    def _build():
+        values_arr = np.asarray(values, dtype=np.float64)
+        positive = values_arr[values_arr > 0]
+        return heat_colors(values_arr), float(positive.max()) if positive.size else 0
+    return shared_cache.cached('cores_calor', fingerprint, (data_loader.uf_code(target_uf), demand_col), _build)
+
+
+# --- NÍVEL DE DETALHE (LOD) ---
+# No mapa nacional (sem filtro de UF) e sem busca, os polígonos são as 27 UFs, dissolvidas
+# e simplificadas uma vez por processo, com demanda somada e contagem de municípios por
+# status: dezenas de features em vez de ~5.570. Com UF selecionada ou município buscado,
+# o nível volta a ser o município. Cada nível é montado sob demanda e fica em cache.
+
+LEVEL_UF = 'uf'
+LEVEL_MUNICIPALITY = 'municipio'
+
+UF_STATUS_COLUMNS = [
+    'n_existente', 'n_cobertura_existente', 'n_novo', 'n_novo_sobreposto', 'n_nova_cobertura', 'n_sem_cobertura'
+]
+UF_UNCOVERED_COLOR = STATUS_PALETTE[UNCOVERED].astype(np.float64)
+UF_COVERED_COLOR = np.array([0, 100, 0, 200], dtype=np.float64)
+
+def map_level(target_uf, selected_id):
+    """Nível de detalhe: agregado por UF no mapa nacional sem busca; município caso contrário."""
+    return LEVEL_UF if target_uf is None and selected_id is None else LEVEL_MUNICIPALITY
+
+def get_uf_geometry(shp_file, tolerance, gdf_base):
+    """StaticGeometry das UFs (municípios dissolvidos por id // 100000), construída uma vez por processo."""
+    def _build():
+        ufs = gdf_base[['id', 'SIGLA_UF', 'geometry']].assign(id=gdf_base['id'] // 100000)
+        ufs = ufs.dissolve(by='id', aggfunc='first').reset_index()
+        ufs['geometry'] = ufs.geometry.simplify(config.UF_MAP_TOLERANCE)
+        return StaticGeometry(ufs)
+    return shared_cache.cached(
+        'geojson_uf', data_loader.shapefile_fingerprint(shp_file, None, tolerance),
+        (tolerance, config.UF_MAP_TOLERANCE), _build
+    )
+
+def uf_aggregates(gdf, demand_col):
+    """
+    Atributos por UF (id = código IBGE da UF): municípios, demanda somada, demanda
+    coberta, contagem de municípios por status e cor pela fração da demanda coberta.
+    """
+    uf = (gdf['id'] // 100000).to_numpy()
+    demand = pd.to_numeric(gdf[demand_col], errors='coerce').fillna(0).to_numpy() if demand_col in gdf.columns else np.zeros(len(gdf))
+    codes = gdf['status_code'].to_numpy()
+
+    ufs, uf_idx = np.unique(uf, return_inverse=True)
+    counts = np.zeros((len(ufs), len(STATUS_LABELS)), dtype=np.int64)
+    np.add.at(counts, (uf_idx, codes), 1)
+    total = np.bincount(uf_idx, weights=demand, minlength=len(ufs))
+    covered = np.bincount(uf_idx, weights=np.where(codes != UNCOVERED, demand, 0), minlength=len(ufs))
+    share = np.divide(covered, total, out=np.zeros_like(total), where=total > 0)
+
+    frame = pd.DataFrame(counts, columns=UF_STATUS_COLUMNS)
+    frame.insert(0, 'id', ufs)
+    frame['municipios'] = counts.sum(axis=1)
+    frame[demand_col] = total
+    frame['demanda_coberta'] = covered
+    frame['cobertura'] = [f"{100 * v:.1f}%" for v in share]
+    colors = UF_UNCOVERED_COLOR + share[:, None] * (UF_COVERED_COLOR - UF_UNCOVERED_COLOR)
+    frame['fill_color'] = np.rint(colors).astype(np.uint8).tolist()
+    return frame
+
+def uf_coverage_tooltip(demand_col):
+    return {
+        "html": "<b>{SIGLA_UF}</b> ({municipios} municípios)<br/>"
+                "Demanda: {" + demand_col + "}<br/>"
+                "Demanda coberta: {demanda_coberta} ({cobertura})<br/>"
+                "Existentes: {n_existente} | Novos: {n_novo} (sobrepostos: {n_novo_sobreposto})<br/>"
+                "Cobertura existente: {n_cobertura_existente} | Nova cobertura: {n_nova_cobertura}<br/>"
+                "Sem cobertura: {n_sem_cobertura}",
+        "style": TOOLTIP_STYLE
+    }
+
+def uf_demand_tooltip(demand_col):
+    return {
+        "html": "<b>{SIGLA_UF}</b> ({municipios} municípios)<br/>"
+                "Demanda: {" + demand_col + "}",
+        "style": TOOLTIP_STYLE
+    }
+
+def polygon_layer(geojson, line_color):
+    """GeoJsonLayer de polígonos coloridos por 'properties.fill_color'."""
+    return pdk.Layer(
+        "GeoJsonLayer",
+        geojson,
+        pickable=True,
+        stroked=True,
+        filled=True,
+        get_fill_color="properties.fill_color",
+        get_line_color=line_color,
+        line_width_min_pixels=0.5,
+        opacity=0.8,
+        auto_highlight=True
     )
 
 
@@ -32,23 +361,31 @@ def render_maps(data):
     names_dict = data['names_dict']
     uf_dict = data['uf_dict']
     coords_dict = data['coords_dict']
-    coverage_map = data['coverage_map']
+    coverage_matrix = data['coverage_matrix']
     pre_covered = data['pre_covered']
     use_km = data['use_km']
     
     # Recuperar parâmetros armazenados
     target_uf = data.get('target_uf')
     demand_file = data.get('demand_file')
+    demand_source = data.get('demand_source', demand_file)
     demand_col = data.get('demand_col')
+    fingerprint = data['fingerprint']
     
     st.header("🗺️ Visualização Geográfica")
     
-    shp_file = os.path.join(config.DATA_DIR, "BR_Municipios_2024.shp")
+    shp_file = config.SHAPEFILE
     
-    # Carregar Shapefile (Comum)
-    gdf_base = data_loader.load_shapefile(shp_file, uf_filter=target_uf, tolerance=0.005)
+    # Carregar Shapefile (Comum); usa a malha GeoParquet pré-simplificada quando existir
+    gdf_base = data_loader.load_shapefile(shp_file, uf_filter=target_uf, tolerance=config.MAP_TOLERANCE)
         
     if gdf_base is not None:
+        static_geometry = get_static_geometry(shp_file, target_uf, config.MAP_TOLERANCE, gdf_base)
+        # Artefatos dos mapas: chave (resultado, malha da UF/nível)
+        map_fingerprint = data_loader.shapefile_fingerprint(shp_file, target_uf, config.MAP_TOLERANCE)
+        # Resolvida aqui: construtores em segundo plano não acessam a sessão
+        demand_key = dataset_registry.content_key(demand_source)
+
         # Geometria já simplificada no carregamento
 
         # --- Caixa de Busca ---
@@ -63,24 +400,13 @@ def render_maps(data):
         # Ordenar por rótulo
         search_options = sorted(search_items, key=lambda x: x[0])
         
-        # Inicializar contador na session state
-        if 'map_key_counter' not in st.session_state:
-            st.session_state.map_key_counter = 0
-            
-        def update_map_key():
-            st.session_state.map_key_counter += 1
-        
         search_selection = st.selectbox(
             "🔍 Buscar Município (Zoom)", 
             options=[(None, None)] + search_options, 
             format_func=lambda x: "Selecione um município..." if x[0] is None else x[0],
             help="Selecione um município para centralizar o mapa. Digite para buscar.",
-            on_change=update_map_key,
             key="municipality_search"
         )
-            
-        # Chave base para esta renderização
-        current_map_key = f"map_v{st.session_state.map_key_counter}"
 
         # --- Preparar Dados (Global) ---
         # Carregar Dados de Demanda globalmente para uso em ambos os mapas e exportação
@@ -89,24 +415,9 @@ def render_maps(data):
         
         try:
             df_map = None
-            if hasattr(demand_file, 'seek'):
-                demand_file.seek(0)
-                if hasattr(demand_file, 'name') and demand_file.name.lower().endswith('.parquet'):
-                    df_map = pd.read_parquet(demand_file)
-                else:
-                    try:
-                        df_map = pd.read_csv(demand_file, sep=None, engine='python', encoding='utf-8', dtype=str)
-                    except UnicodeDecodeError:
-                        demand_file.seek(0)
-                        df_map = pd.read_csv(demand_file, sep=None, engine='python', encoding='latin1', dtype=str)
-            elif os.path.exists(demand_file):
-                if demand_file.lower().endswith('.parquet'):
-                    df_map = pd.read_parquet(demand_file)
-                else:
-                    try:
-                        df_map = pd.read_csv(demand_file, sep=None, engine='python', encoding='utf-8', dtype=str)
-                    except UnicodeDecodeError:
-                        df_map = pd.read_csv(demand_file, sep=None, engine='python', encoding='latin1', dtype=str)
+            # Mesmo DataFrame já registrado para a prévia da barra lateral (sem reler o arquivo)
+            if hasattr(demand_source, 'getvalue') or os.path.exists(demand_source):
+                df_map = dataset_registry.get_frame(demand_source)
             
             if df_map is not None:
                 # Identificar coluna ID
@@ -139,133 +450,51 @@ def render_maps(data):
         with col1:
             st.markdown("### 📍 Mapa de Cobertura")
             
-            # Lógica de Cache
-            current_cache_key = (id(data), st.session_state.get('map_key_counter', 0))
-            
-            if 'last_map_cache_key' not in st.session_state or st.session_state.last_map_cache_key != current_cache_key:
-                
+            # Cache: atributos, pontos e vista dependem só do resultado (a busca não os invalida)
+            def coverage_base():
                 gdf = gdf_global.copy()
                 
-                # 1. Calcular Status de Cobertura para TODOS os nós
-                status_dict = {i: 'Uncovered' for i in demand_dict.keys()}
+                # 1. Status de Cobertura para TODOS os nós (produto esparso locais x nós)
+                cov_matrix, site_ids, node_ids = coverage_matrix
+                node_codes = coverage_status(cov_matrix, site_ids, node_ids, existing_site_ids, s_vns)
                 
-                # Marcar Cobertura Existente
-                for site in existing_site_ids:
-                    if site in status_dict: status_dict[site] = 'Existing_Site'
-                    for covered in coverage_map.get(site, set()):
-                        if covered in status_dict and status_dict[covered] != 'Existing_Site':
-                            status_dict[covered] = 'Existing_Covered'
-                        
-                # Marcar Nova Cobertura
-                for site in s_vns:
-                    was_covered = status_dict.get(site) == 'Existing_Covered'
-                    if status_dict.get(site) != 'Existing_Site':
-                        if was_covered:
-                            status_dict[site] = 'New_Site_Overlapping'
-                        else:
-                            status_dict[site] = 'New_Site'
-                    
-                    for covered in coverage_map.get(site, set()):
-                        current_status = status_dict.get(covered)
-                        if current_status not in ('Existing_Site', 'Existing_Covered', 'New_Site', 'New_Site_Overlapping'):
-                            status_dict[covered] = 'New_Covered'
-                            
-                # 2. Mesclar com GeoDataFrame
-                gdf['status'] = gdf['id'].map(status_dict).fillna('Uncovered')
+                # 2. Mesclar com GeoDataFrame (municípios fora da demanda: sem cobertura)
+                codes = gdf['id'].map(pd.Series(node_codes, index=node_ids)).fillna(UNCOVERED).astype(int).to_numpy()
+                gdf['status'] = STATUS_LABELS[codes]
+                gdf['status_code'] = codes
                 
-                # Mapear string de status de volta para código para geração de relatório
-                status_code_map = {
-                    'Existing_Site': 0,
-                    'Existing_Covered': 1,
-                    'New_Site': 2,
-                    'New_Site_Overlapping': 3,
-                    'New_Covered': 4,
-                    'Uncovered': 5
-                }
-                gdf['status_code'] = gdf['status'].map(status_code_map).fillna(5).astype(int)
-                
-                # 3. Definir Cores
-                def get_color(status):
-                    if status == 'Existing_Site': return [0, 0, 139, 200]
-                    elif status == 'Existing_Covered': return [100, 149, 237, 150]
-                    elif status == 'New_Site': return [0, 100, 0, 200]
-                    elif status == 'New_Site_Overlapping': return [255, 215, 0, 200]
-                    elif status == 'New_Covered': return [144, 238, 144, 150]
-                    else: return [200, 200, 200, 50]
-                        
-                gdf['fill_color'] = gdf['status'].apply(get_color)
-
-                # --- NOVO: Adicionar Info de Campi de Cobertura ---
-                # Construir dicionário: city_id -> lista de nomes de campi cobrindo
-                city_covering_campuses = {}
-
-                # Auxiliar para adicionar info de cobertura
-                def register_coverage(site_id, label_suffix=""):
-                    site_name = names_dict.get(site_id, f"ID {site_id}")
-                    full_label = f"{site_name}{label_suffix}"
-                    
-                    covered_cities = coverage_map.get(site_id, set())
-                    
-                    for city_id in covered_cities:
-                        if city_id not in city_covering_campuses:
-                            city_covering_campuses[city_id] = []
-                        city_covering_campuses[city_id].append(full_label)
-
-                # Registrar Locais Existentes
-                for site in existing_site_ids:
-                    register_coverage(site, " (Existente)")
-
-                # Registrar Novos Locais
-                for site in s_vns:
-                    register_coverage(site, " (Novo)")
-
-                # Mapear para DataFrame
-                def get_covering_str(city_id):
-                    campuses = city_covering_campuses.get(city_id, [])
-                    if not campuses:
-                        return "Nenhum"
-                    # Ordenar para exibição consistente
-                    return ", ".join(sorted(campuses))
-
-                gdf['covering_campuses'] = gdf['id'].apply(get_covering_str)
-                
-                # Converter para GeoJSON
-                if gdf.crs != "EPSG:4326":
-                    gdf = gdf.to_crs("EPSG:4326")
-                    
-                geojson_data = getattr(gdf, "__geo_interface__", None)
-                if not geojson_data:
-                     geojson_data = json.loads(gdf.to_json())
-        
-                # 4. Renderizar Mapa
-                layers = []
+                # 3. Definir Cores (tabela indexada pelo código)
+                gdf['fill_color'] = STATUS_PALETTE[codes].tolist()
+
+                # Campi que cobrem cada município: "Nome (Existente)" / "Nome (Novo)"
+                site_labels = [
+                    f"{names_dict.get(s, f'ID {s}')} ({'Existente' if s in existing_site_ids else 'Novo'})"
+                    for s in site_ids.tolist()
+                ]
+                node_labels = pd.Series(covering_labels(cov_matrix, site_labels), index=node_ids)
+                gdf['covering_campuses'] = gdf['id'].map(node_labels).fillna("Nenhum")
                 
-                # Camada de Polígonos
-                shape_layer = pdk.Layer(
-                    "GeoJsonLayer",
-                    geojson_data,
-                    pickable=True,
-                    stroked=True,
-                    filled=True,
-                    get_fill_color="properties.fill_color",
-                    get_line_color=[255, 255, 255, 100],
-                    line_width_min_pixels=0.5,
-                    opacity=0.8,
-                    auto_highlight=True
-                )
-                layers.append(shape_layer)
+                # 4. Renderizar Mapa (polígonos montados por nível de detalhe, abaixo)
+                point_layers = []
                 
                 # Camada de Pontos
-                site_points = []
-                for site in existing_site_ids:
-                     lat, lon = coords_dict.get(site, (None, None))
-                     if lat: site_points.append({'lat': lat, 'lon': lon, 'type': 'Existente', 'color': [0, 0, 139, 255], 'radius': 2000})
-                for site in s_vns:
-                     lat, lon = coords_dict.get(site, (None, None))
-                     if lat: site_points.append({'lat': lat, 'lon': lon, 'type': 'Novo', 'color': [0, 100, 0, 255], 'radius': 3000})
-                     
-                if site_points:
-                    points_df = pd.DataFrame(site_points)
+                # Coordenadas buscadas de uma vez (vetorizado) no CoordinateStore
+                point_groups = [
+                    (list(existing_site_ids), 'Existente', [0, 0, 139, 255], 2000),
+                    (list(s_vns), 'Novo', [0, 100, 0, 255], 3000),
+                ]
+                point_frames = []
+                for sites, site_type, color, radius in point_groups:
+                    lat, lon = coords_dict.lookup(sites)
+                    found = np.isfinite(lat)
+                    n = int(found.sum())
+                    point_frames.append(pd.DataFrame({
+                        'lat': lat[found], 'lon': lon[found], 'type': site_type,
+                        'color': [color] * n, 'radius': radius
+                    }))
+                points_df = pd.concat(point_frames, ignore_index=True)
+
+                if not points_df.empty:
                     points_layer = pdk.Layer(
                         "ScatterplotLayer",
                         points_df,
@@ -277,16 +506,12 @@ def render_maps(data):
                         stroked=True,
                         get_line_color=[255, 255, 255, 200]
                     )
-                    layers.append(points_layer)
+                    point_layers.append(points_layer)
         
                 # Estado de Visualização
-                active_coords = [coords_dict[i] for i in status_dict if i in coords_dict]
-                if active_coords:
-                    mean_lat = sum(c[0] for c in active_coords) / len(active_coords)
-                    mean_lon = sum(c[1] for c in active_coords) / len(active_coords)
-                else:
-                    mean_lat, mean_lon = -15, -50
-                zoom_level = 6
+                center = coords_dict.mean(demand_dict.keys())
+                mean_lat, mean_lon = center if center else (-15, -50)
+                zoom_level = 6 if target_uf else 4
                     
                 view_state = pdk.ViewState(
                     latitude=mean_lat,
@@ -295,57 +520,36 @@ def render_maps(data):
                     pitch=0,
                 )
                 
-                # Camada de Destaque
-                if search_selection[1] is not None:
-                    selected_id = search_selection[1]
-                    gdf_highlight = gdf[gdf['id'] == selected_id]
-                    if not gdf_highlight.empty:
-                        geojson_highlight = getattr(gdf_highlight, "__geo_interface__", None)
-                        if not geojson_highlight:
-                            geojson_highlight = json.loads(gdf_highlight.to_json())
-                            
-                        highlight_layer = pdk.Layer(
-                            "GeoJsonLayer",
-                            geojson_highlight,
-                            pickable=False,
-                            stroked=True,
-                            filled=False,
-                            get_line_color=[0, 255, 255, 255],
-                            line_width_min_pixels=3,
-                            opacity=1.0
-                        )
-                        layers.append(highlight_layer)
-    
-                # Criar Deck
-                deck = pdk.Deck(
-                    layers=layers,
-                    initial_view_state=view_state,
-                    tooltip={
-                        "html": "<b>{NM_MUN} - {SIGLA_UF}</b><br/>"
-                                "Status: {status}<br/>"
-                                "Demanda: {" + demand_col + "}<br/>"
-                                "Coberto por: {covering_campuses}",
-                        "style": {
-                            "backgroundColor": "#333333",
-                            "color": "white",
-                            "maxWidth": "350px",
-                            "whiteSpace": "normal"
-                        }
-                    }
-                )
-                
-                # Atualizar Cache
-                st.session_state.cached_map_deck = deck
-                st.session_state.last_map_cache_key = current_cache_key
-                st.session_state.cached_layers = layers
-                st.session_state.cached_view_state = view_state
-                st.session_state.cached_gdf = gdf
+                return gdf, point_layers, view_state
+
+            gdf, point_layers, view_state = shared_cache.cached_artifact(
+                'mapa_cobertura', fingerprint, (map_fingerprint,), coverage_base
+            )
+
+            # GeoJSON: geometria em cache (UF/nível); apenas os atributos da execução são anexados
+            def coverage_polygons(level):
+                def build():
+                    if level == LEVEL_UF:
+                        uf_geometry = get_uf_geometry(shp_file, config.MAP_TOLERANCE, gdf_base)
+                        uf_frame = uf_aggregates(gdf, demand_col)
+                        geojson_data = uf_geometry.feature_collection(uf_frame, uf_frame.columns.drop('id'))
+                    else:
+                        coverage_columns = ['status', 'fill_color', demand_col, 'covering_campuses']
+                        geojson_data = static_geometry.feature_collection(gdf, coverage_columns)
+                    return LayerArtifact(polygon_layer(geojson_data, [255, 255, 255, 100]), len(geojson_data['features']))
+                return shared_cache.cached_artifact(
+                    'camadas_cobertura', fingerprint, (map_fingerprint, level), build
+                ).layer
+
+            level = map_level(target_uf, search_selection[1])
             
-            # Usar Dados em Cache
-            deck = st.session_state.cached_map_deck
-            layers = st.session_state.cached_layers
-            view_state = st.session_state.cached_view_state
-            gdf = st.session_state.get('cached_gdf', None)
+            # Busca: apenas nova vista e camada de destaque sobre as camadas em cache
+            search_view_state, highlight_layers = search_view(view_state, static_geometry, coords_dict, search_selection[1])
+            deck = pdk.Deck(
+                layers=[coverage_polygons(level)] + point_layers + highlight_layers,
+                initial_view_state=search_view_state,
+                tooltip=uf_coverage_tooltip(demand_col) if level == LEVEL_UF else coverage_tooltip(demand_col)
+            )
             
             st.pydeck_chart(deck, key="map_coverage_static", use_container_width=True)
             
@@ -361,144 +565,55 @@ def render_maps(data):
                 <div><span style="border: 2px solid cyan; display: inline-block; width: 12px; height: 12px;"></span> Selecionado</div>
             </div>
             """, unsafe_allow_html=True)
+            if level == LEVEL_UF:
+                st.caption("Visão nacional por UF (cor: fração da demanda coberta). "
+                           "Filtre uma UF ou busque um município para ver o detalhe por município.")
 
         # --- COLUNA 2: Mapa de Calor de Demanda ---
         with col2:
             st.markdown("### 🔥 Mapa de Calor da Demanda")
             
-            # Lógica de Cache
-            current_cache_key = (id(data), st.session_state.get('map_key_counter', 0))
-            
-            if 'last_demand_cache_key' not in st.session_state or st.session_state.last_demand_cache_key != current_cache_key:
-                
+            # Polígonos do mapa de calor por nível de detalhe, montados sob demanda (store de artefatos)
+            def heat_polygons(level):
+                def build():
+                    if level == LEVEL_UF:
+                        uf_frame = uf_aggregates(gdf, demand_col)[['id', 'municipios', demand_col]]
+                        uf_frame['fill_color'] = heat_colors(uf_frame[demand_col]).tolist()
+                        uf_geometry = get_uf_geometry(shp_file, config.MAP_TOLERANCE, gdf_base)
+                        geojson_dem = uf_geometry.feature_collection(uf_frame, ['municipios', demand_col, 'fill_color'])
+                    else:
+                        gdf_dem = gdf_global.copy()
+                    
+                        # Escala de Cores (Logarítmica), em cache por (UF, coluna de demanda)
+                        colors, _ = get_heat_colors(
+                            demand_key, shp_file, target_uf, demand_col, gdf_dem[demand_col]
+                        )
+                        gdf_dem['fill_color'] = colors.tolist()
+                    
+                        # GeoJSON: geometria em cache; apenas demanda e cor por município
+                        geojson_dem = static_geometry.feature_collection(gdf_dem, [demand_col, 'fill_color'])
+                    return LayerArtifact(polygon_layer(geojson_dem, [255, 255, 255, 50]), len(geojson_dem['features']))
+                return shared_cache.cached_artifact(
+                    'camadas_calor', fingerprint, (map_fingerprint, level), build
+                ).layer
+
+            heat_layers = None
+            if demand_loaded:
                 with st.spinner("Gerando mapa de calor..."):
                     try:
-                        if demand_loaded:
-                            gdf_dem = gdf_global.copy()
-                            
-                            # --- Implementação PyDeck ---
-                            
-                            # 1. Calcular Escala de Cores (Logarítmica)
-                            
-                            # Filtrar valores positivos para cálculo de log
-                            positive_demands = gdf_dem[gdf_dem[demand_col] > 0][demand_col]
-                            
-                            if not positive_demands.empty:
-                                min_val = positive_demands.min()
-                                max_val = positive_demands.max()
-                                
-                                # Evitar problemas com log(0) ou log(1) se min_val for pequeno
-                                min_log = math.log(max(min_val, 1))
-                                max_log = math.log(max(max_val, 1))
-                                
-                                def get_heat_color(val):
-                                    if val <= 0:
-                                        return [200, 200, 200, 50] # Grey for 0/Null
-                                        
-                                    val_log = math.log(max(val, 1))
-                                    
-                                    if max_log == min_log:
-                                        norm = 0.5
-                                    else:
-                                        norm = (val_log - min_log) / (max_log - min_log)
-                                    
-                                    # Gradiente de Cores: Amarelo Claro (255, 255, 200) para Vermelho (255, 0, 0)
-                                    r = 255
-                                    g = int(255 * (1 - norm))
-                                    b = int(200 * (1 - norm)) 
-                                    
-                                    return [r, g, b, 200]
-                            else:
-                                # Fallback se não houver demanda positiva
-                                min_val = 0
-                                max_val = 0
-                                def get_heat_color(val):
-                                    return [200, 200, 200, 50]
-    
-                            gdf_dem['fill_color'] = gdf_dem[demand_col].apply(get_heat_color)
-                            
-                            # Converter para GeoJSON
-                            if gdf_dem.crs != "EPSG:4326":
-                                gdf_dem = gdf_dem.to_crs("EPSG:4326")
-                                
-                            geojson_dem = getattr(gdf_dem, "__geo_interface__", None)
-                            if not geojson_dem:
-                                geojson_dem = json.loads(gdf_dem.to_json())
-                                
-                            # 2. Renderizar Mapa
-                            layers_dem = []
-                            
-                            heat_layer = pdk.Layer(
-                                "GeoJsonLayer",
-                                geojson_dem,
-                                pickable=True,
-                                stroked=True,
-                                filled=True,
-                                get_fill_color="properties.fill_color",
-                                get_line_color=[255, 255, 255, 50],
-                                line_width_min_pixels=0.5,
-                                opacity=0.8,
-                                auto_highlight=True
-                            )
-                            layers_dem.append(heat_layer)
-                            
-                            # --- Camada de Destaque (Mapa de Demanda) ---
-                            if search_selection[1] is not None:
-                                selected_id = search_selection[1]
-                                # Filtrar para cidade selecionada
-                                gdf_highlight_dem = gdf_dem[gdf_dem['id'] == selected_id]
-                                
-                                if not gdf_highlight_dem.empty:
-                                    geojson_highlight_dem = getattr(gdf_highlight_dem, "__geo_interface__", None)
-                                    if not geojson_highlight_dem:
-                                        geojson_highlight_dem = json.loads(gdf_highlight_dem.to_json())
-                                        
-                                    highlight_layer_dem = pdk.Layer(
-                                        "GeoJsonLayer",
-                                        geojson_highlight_dem,
-                                        pickable=False,
-                                        stroked=True,
-                                        filled=False, # Preenchimento transparente
-                                        get_line_color=[0, 255, 255, 255], # Ciano
-                                        line_width_min_pixels=3,
-                                        opacity=1.0
-                                    )
-                                    layers_dem.append(highlight_layer_dem)
-                            
-                            # Reutilizar view_state do Mapa de Cobertura (disponível no escopo local)
-                            # Definir deck_dem
-                            deck_dem = pdk.Deck(
-                                layers=layers_dem,
-                                initial_view_state=view_state,
-                                tooltip={
-                                    "html": "<b>{NM_MUN} - {SIGLA_UF}</b><br/>"
-                                            "Demanda: {" + demand_col + "}",
-                                    "style": {
-                                        "backgroundColor": "#333333",
-                                        "color": "white",
-                                        "maxWidth": "350px",
-                                        "whiteSpace": "normal"
-                                    }
-                                }
-                            )
-                            
-                            # Atualizar Cache
-                            st.session_state.cached_demand_deck = deck_dem
-                            st.session_state.cached_layers_dem = layers_dem
-                            st.session_state.last_demand_cache_key = current_cache_key
-                            st.session_state.demand_max_val = max_val # Para legenda
-                            
-                        else:
-                            st.error("Dados de demanda não carregados.")
-                            st.session_state.cached_demand_deck = None
+                        heat_layers = [heat_polygons(level)]
                     except Exception as e:
                         st.error(f"Erro ao gerar mapa de calor: {e}")
-                        st.session_state.cached_demand_deck = None
+            else:
+                st.error("Dados de demanda não carregados.")
 
-            # Usar Dados em Cache
-            if st.session_state.get('cached_demand_deck'):
-                deck_dem = st.session_state.cached_demand_deck
-                max_val = st.session_state.get('demand_max_val', 0)
+            if heat_layers:
+                # Mesma vista e destaque do Mapa de Cobertura
+                deck_dem = pdk.Deck(
+                    layers=heat_layers + highlight_layers,
+                    initial_view_state=search_view_state,
+                    tooltip=uf_demand_tooltip(demand_col) if level == LEVEL_UF else demand_tooltip(demand_col)
+                )
                 
                 st.pydeck_chart(deck_dem, key="map_demand_static", use_container_width=True)
                 
@@ -516,166 +631,72 @@ def render_maps(data):
         st.markdown("---")
         st.header("📂 Exportar Resultados (Cobertura e Mapas)")
         
-        col_exp1, col_exp2 = st.columns(2)
+        # Artefatos gerados em segundo plano, fora desta execução; os botões aparecem quando prontos
+        params = {
+            'p': data.get('p'),
+            'radius': data.get('radius'),
+            'max_time': data.get('max_time'),
+            'use_km': use_km,
+            'target_uf': target_uf,
+            'ls_max_iter': data.get('ls_max_iter'),
+            'ls_strategy': data.get('ls_strategy'),
+            'vns_max_iter': data.get('vns_max_iter'),
+            'vns_k_max': data.get('vns_k_max'),
+            'vns_max_no_improv': data.get('vns_max_no_improv'),
+            'vns_max_time': data.get('vns_max_time'),
+            'vns_ls_strategy': data.get('vns_ls_strategy'),
+            'demand_file_name': data.get('demand_file'),
+            'existing_sites_file_name': data.get('existing_sites_file')
+        }
         
-        with col_exp1:
-            st.markdown("##### Relatórios")
-            
-            # Excel
-            try:
-                excel_data = get_cached_excel(gdf, demand_col, id(data))
-                st.download_button(
-                    label="📥 Baixar Excel (.xlsx)",
-                    data=excel_data,
-                    file_name="mclp_resultados.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-            except Exception as e:
-                st.error(f"Erro ao gerar Excel: {e}")
-
-            # PDF
-            try:
-                # Preparar dicionário params
-                params = {
-                    'p': data.get('p'),
-                    'radius': data.get('radius'),
-                    'max_time': data.get('max_time'),
-                    'use_km': use_km,
-                    'target_uf': target_uf,
-                    'ls_max_iter': data.get('ls_max_iter'),
-                    'ls_strategy': data.get('ls_strategy'),
-                    'vns_max_iter': data.get('vns_max_iter'),
-                    'vns_k_max': data.get('vns_k_max'),
-                    'vns_max_no_improv': data.get('vns_max_no_improv'),
-                    'vns_max_time': data.get('vns_max_time'),
-                    'vns_ls_strategy': data.get('vns_ls_strategy'),
-                    'demand_file_name': data.get('demand_file'),
-                    'existing_sites_file_name': data.get('existing_sites_file')
-                }
-                
-                # Calcular totais para relatório
-                total_demand = gdf_global[demand_col].sum()
-                covered_demand = gdf[gdf['status'] != 'Uncovered'][demand_col].sum()
-                coverage_percent = (covered_demand / total_demand * 100) if total_demand > 0 else 0
-                
-                pdf_data = get_cached_pdf(
-                    gdf, 
-                    demand_col, 
-                    total_demand, 
-                    covered_demand, 
-                    coverage_percent, 
-                    params,
-                    data.get('solution_df'),
-                    results, # Passar resultados de execução
-                    id(data)
-                )
-                
-                st.download_button(
-                    label="📥 Baixar Relatório Completo (.pdf)",
-                    data=pdf_data,
-                    file_name="mclp_relatorio_completo.pdf",
-                    mime="application/pdf"
-                )
-            except Exception as e:
-                st.error(f"Erro ao gerar PDF: {e}")
-
-        with col_exp2:
-            st.markdown("##### Mapas Interativos (HTML)")
-            
-            # Mapa de Cobertura
-            try:
-                deck_export = pdk.Deck(
-                    layers=layers,
-                    initial_view_state=view_state,
-                    tooltip={
-                        "html": "<b>{NM_MUN} - {SIGLA_UF}</b><br/>"
-                                "Status: {status}<br/>"
-                                "Demanda: {" + demand_col + "}<br/>"
-                                "Coberto por: {covering_campuses}",
-                        "style": {
-                            "backgroundColor": "#333333",
-                            "color": "white",
-                            "maxWidth": "350px",
-                            "whiteSpace": "normal"
-                        }
-                    }
-                )
-                html_data = report_utils.generate_html_map(deck_export)
-                st.download_button(
-                    label="📥 Baixar Cobertura (.html)",
-                    data=html_data,
-                    file_name="mclp_mapa_cobertura.html",
-                    mime="text/html"
-                )
-            except Exception as e:
-                st.error(f"Erro: {e}")
-
-            # Mapa de Demanda
-            try:
-                # Recriar lógica do Mapa de Demanda para exportação
-                gdf_dem_exp = gdf_global.copy()
-                
-                # Lógica de Escala de Cores (Simplificada)
-                positive_demands = gdf_dem_exp[gdf_dem_exp[demand_col] > 0][demand_col]
-                if not positive_demands.empty:
-                    min_val = positive_demands.min()
-                    max_val = positive_demands.max()
-                    min_log = math.log(max(min_val, 1))
-                    max_log = math.log(max(max_val, 1))
-                    
-                    def get_heat_color_exp(val):
-                        if val <= 0: return [200, 200, 200, 50]
-                        val_log = math.log(max(val, 1))
-                        if max_log == min_log: norm = 0.5
-                        else: norm = (val_log - min_log) / (max_log - min_log)
-                        r = 255
-                        g = int(255 * (1 - norm))
-                        b = int(200 * (1 - norm)) 
-                        return [r, g, b, 200]
-                else:
-                    def get_heat_color_exp(val): return [200, 200, 200, 50]
-                    
-                gdf_dem_exp['fill_color'] = gdf_dem_exp[demand_col].apply(get_heat_color_exp)
-                
-                if gdf_dem_exp.crs != "EPSG:4326":
-                    gdf_dem_exp = gdf_dem_exp.to_crs("EPSG:4326")
-                    
-                geojson_dem_exp = getattr(gdf_dem_exp, "__geo_interface__", None)
-                if not geojson_dem_exp:
-                    geojson_dem_exp = json.loads(gdf_dem_exp.to_json())
-                    
-                layers_dem_exp = [pdk.Layer(
-                    "GeoJsonLayer",
-                    geojson_dem_exp,
-                    pickable=True,
-                    stroked=True,
-                    filled=True,
-                    get_fill_color="properties.fill_color",
-                    get_line_color=[255, 255, 255, 50],
-                    line_width_min_pixels=0.5,
-                    opacity=0.8
-                )]
-                
-                deck_dem_export = pdk.Deck(
-                    layers=layers_dem_exp,
-                    initial_view_state=view_state,
-                    tooltip={
-                        "html": "<b>{NM_MUN} - {SIGLA_UF}</b><br/>"
-                                "Demanda: {" + demand_col + "}",
-                        "style": {
-                            "backgroundColor": "#333333",
-                            "color": "white",
-                            "maxWidth": "350px",
-                            "whiteSpace": "normal"
-                        }
-                    }
-                )
-                html_data_dem = report_utils.generate_html_map(deck_dem_export)
-                st.download_button(
-                    label="📥 Baixar Demanda (.html)",
-                    data=html_data_dem,
-                    file_name="mclp_mapa_demanda.html",
-                    mime="text/html"
-                )
-            except Exception as e:
-                st.error(f"Erro: {e}")
+        # Calcular totais para relatório
+        total_demand = gdf_global[demand_col].sum()
+        covered_demand = gdf[gdf['status'] != 'Uncovered'][demand_col].sum()
+        coverage_percent = (covered_demand / total_demand * 100) if total_demand > 0 else 0
+        solution_df = data.get('solution_df')
+        
+        def build_pdf():
+            return report_utils.generate_pdf_report(
+                gdf, demand_col, total_demand, covered_demand, coverage_percent, params,
+                solution_df, results # Passar resultados de execução
+            )
+        
+        # HTML: sempre por município, vista padrão
+        def build_coverage_html():
+            return report_utils.generate_html_map(pdk.Deck(
+                layers=[coverage_polygons(LEVEL_MUNICIPALITY)] + point_layers,
+                initial_view_state=view_state,
+                tooltip=coverage_tooltip(demand_col)
+            ))
+        
+        def build_demand_html():
+            return report_utils.generate_html_map(pdk.Deck(
+                layers=[heat_polygons(LEVEL_MUNICIPALITY)],
+                initial_view_state=view_state,
+                tooltip=demand_tooltip(demand_col)
+            ))
+        
+        status_df = report_utils.status_table(gdf, demand_col)
+        table_exports = [
+            (0, "Tabelas", f"📥 Status dos Municípios ({name})", f"mclp_status_municipios.{fmt}", mime,
+             ('tabela_status', fingerprint, (demand_col, fmt), functools.partial(report_utils.export_bytes, status_df, fmt)))
+            for fmt, name, mime in TABLE_FORMATS
+        ]
+        if solution_df is not None:
+            table_exports += [
+                (1, "Tabelas", f"📥 Locais Selecionados ({name})", f"mclp_locais_selecionados.{fmt}", mime,
+                 ('tabela_locais', fingerprint, (fmt,), functools.partial(report_utils.export_bytes, solution_df, fmt)))
+                for fmt, name, mime in TABLE_FORMATS
+            ]
+        
+        render_export_buttons([
+            (0, "Relatórios", "📥 Baixar Excel (.xlsx)", "mclp_resultados.xlsx", EXCEL_MIME,
+             ('excel', fingerprint, (demand_col,), lambda: report_utils.generate_excel_download(gdf, demand_col))),
+            # O relatório traz os parâmetros e os tempos desta execução: ambos entram na chave
+            (0, "Relatórios", "📥 Baixar Relatório Completo (.pdf)", "mclp_relatorio_completo.pdf", "application/pdf",
+             ('pdf', fingerprint, (demand_col, repr(sorted(params.items())), repr(results)), build_pdf)),
+            (1, "Mapas Interativos (HTML)", "📥 Baixar Cobertura (.html)", "mclp_mapa_cobertura.html", "text/html",
+             ('html_cobertura', fingerprint, (map_fingerprint,), build_coverage_html)),
+            (1, "Mapas Interativos (HTML)", "📥 Baixar Demanda (.html)", "mclp_mapa_demanda.html", "text/html",
+             ('html_demanda', fingerprint, (map_fingerprint,), build_demand_html)),
+        ] + table_exports)
@@ -0,0 +1,77 @@
+from numba import njit
+
+# Kernels JIT (Numba) equivalentes aos kernels numpy de heuristics.py.
+# Operam sobre os arrays crus da matriz de cobertura:
+#   indptr/indices         -> CSR (candidato -> nós cobertos)
+#   col_indptr/col_indices -> CSC (nó -> candidatos que o cobrem)
+# Toda a aritmética é inteira, então os resultados são idênticos ao backend numpy.
+
+@njit(cache=True)
+def unique_loss(rem_idx, coverage, demand, indptr, indices):
+    """Demanda coberta APENAS pelo candidato `rem_idx`."""
+    loss = 0
+    for k in range(indptr[rem_idx], indptr[rem_idx + 1]):
+        n = indices[k]
+        if coverage[n] == 1:
+            loss += demand[n]
+    return loss
+
+@njit(cache=True)
+def swap_deltas(rem_idx, coverage, potential_gains, demand,
+                indptr, indices, col_indptr, col_indices, delta_buf):
+    """
+    Preenche delta_buf com o ganho líquido de trocar `rem_idx` por cada candidato.
+    Retorna a perda única.
+    """
+    loss = unique_loss(rem_idx, coverage, demand, indptr, indices)
+    for c in range(delta_buf.shape[0]):
+        delta_buf[c] = potential_gains[c] - loss
+
+    # Recuperação: candidatos que cobrem os nós únicos de `rem_idx`
+    for k in range(indptr[rem_idx], indptr[rem_idx + 1]):
+        n = indices[k]
+        if coverage[n] == 1:
+            d = demand[n]
+            for q in range(col_indptr[n], col_indptr[n + 1]):
+                delta_buf[col_indices[q]] += d
+    return loss
+
+@njit(cache=True)
+def apply_swap(rem_idx, add_idx, coverage, potential_gains, demand,
+               indptr, indices, col_indptr, col_indices, node_marker):
+    """Aplica a troca (rem_idx -> add_idx) atualizando cobertura e ganhos in-place."""
+    # Nós que PERDEM cobertura: ganho AUMENTA para quem os cobre
+    for k in range(indptr[rem_idx], indptr[rem_idx + 1]):
+        n = indices[k]
+        if coverage[n] == 1:
+            node_marker[n] = True
+            d = demand[n]
+            for q in range(col_indptr[n], col_indptr[n + 1]):
+                potential_gains[col_indices[q]] += d
+
+    # Nós que GANHAM cobertura: ganho DIMINUI para quem os cobre
+    for k in range(indptr[add_idx], indptr[add_idx + 1]):
+        n = indices[k]
+        if coverage[n] == 0 or node_marker[n]:
+            d = demand[n]
+            for q in range(col_indptr[n], col_indptr[n + 1]):
+                potential_gains[col_indices[q]] -= d
+
+    for k in range(indptr[rem_idx], indptr[rem_idx + 1]):
+        n = indices[k]
+        node_marker[n] = False
+        coverage[n] -= 1
+    for k in range(indptr[add_idx], indptr[add_idx + 1]):
+        coverage[indices[k]] += 1
+
+@njit(cache=True)
+def commit_row(row, coverage, gains, demand, indptr, indices, col_indptr, col_indices):
+    """Adiciona o candidato `row` à solução (Greedy), atualizando ganhos e cobertura."""
+    for k in range(indptr[row], indptr[row + 1]):
+        n = indices[k]
+        if coverage[n] == 0:
+            d = demand[n]
+            for q in range(col_indptr[n], col_indptr[n + 1]):
+                gains[col_indices[q]] -= d
+    for k in range(indptr[row], indptr[row + 1]):
+        coverage[indices[k]] += 1
@@ -0,0 +1,73 @@
+import argparse
+import config
+import data_loader
+import data_manifest
+
+# Pré-processamento (executar uma única vez) dos dados de entrada para os formatos
+# otimizados que o data_loader usa automaticamente quando presentes.
+#
+# Uso:
+#   python prepare_data.py --csv --arquivo-distancias matriz.csv
+#   python prepare_data.py --distancias
+#   python prepare_data.py --adjacencia --raio-max 300 --tempo-max 5
+#   python prepare_data.py --geometria
+#   python prepare_data.py --manifesto
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte os dados de entrada para formatos otimizados.")
+    parser.add_argument(
+        '--csv', action='store_true',
+        help="Converte o CSV da matriz de distâncias (sep=';') para Parquet com tipos compactos."
+    )
+    parser.add_argument(
+        '--distancias', action='store_true',
+        help="Gera o dataset da matriz de distâncias particionado por UF de origem/destino."
+    )
+    parser.add_argument(
+        '--adjacencia', action='store_true',
+        help="Gera a adjacência binária ordenada por raio (distância e tempo), lida via memmap."
+    )
+    parser.add_argument(
+        '--raio-max', type=float, default=config.ADJACENCY_MAX_DISTANCE,
+        help="Raio máximo (km) mantido na adjacência (padrão: config.ADJACENCY_MAX_DISTANCE)."
+    )
+    parser.add_argument(
+        '--tempo-max', type=float, default=config.ADJACENCY_MAX_TIME,
+        help="Tempo máximo (h) mantido na adjacência (padrão: config.ADJACENCY_MAX_TIME)."
+    )
+    parser.add_argument(
+        '--geometria', action='store_true',
+        help="Gera a malha municipal simplificada (GeoParquet por UF) em cada tolerância de config.GEOMETRY_TOLERANCES."
+    )
+    parser.add_argument(
+        '--arquivo-malha', default=config.SHAPEFILE,
+        help="Shapefile de origem da malha municipal (padrão: config.SHAPEFILE)."
+    )
+    parser.add_argument(
+        '--manifesto', action='store_true',
+        help="Regenera data_manifest.json (tamanho e sha256 de cada arquivo em clean_data)."
+    )
+    parser.add_argument(
+        '--arquivo-distancias', default=config.DISTANCES_FILE,
+        help="Arquivo de origem da matriz de distâncias (padrão: config.DISTANCES_FILE)."
+    )
+    args = parser.parse_args()
+
+    if not (args.csv or args.distancias or args.adjacencia or args.geometria or args.manifesto):
+        parser.print_help()
+        return
+
+    if args.csv:
+        # As conversões seguintes partem do Parquet gerado
+        args.arquivo_distancias = data_loader.convert_distances_csv(args.arquivo_distancias)
+    if args.distancias:
+        data_loader.convert_distances_to_dataset(args.arquivo_distancias)
+    if args.adjacencia:
+        data_loader.convert_distances_to_adjacency(args.arquivo_distancias, args.raio_max, args.tempo_max)
+    if args.geometria:
+        data_loader.convert_shapefile_to_geoparquet(args.arquivo_malha, config.GEOMETRY_TOLERANCES)
+    if args.manifesto:
+        data_manifest.build_manifest()
+
+if __name__ == "__main__":
+    main()
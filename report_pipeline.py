@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import config
+import shared_cache
+
+# Geração dos artefatos de exportação (Excel, PDF, HTML) em segundo plano.
+# Cada artefato é um job (tipo, impressão digital do resultado, parâmetros) executado
+# em um pool de threads do processo; o resultado vai para o store de artefatos
+# (shared_cache.get_artifact_cache), então jobs iguais de sessões diferentes são
+# gerados uma única vez. Os construtores rodam fora da execução do script: não podem
+# usar st.* nem st.session_state (tudo o que dependa da sessão é resolvido antes).
+# Um job com erro é mostrado como erro por REPORT_RETRY_SECONDS (sem reagendar a cada
+# atualização da tela); o próximo pedido depois disso o agenda de novo, então uma falha
+# transitória (ex.: MemoryError com dois PDFs ao mesmo tempo) não fica até reiniciar.
+
+READY = 'pronto'
+RUNNING = 'gerando'
+FAILED = 'erro'
+
+class ReportPipeline:
+    """Pool de threads para artefatos, com estado por chave: pronto, gerando ou erro."""
+
+    def __init__(self, store, max_workers, retry_seconds=None):
+        self.store = store
+        self.retry_seconds = config.REPORT_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='artefatos')
+        self._jobs = {}
+        self._failed_at = {}
+        self._lock = threading.Lock()
+
+    def request(self, kind, fingerprint, params, builder):
+        """
+        Estado do artefato: (READY, valor), (RUNNING, None) ou (FAILED, exceção).
+        Agenda builder() quando o artefato não está no store nem em andamento, ou
+        quando o erro anterior tem mais de retry_seconds.
+        """
+        key = (kind, fingerprint, params)
+        missing = object()
+        value = self.store.get(key, missing)
+        if value is not missing:
+            with self._lock:
+                # Job concluído não guarda mais o valor (a memória fica a cargo do store)
+                if key in self._jobs and self._jobs[key].done():
+                    del self._jobs[key]
+            return READY, value
+
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None and future.done() and future.exception() is not None:
+                # Erro: mantido até completar retry_seconds, depois o job é refeito
+                failed_at = self._failed_at.setdefault(key, time.monotonic())
+                if time.monotonic() - failed_at >= self.retry_seconds:
+                    del self._failed_at[key]
+                    future = None
+            if future is None:
+                future = self._executor.submit(self.store.get_or_load, key, builder)
+                self._jobs[key] = future
+        if not future.done():
+            return RUNNING, None
+        if future.exception() is not None:
+            with self._lock:
+                self._failed_at.setdefault(key, time.monotonic())
+            return FAILED, future.exception()
+        with self._lock:
+            # Concluído: o valor passa a vir só do store (se for descartado, é gerado de novo)
+            self._jobs.pop(key, None)
+        return READY, future.result()
+
+@st.cache_resource
+def get_report_pipeline():
+    """Instância única do pipeline no processo (compartilhada entre sessões)."""
+    return ReportPipeline(shared_cache.get_artifact_cache(), config.REPORT_WORKERS)
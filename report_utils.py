@@ -2,123 +2,249 @@ import pandas as pd
 import io
 import base64
 from fpdf import FPDF
-import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
+import matplotlib.patches as mpatches
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cm import ScalarMappable
+from matplotlib.collections import PathCollection
+from matplotlib.figure import Figure
+from matplotlib.path import Path
 import geopandas as gpd
+import shapely
+from PIL import Image
 import numpy as np
 import os
+import gzip
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import shared_cache
 
 # --- Helper Functions for Maps ---
 
-def generate_excel_download(gdf, demand_col):
-    """Gera um arquivo Excel com os resultados."""
-    output = io.BytesIO()
-    
-    # Selecionar colunas relevantes
+# --- Streaming Exports ---
+# Tabelas exportadas em blocos de EXPORT_CHUNK_ROWS linhas, direto para o destino
+# (caminho em disco ou objeto de arquivo, como o BytesIO de uma resposta): Excel via
+# xlsxwriter em constant_memory (cada linha vai para disco ao ser escrita), Parquet via
+# pyarrow.ParquetWriter e CSV (opcionalmente gzip). A memória extra fica limitada a um
+# bloco, qualquer que seja o número de linhas e colunas.
+
+EXPORT_CHUNK_ROWS = 50_000
+
+STATUS_EXPORT_COLUMNS = {
+    'id': 'ID Município',
+    'NM_MUN': 'Município',
+    'SIGLA_UF': 'UF',
+    'status': 'Status de Cobertura',
+    'dist_to_site': 'Distância/Tempo ao Site (km/min)'
+}
+
+def status_table(gdf, demand_col):
+    """Status de cobertura de todos os municípios (sem geometria), com colunas renomeadas."""
+    rename_dict = dict(STATUS_EXPORT_COLUMNS, **{demand_col: 'Demanda'})
     cols = ['id', 'NM_MUN', 'SIGLA_UF', demand_col, 'status']
     # Adicionar distância/tempo se disponível
     if 'dist_to_site' in gdf.columns:
         cols.append('dist_to_site')
-    
-    df_export = gdf[cols].copy()
-    
-    # Renomear colunas para melhor legibilidade
-    rename_dict = {
-        'id': 'ID Município',
-        'NM_MUN': 'Município',
-        'SIGLA_UF': 'UF',
-        demand_col: 'Demanda',
-        'status': 'Status de Cobertura',
-        'dist_to_site': 'Distância/Tempo ao Site (km/min)'
-    }
-    df_export.rename(columns=rename_dict, inplace=True)
-    
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_export.to_excel(writer, index=False, sheet_name='Resultados')
-        
+    # Copy-on-Write: seleção e renomeação não copiam os dados
+    return pd.DataFrame(gdf[cols]).rename(columns=rename_dict)
+
+def _chunks(df):
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+def write_excel(df, target, sheet_name='Resultados'):
+    """Escreve df em .xlsx (xlsxwriter, constant_memory) no caminho ou objeto de arquivo."""
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        header = workbook.add_format({'bold': True})
+        worksheet.write_row(0, 0, [str(c) for c in df.columns], header)
+        row = 1
+        for chunk in _chunks(df):
+            # Valores Python (int/float/str) e None nas células vazias
+            values = chunk.astype(object).where(chunk.notna(), None).to_numpy()
+            for record in values:
+                worksheet.write_row(row, 0, record)
+                row += 1
+    finally:
+        workbook.close()
+
+def write_parquet(df, target):
+    """Escreve df em Parquet, um row group por bloco, no caminho ou objeto de arquivo."""
+    writer = None
+    try:
+        for chunk in _chunks(df):
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                # Colunas só com nulos no primeiro bloco: texto
+                schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in table.schema])
+                writer = pq.ParquetWriter(target, schema.remove_metadata())
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+        if writer is None:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), target)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _write_csv_chunks(df, handle, sep):
+    if len(df) == 0:
+        df.to_csv(handle, index=False, sep=sep)
+    for k, chunk in enumerate(_chunks(df)):
+        chunk.to_csv(handle, index=False, sep=sep, header=(k == 0))
+
+def write_csv(df, target, sep=';', compress=False):
+    """Escreve df em CSV (gzip se compress=True) no caminho ou objeto de arquivo binário."""
+    if compress or isinstance(target, (str, os.PathLike)):
+        # Em objeto de arquivo, o GzipFile não fecha o destino ao sair
+        opener = gzip.open if compress else open
+        with opener(target, 'wt', encoding='utf-8', newline='') as handle:
+            _write_csv_chunks(df, handle, sep)
+    else:
+        # Objeto de arquivo binário: o pandas codifica em utf-8 e não o fecha
+        _write_csv_chunks(df, target, sep)
+
+EXPORT_WRITERS = {
+    'xlsx': write_excel,
+    'parquet': write_parquet,
+    'csv': write_csv,
+    'csv.gz': lambda df, target: write_csv(df, target, compress=True),
+}
+
+def export_table(df, target, fmt):
+    """Exporta df no formato fmt ('xlsx', 'parquet', 'csv', 'csv.gz') para o caminho ou objeto de arquivo."""
+    if fmt not in EXPORT_WRITERS:
+        raise ValueError(f"Formato de exportação desconhecido: '{fmt}'. Opções: {', '.join(EXPORT_WRITERS)}")
+    EXPORT_WRITERS[fmt](df, target)
+
+def export_bytes(df, fmt):
+    """Conteúdo exportado em memória (para st.download_button)."""
+    output = io.BytesIO()
+    export_table(df, output, fmt)
     return output.getvalue()
 
+def generate_excel_download(gdf, demand_col):
+    """Gera um arquivo Excel com os resultados."""
+    return export_bytes(status_table(gdf, demand_col), 'xlsx')
+
 def generate_html_map(deck):
     """Gera um arquivo HTML do mapa."""
     return deck.to_html(as_string=True)
 
-def create_static_map_image(gdf):
-    """Cria uma imagem de mapa estática usando matplotlib."""
-    import matplotlib.patches as mpatches # Import local para evitar conflitos de refatoração
-    
-    fig, ax = plt.subplots(figsize=(10, 11)) # Aumentar altura para legenda
-    
-    color_map = {
-        0: '#00008B', # DarkBlue
-        1: '#6495ED', # CornflowerBlue
-        2: '#006400', # DarkGreen
-        3: '#FFD700', # Gold
-        4: '#90EE90', # LightGreen
-        5: '#808080'  # Grey
-    }
-    
-    label_map = {
-        0: "Existente",
-        1: "Cob. Existente",
-        2: "Novo Campus",
-        3: "Novo (Sobrep.)",
-        4: "Nova Cobertura",
-        5: "Sem Cobertura"
-    }
-    
-    # Plotar cada categoria
-    for status, color in color_map.items():
-        subset = gdf[gdf['status_code'] == status]
-        if not subset.empty:
-            subset.plot(ax=ax, color=color, edgecolor='white', linewidth=0.2)
-            
-    # Criar Legenda Manual
-    patches = [mpatches.Patch(color=color_map[s], label=label_map[s]) for s in sorted(color_map.keys())]
-    ax.legend(handles=patches, loc='lower center', bbox_to_anchor=(0.5, 0), ncol=3, frameon=False, fontsize=9)
-            
+# --- Static Map Rendering (PDF) ---
+# Os caminhos (matplotlib Path) dos polígonos são montados uma vez por malha, de forma
+# vetorizada com shapely, e ficam no cache compartilhado. Cada relatório só cria uma
+# PathCollection sobre os mesmos caminhos e define as cores das faces; os dois mapas
+# são renderizados em paralelo (Figure + Agg, sem o estado global do pyplot) em PNG na memória.
+
+MAP_DPI = 150
+
+STATUS_COLORS = ['#00008B', '#6495ED', '#006400', '#FFD700', '#90EE90', '#808080']
+STATUS_NAMES = ["Existente", "Cob. Existente", "Novo Campus", "Novo (Sobrep.)", "Nova Cobertura", "Sem Cobertura"]
+
+HEAT_CMAP = mcolors.LinearSegmentedColormap.from_list("CustomYlRd", ["#FFFFC8", "#FF0000"])
+HEAT_ALPHA = 0.8
+HEAT_BASE_COLOR = '#f0f0f0'
+
+class MapPaths:
+    """Caminhos compostos (exterior + buracos, todas as partes) de cada linha da malha, e a extensão."""
+
+    def __init__(self, geometries):
+        geoms = np.asarray(geometries, dtype=object)
+        parts, part_geom = shapely.get_parts(geoms, return_index=True)
+        # Exterior anti-horário e buracos horários: o preenchimento (regra nonzero do Agg) respeita os buracos
+        parts = shapely.orient_polygons(parts)
+        rings, ring_part = shapely.get_rings(parts, return_index=True)
+        coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+
+        codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+        ring_start = np.flatnonzero(np.diff(coord_ring, prepend=-1))
+        codes[ring_start] = Path.MOVETO
+        codes[np.append(ring_start[1:], len(coords)) - 1] = Path.CLOSEPOLY
+
+        # Vértices agrupados por geometria (partes e anéis saem em ordem)
+        coord_geom = part_geom[ring_part[coord_ring]]
+        bounds = np.searchsorted(coord_geom, np.arange(len(geoms) + 1))
+        self.paths = [Path(coords[a:b], codes[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+        self.extent = (coords[:, 0].min(), coords[:, 0].max(), coords[:, 1].min(), coords[:, 1].max()) if len(coords) else (0, 1, 0, 1)
+        self.nbytes = coords.nbytes + codes.nbytes + len(self.paths) * 200
+
+def get_map_paths(gdf):
+    """MapPaths da malha do gdf, em cache por (ids, extensão, vértices) — uma vez por UF/nível."""
+    geometry = gdf.geometry
+    key = shared_cache.digest(
+        np.asarray(gdf['id'], dtype=np.int64).tobytes(),
+        tuple(np.round(geometry.total_bounds, 6)),
+        int(geometry.count_coordinates().sum())
+    )
+    return shared_cache.cached('caminhos_mapa', key, (), lambda: MapPaths(geometry.values))
+
+def _map_figure(map_paths, facecolors, edgecolor, linewidth, figsize):
+    """Figure (Agg) com a malha pintada pelas cores informadas, eixos ajustados à extensão."""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.add_collection(PathCollection(
+        map_paths.paths, facecolors=facecolors, edgecolors=edgecolor, linewidths=linewidth
+    ))
+    x_min, x_max, y_min, y_max = map_paths.extent
+    ax.set_xlim(x_min, x_max)
+    ax.set_ylim(y_min, y_max)
+    # Mesma correção de aspecto do GeoPandas para coordenadas geográficas
+    ax.set_aspect(1 / np.cos(np.deg2rad((y_min + y_max) / 2)))
     ax.set_axis_off()
-    plt.tight_layout()
-    
+    return fig, ax
+
+def _figure_png(fig):
+    """PNG RGB (sem canal alfa: o PyFPDF 1.x separa o alfa pixel a pixel em Python)."""
+    fig.tight_layout()
+    rgba_buffer = io.BytesIO()
+    fig.savefig(rgba_buffer, format='png', dpi=MAP_DPI, bbox_inches='tight')
+    rgba_buffer.seek(0)
     img_buffer = io.BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    Image.open(rgba_buffer).convert('RGB').save(img_buffer, format='PNG')
     img_buffer.seek(0)
     return img_buffer
 
+def create_static_map_image(gdf):
+    """Cria uma imagem de mapa estática (PNG em memória) do status de cobertura."""
+    map_paths = get_map_paths(gdf)
+    codes = gdf['status_code'].to_numpy(dtype=np.intp)
+    facecolors = mcolors.to_rgba_array(STATUS_COLORS)[codes]
+
+    fig, ax = _map_figure(map_paths, facecolors, 'white', 0.2, (10, 11)) # Aumentar altura para legenda
+
+    # Criar Legenda Manual
+    patches = [mpatches.Patch(color=color, label=label) for color, label in zip(STATUS_COLORS, STATUS_NAMES)]
+    ax.legend(handles=patches, loc='lower center', bbox_to_anchor=(0.5, 0), ncol=3, frameon=False, fontsize=9)
+    return _figure_png(fig)
+
 def create_static_heatmap_image(gdf, demand_col):
-    """Cria uma imagem estática do mapa de calor usando matplotlib com LogNorm."""
-    fig, ax = plt.subplots(figsize=(10, 10))
-    
-    # Plotar mapa base (cinza)
-    gdf.plot(ax=ax, color='#f0f0f0', edgecolor='white', linewidth=0.1)
-    
-    # Plotar mapa de calor
-    subset = gdf[gdf[demand_col] > 0].copy()
-    
-    if not subset.empty:
-        colors = ["#FFFFC8", "#FF0000"] # LightYellow to Red
-        cmap = mcolors.LinearSegmentedColormap.from_list("CustomYlRd", colors)
-        
-        subset.plot(
-            column=demand_col,
-            ax=ax,
-            cmap=cmap, # Use custom map
-            norm=mcolors.LogNorm(vmin=subset[demand_col].min(), vmax=subset[demand_col].max()), # Log scale
-            legend=True,
-            legend_kwds={'label': "Demanda (Escala Log)", 'orientation': "horizontal", 'shrink': 0.6},
-            edgecolor='none',
-            alpha=0.8
-        )
-            
-    ax.set_axis_off()
-    plt.tight_layout()
-    
-    img_buffer = io.BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-    plt.close(fig)
-    img_buffer.seek(0)
-    return img_buffer
+    """Cria uma imagem estática (PNG em memória) do mapa de calor com LogNorm."""
+    map_paths = get_map_paths(gdf)
+    demand = pd.to_numeric(gdf[demand_col], errors='coerce').to_numpy(dtype=np.float64)
+    positive = demand > 0
+
+    # Mapa base (cinza) e demanda positiva em escala log
+    facecolors = np.tile(mcolors.to_rgba(HEAT_BASE_COLOR), (len(demand), 1))
+    norm = None
+    if positive.any():
+        norm = mcolors.LogNorm(vmin=demand[positive].min(), vmax=demand[positive].max())
+        facecolors[positive] = HEAT_CMAP(norm(demand[positive]), alpha=HEAT_ALPHA)
+
+    fig, ax = _map_figure(map_paths, facecolors, 'white', 0.1, (10, 10))
+    if norm is not None:
+        fig.colorbar(ScalarMappable(norm=norm, cmap=HEAT_CMAP), ax=ax, orientation="horizontal",
+                     shrink=0.6, label="Demanda (Escala Log)")
+    return _figure_png(fig)
+
+def render_report_maps(gdf, demand_col):
+    """Renderiza os mapas de cobertura e de calor em paralelo; retorna os futures (PNG em BytesIO)."""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        return (pool.submit(create_static_map_image, gdf),
+                pool.submit(create_static_heatmap_image, gdf, demand_col))
 
 # --- Internal PDF Drawing Functions ---
 
@@ -321,10 +447,14 @@ def _draw_maps(pdf, gdf, demand_col):
     
     import tempfile
     
+    # Os dois mapas são renderizados em paralelo, em memória. O PyFPDF 1.x só aceita
+    # imagens por caminho, então cada PNG ainda passa por um arquivo temporário.
+    map_future, heat_future = render_report_maps(gdf, demand_col)
+    
     # Mapa 1: Cobertura
     tmp_path = None
     try:
-        img_buffer = create_static_map_image(gdf)
+        img_buffer = map_future.result()
         with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_file:
             tmp_file.write(img_buffer.getvalue())
             tmp_path = tmp_file.name
@@ -345,7 +475,7 @@ def _draw_maps(pdf, gdf, demand_col):
     # Mapa 2: Calor
     tmp_path_heat = None
     try:
-        img_buffer_heat = create_static_heatmap_image(gdf, demand_col)
+        img_buffer_heat = heat_future.result()
         with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_file_heat:
             tmp_file_heat.write(img_buffer_heat.getvalue())
             tmp_path_heat = tmp_file_heat.name
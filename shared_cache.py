@@ -0,0 +1,181 @@
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+from scipy.sparse import spmatrix
+import streamlit as st
+import config
+
+# Cache de recursos do processo, compartilhado por todas as sessões do Streamlit.
+# Os dados carregados (matriz de distâncias, demanda, coordenadas, malha) ficam em
+# uma única cópia em memória, em vez de uma por sessão/execução (sem pickle).
+# Arrays numpy são marcados como somente leitura e dicionários são entregues como
+# MappingProxyType (somente leitura). DataFrames são entregues como cópias rasas:
+# com Copy-on-Write (padrão no pandas 3, fixado em requirements.txt), colunas novas
+# e alterações no lugar feitas por quem chama não chegam ao valor em cache.
+
+def file_fingerprint(filepath):
+    """Identifica um arquivo (ou diretório) pelo caminho, tamanho e data de modificação."""
+    path = os.path.abspath(str(filepath))
+    if os.path.isdir(path):
+        parts = []
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                parts.append(file_fingerprint(os.path.join(root, name)))
+        return '|'.join(parts)
+    if not os.path.exists(path):
+        return f"{path}:ausente"
+    stat = os.stat(path)
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def source_fingerprint(source):
+    """Impressão digital de um caminho ou de um upload do Streamlit (hash do conteúdo)."""
+    if hasattr(source, 'getvalue'):
+        return 'upload:' + hashlib.sha256(source.getvalue()).hexdigest()
+    return file_fingerprint(source)
+
+def digest(*parts):
+    """Hash sha256 (hex) determinístico da repr das partes (parâmetros, IDs, impressões digitais)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+def _freeze(value):
+    """
+    Torna o valor imutável para compartilhar entre sessões: arrays numpy (inclusive em
+    matrizes esparsas) somente leitura e dicionários como MappingProxyType, também
+    dentro de tuplas/listas.
+    """
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, spmatrix):
+        for arr in (value.data, getattr(value, 'indices', None), getattr(value, 'indptr', None)):
+            if isinstance(arr, np.ndarray):
+                arr.flags.writeable = False
+    elif isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    elif isinstance(value, tuple):
+        return tuple(_freeze(v) for v in value)
+    elif isinstance(value, list):
+        value[:] = [_freeze(v) for v in value]
+    return value
+
+def _nbytes(value):
+    """Estimativa do tamanho em memória de um valor cacheado."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, spmatrix):
+        return sum(getattr(value, a).nbytes for a in ('data', 'indices', 'indptr') if hasattr(value, a))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (dict, MappingProxyType)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+def _shallow(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_shallow(v) for v in value)
+    return value
+
+class SharedCache:
+    """
+    LRU limitado pelo tamanho em memória (max_bytes), seguro entre threads. Valores
+    maiores que max_bytes são devolvidos sem entrar no cache.
+    Cada chave é carregada uma única vez, mesmo com várias sessões pedindo ao mesmo tempo.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return _shallow(self._items[key][0])
+
+    def put(self, key, value):
+        value = _freeze(value)
+        size = _nbytes(value)
+        with self._lock:
+            if key in self._items:
+                self.total_bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                # Maior que o orçamento inteiro: entregue sem cachear (não expulsa os demais)
+                return _shallow(value)
+            self._items[key] = (value, size)
+            self.total_bytes += size
+            # Remove os menos usados recentemente
+            while self.total_bytes > self.max_bytes:
+                _, (_, old_size) = self._items.popitem(last=False)
+                self.total_bytes -= old_size
+        return _shallow(value)
+
+    def get_or_load(self, key, loader):
+        """Retorna o valor cacheado ou executa loader() uma única vez para a chave."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            # [lock, usuários]: o lock da chave só sai do dicionário quando ninguém mais o
+            # usa ou espera, senão um novo chamador criaria um segundo lock e carregaria junto
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                value = self.get(key, missing)
+                if value is missing:
+                    value = self.put(key, loader())
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0 and self._key_locks.get(key) is entry:
+                    del self._key_locks[key]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+@st.cache_resource
+def get_shared_cache():
+    """Instância única do cache no processo (compartilhada entre sessões)."""
+    return SharedCache(config.SHARED_CACHE_MAX_BYTES)
+
+def cached(kind, fingerprint, params, loader):
+    """Atalho: carrega via cache compartilhado com chave (tipo, impressão digital, parâmetros)."""
+    return get_shared_cache().get_or_load((kind, fingerprint, params), loader)
+
+# Store separado para artefatos derivados dos resultados (camadas dos mapas, Excel, PDF,
+# HTML), com chave na impressão digital do resultado: não disputa espaço com os dados.
+
+@st.cache_resource
+def get_artifact_cache():
+    """Store de artefatos do processo (compartilhado entre sessões)."""
+    return SharedCache(config.ARTIFACT_CACHE_MAX_BYTES)
+
+def cached_artifact(kind, fingerprint, params, loader):
+    """Artefato (tipo, impressão digital do resultado, parâmetros), gerado uma única vez por processo."""
+    return get_artifact_cache().get_or_load((kind, fingerprint, params), loader)
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import coverage_cache
+import map_renderer
+import shared_cache
+
+@pytest.fixture
+def artifact_cache(monkeypatch):
+    cache = shared_cache.SharedCache(10**9)
+    monkeypatch.setattr(shared_cache, 'get_artifact_cache', lambda: cache)
+    return cache
+
+def test_artifact_generated_once_per_fingerprint(artifact_cache):
+    builds = []
+    def build(tag):
+        return lambda: builds.append(tag) or f"{tag}".encode()
+
+    first = shared_cache.cached_artifact('excel', 'fp1', ('MG',), build('a'))
+    again = shared_cache.cached_artifact('excel', 'fp1', ('MG',), build('b'))
+    other_fp = shared_cache.cached_artifact('excel', 'fp2', ('MG',), build('c'))
+    other_kind = shared_cache.cached_artifact('pdf', 'fp1', ('MG',), build('d'))
+
+    assert first == again == b'a'
+    assert (other_fp, other_kind) == (b'c', b'd')
+    assert builds == ['a', 'c', 'd']
+
+def test_artifact_store_is_separate_and_bounded(artifact_cache, monkeypatch):
+    data_cache = shared_cache.SharedCache(10**9)
+    monkeypatch.setattr(shared_cache, 'get_shared_cache', lambda: data_cache)
+    artifact_cache.max_bytes = 3 * map_renderer.FEATURE_BYTES * 100
+
+    for fp in ('fp1', 'fp2', 'fp3', 'fp4'):
+        shared_cache.cached_artifact('camadas', fp, (), lambda: map_renderer.LayerArtifact(object(), 100))
+
+    assert len(data_cache) == 0
+    assert len(artifact_cache) == 3
+    assert artifact_cache.get(('camadas', 'fp1', ())) is None
+
+def test_result_fingerprint_components(tmp_path):
+    distances = tmp_path / 'dist.parquet'
+    distances.write_bytes(b'x')
+    demand = {3106200: 10, 3550308: 20}
+    key = lambda **kw: coverage_cache.scenario_key(
+        str(distances), kw.get('demand', demand), kw.get('existing', {3304557, 3100104}),
+        kw.get('uf', 'MG'), kw.get('radius', 50.0), 1.0, kw.get('use_km', True))
+
+    base = key()
+    assert key(existing={3100104, 3304557}) == base
+    assert key(uf=31) == base   # sigla e código da UF
+    assert key(radius=50) == base
+    for changed in (key(radius=60.0), key(uf='SP'), key(use_km=False),
+                    key(demand={3550308: 20, 3106200: 10}), key(demand={3106200: 10, 3550308: 21}),
+                    key(existing={3304557})):
+        assert changed != base
+
+    # Arquivo de distâncias alterado (tamanho/data): novo cenário
+    os.utime(distances, ns=(0, 10**9))
+    assert key() != base
+
+    solution = [3550308, 3106200]
+    fp = shared_cache.digest(base, ['demanda-hash', None], 'pop', 5, sorted(solution))
+    assert fp == shared_cache.digest(base, ['demanda-hash', None], 'pop', 5, sorted(reversed(solution)))
+    assert fp != shared_cache.digest(base, ['demanda-hash', None], 'pop', 6, sorted(solution))
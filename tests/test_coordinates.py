@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+from data_loader import CoordinateStore
+
+@pytest.fixture
+def coords_file(tmp_path):
+    df = pd.DataFrame({
+        'codigo_ibge': ['3106200', '3550308', 'abc', '3304557', '3106200', '3100104'],
+        'latitude': [-19.9, -23.5, 0.0, -22.9, -19.8, -18.0],
+        'longitude': [-43.9, -46.6, 0.0, -43.2, -43.8, -47.0],
+    })
+    path = tmp_path / 'municipios.parquet'
+    df.to_parquet(path)
+    return str(path), df
+
+def legacy_coordinates(df, uf=None):
+    """dict {id: (lat, lon)} montado como no load_coordinates original (iterrows)."""
+    coords = {}
+    for _, row in df.iterrows():
+        try:
+            key = int(row['codigo_ibge'])
+        except ValueError:
+            continue
+        if uf is None or key // 100000 == uf:
+            coords[key] = (float(row['latitude']), float(row['longitude']))
+    return coords
+
+@pytest.mark.parametrize('uf_filter,uf', [(None, None), ('MG', 31)])
+def test_store_matches_legacy_dict(coords_file, uf_filter, uf):
+    path, df = coords_file
+    store = data_loader._load_coordinates(path, uf_filter=uf_filter)
+    expected = legacy_coordinates(df, uf)
+
+    assert isinstance(store, CoordinateStore)
+    assert sorted(store) == sorted(expected)
+    for key, (lat, lon) in expected.items():
+        assert store[key] == pytest.approx((lat, lon), abs=1e-5)
+        assert store.get(key) == pytest.approx((lat, lon), abs=1e-5)
+    assert 9999999 not in store and store.get(9999999) is None
+
+def test_vectorised_lookup_and_mean():
+    store = CoordinateStore([30, 10, 20], [3.0, 1.0, 2.0], [-3.0, -1.0, -2.0])
+    lat, lon = store.lookup([20, 99, 10])
+    np.testing.assert_allclose(lat, [2.0, np.nan, 1.0])
+    np.testing.assert_allclose(lon, [-2.0, np.nan, -1.0])
+    assert store.mean([10, 30, 99]) == pytest.approx((2.0, -2.0))
+    assert store.mean([99]) is None
+    assert store.mean() == pytest.approx((2.0, -2.0))
+    with pytest.raises(ValueError):
+        store.lat[0] = 0.0
@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+import config
+import coverage_cache
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+def make_structures():
+    cov = csr_matrix(np.array([[1, 0, 1, 0], [0, 1, 1, 0], [0, 0, 0, 1]], dtype=np.int8))
+    exist = csr_matrix(np.array([[1, 1, 0, 0]], dtype=np.int8))
+    sparse_structures = (
+        cov, np.array([10, 20, 30, 40], dtype=np.int32),
+        {101: 0, 102: 1, 103: 2}, {101: 0, 102: 1, 103: 2, 104: 3},
+        np.array([1, 1, 0, 0], dtype=np.int32),
+    )
+    return sparse_structures, (exist, {900: 0})
+
+def test_save_load_roundtrip(cache_dir):
+    sparse_structures, existing_structures = make_structures()
+    coverage_cache._save('abc', sparse_structures, existing_structures)
+    assert [p.name for p in cache_dir.iterdir()] == ['abc.npz']
+
+    (cov, demand, cand_to_idx, node_to_idx, initial), (exist, site_to_idx) = coverage_cache._load('abc')
+    assert (cov != sparse_structures[0]).nnz == 0
+    assert (exist != existing_structures[0]).nnz == 0
+    np.testing.assert_array_equal(demand, sparse_structures[1])
+    np.testing.assert_array_equal(initial, sparse_structures[4])
+    assert cand_to_idx == sparse_structures[2]
+    assert node_to_idx == sparse_structures[3]
+    assert site_to_idx == existing_structures[1]
+
+def test_concurrent_saves_of_same_scenario(cache_dir):
+    structures = make_structures()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: coverage_cache._save('abc', *structures), range(32)))
+
+    assert [p.name for p in cache_dir.iterdir()] == ['abc.npz']
+    assert coverage_cache._load('abc') is not None
+
+def test_truncated_file_is_a_miss(cache_dir):
+    coverage_cache._save('abc', *make_structures())
+    path = cache_dir / 'abc.npz'
+    path.write_bytes(path.read_bytes()[:100])
+
+    assert coverage_cache._load('abc') is None
+    assert not path.exists()
+
+def test_evict_removes_least_recently_used(cache_dir):
+    for i, key in enumerate(['old', 'new']):
+        coverage_cache._save(key, *make_structures())
+        os.utime(cache_dir / f'{key}.npz', ns=(i * 10**9, i * 10**9))
+    size = (cache_dir / 'new.npz').stat().st_size
+
+    coverage_cache.evict(max_bytes=size)
+    assert sorted(p.name for p in cache_dir.iterdir()) == ['new.npz']
+
+def test_load_tolerates_concurrent_eviction(cache_dir, monkeypatch):
+    coverage_cache._save('abc', *make_structures())
+    path = str(cache_dir / 'abc.npz')
+    real_load = np.load
+
+    def load_then_evict(*args, **kwargs):
+        # O arquivo some (evict de outra sessão) depois de aberto, antes do os.utime
+        z = real_load(*args, **kwargs)
+        os.remove(path)
+        return z
+
+    monkeypatch.setattr(coverage_cache.np, 'load', load_then_evict)
+    assert coverage_cache._load('abc') is not None
+
+    # Removido entre o os.path.exists e a leitura
+    monkeypatch.setattr(coverage_cache.os.path, 'exists', lambda p: True)
+    assert coverage_cache._load('abc') is None
+
+def test_truncated_file_already_removed_by_another_session(cache_dir, monkeypatch):
+    coverage_cache._save('abc', *make_structures())
+    path = cache_dir / 'abc.npz'
+    path.write_bytes(path.read_bytes()[:100])
+    real_load = np.load
+
+    def load_then_evict(file, *args, **kwargs):
+        try:
+            return real_load(file, *args, **kwargs)
+        finally:
+            os.remove(file)
+
+    monkeypatch.setattr(coverage_cache.np, 'load', load_then_evict)
+    assert coverage_cache._load('abc') is None
+
+def test_evict_skips_files_removed_concurrently(cache_dir, monkeypatch):
+    for i, key in enumerate(['a', 'b', 'c']):
+        coverage_cache._save(key, *make_structures())
+        os.utime(cache_dir / f'{key}.npz', ns=(i * 10**9, i * 10**9))
+    real_listdir, real_stat = os.listdir, os.stat
+
+    # 'fantasma.npz' some antes do stat; 'a.npz' é removido por outra sessão logo após o stat
+    monkeypatch.setattr(coverage_cache.os, 'listdir', lambda d: real_listdir(d) + ['fantasma.npz'])
+
+    def stat_then_evict(path, *args, **kwargs):
+        result = real_stat(path, *args, **kwargs)
+        if os.path.basename(str(path)) == 'a.npz':
+            os.remove(path)
+        return result
+
+    monkeypatch.setattr(coverage_cache.os, 'stat', stat_then_evict)
+    coverage_cache.evict(max_bytes=0)
+    monkeypatch.undo()
+    assert list(cache_dir.iterdir()) == []
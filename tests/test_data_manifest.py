@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+import config
+import data_manifest
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Pasta de dados temporária com um arquivo real e um ponteiro Git LFS."""
+    data = tmp_path / 'clean_data'
+    data.mkdir()
+    (data / 'a.parquet').write_bytes(b'conteudo real' * 100)
+    payload = b'x' * 5000
+    (data / 'b.parquet').write_text(
+        "version https://git-lfs.github.com/spec/v1\n"
+        f"oid sha256:{hashlib.sha256(payload).hexdigest()}\n"
+        f"size {len(payload)}\n"
+    )
+    monkeypatch.setattr(config, 'DATA_DIR', str(data))
+    monkeypatch.setattr(config, 'DATA_MANIFEST_FILE', str(tmp_path / 'manifest.json'))
+    monkeypatch.setattr(data_manifest, '_manifest', None)
+    monkeypatch.setattr(data_manifest, '_results', {})
+    return data, payload
+
+def test_build_manifest_from_files_and_lfs_pointers(data_dir):
+    data, payload = data_dir
+    files = data_manifest.build_manifest()
+
+    content = (data / 'a.parquet').read_bytes()
+    assert files['a.parquet'] == {'tamanho': len(content), 'sha256': hashlib.sha256(content).hexdigest()}
+    assert files['b.parquet'] == {'tamanho': len(payload), 'sha256': hashlib.sha256(payload).hexdigest()}
+    with open(config.DATA_MANIFEST_FILE, encoding='utf-8') as f:
+        assert json.load(f) == {'arquivos': files}
+
+def test_verification_runs_once_per_file(data_dir, monkeypatch):
+    data, _ = data_dir
+    data_manifest.build_manifest()
+    calls = []
+    real_sha256 = data_manifest.file_sha256
+    monkeypatch.setattr(data_manifest, 'file_sha256', lambda p: calls.append(p) or real_sha256(p))
+
+    path = str(data / 'a.parquet')
+    assert data_manifest.verify_file(path) is True
+    assert data_manifest.verify_file(path) is True
+    assert data_manifest.is_verified(path)
+    assert len(calls) == 1
+
+    # Alteração muda (tamanho, mtime): verificada de novo e reprovada
+    with open(path, 'ab') as f:
+        f.write(b'!')
+    assert data_manifest.verify_file(path) is False
+    assert not data_manifest.is_verified(path)
+    assert len(calls) == 1   # tamanho diferente: nem calcula o hash
+
+def test_pending_files(data_dir):
+    data, _ = data_dir
+    data_manifest.build_manifest()
+    paths = [str(data / name) for name in ('a.parquet', 'b.parquet', 'c.parquet')]
+
+    # Ponteiro LFS (tamanho diferente) precisa de download; arquivo fora do manifesto não é verificado
+    assert data_manifest.pending_files(paths) == [paths[1]]
+    assert data_manifest.verify_file(paths[2]) is None
+    assert data_manifest.manifest_entry(os.path.join(os.getcwd(), 'a.parquet')) is None
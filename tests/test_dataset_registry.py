@@ -0,0 +1,61 @@
+import io
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+import data_loader
+import dataset_registry
+
+BASE = pd.DataFrame({
+    'Cód.': [3106200, 3550308],
+    'Município': ['Belo Horizonte', 'São Paulo'],
+    'UF': ['MG', 'SP'],
+    'Pop': [10, 20],
+})
+
+class Upload(io.BytesIO):
+    def __init__(self, content, name, file_id):
+        super().__init__(content)
+        self.name, self.file_id, self.size = name, file_id, len(content)
+
+@pytest.fixture(autouse=True)
+def session(monkeypatch):
+    """Sessão nova por teste (session_state simples)."""
+    monkeypatch.setattr(st, 'session_state', {})
+
+def test_upload_hashed_and_read_once(monkeypatch):
+    reads, hashes = [], []
+    real_read, real_hash = data_loader.read_table, dataset_registry.shared_cache.source_fingerprint
+    monkeypatch.setattr(data_loader, 'read_table', lambda s, fingerprint=None: reads.append(1) or real_read(s, fingerprint))
+    monkeypatch.setattr(dataset_registry.shared_cache, 'source_fingerprint', lambda s: hashes.append(1) or real_hash(s))
+    upload = Upload(BASE.to_csv(sep=';', index=False).encode() + b'1;registro;MG;1\n', 'demanda.csv', 'f1')
+
+    first = dataset_registry.get_frame(upload)
+    first['nova'] = 1
+    second = dataset_registry.get_frame(upload)
+
+    assert len(reads) == 1 and len(hashes) == 1
+    assert 'nova' not in second.columns
+    assert dataset_registry.content_key(upload) == dataset_registry.content_key(upload)
+
+def test_session_keeps_most_recent_tables(monkeypatch):
+    monkeypatch.setattr(dataset_registry, 'MAX_SESSION_DATASETS', 2)
+    uploads = [Upload(f"id;v\n{i};1\n".encode(), f"{i}.csv", f"id{i}") for i in range(3)]
+    for upload in uploads:
+        dataset_registry.get_frame(upload)
+
+    registry = st.session_state['_dataset_registry']
+    assert list(registry['frames']) == [dataset_registry.content_key(u) for u in uploads[1:]]
+    assert set(registry['hashes']) == {'id1', 'id2'}
+
+def test_template_csv_roundtrip():
+    csv = dataset_registry.template_csv(BASE, 'Demanda', 0)
+    df = pd.read_csv(io.BytesIO(csv), sep=';')
+    assert df.columns.tolist() == ['id', 'Municipio', 'UF', 'Demanda']
+    assert df['id'].tolist() == BASE['Cód.'].tolist()
+    assert df['Municipio'].tolist() == BASE['Município'].tolist()
+    assert (df['Demanda'] == 0).all()
+
+    empty = pd.read_csv(io.BytesIO(dataset_registry.template_csv(BASE[['Pop']], 'Demanda', 0)), sep=';')
+    assert empty.columns.tolist() == ['id', 'Demanda'] and empty.empty
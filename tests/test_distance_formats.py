@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+
+RADIUS = 50.0
+MAX_TIME = 1.0
+
+@pytest.fixture
+def distances_parquet(tmp_path):
+    """Matriz de distâncias com pares exatamente no raio e a menos de uma escala dele."""
+    rng = np.random.default_rng(0)
+    ids = np.array([3100104, 3100203, 3100302, 3100401, 3550308, 3304557], dtype=np.int64)
+    orig, dest = np.meshgrid(ids, ids, indexing='ij')
+    orig, dest = orig.ravel(), dest.ravel()
+    keep = orig != dest
+    orig, dest = orig[keep], dest[keep]
+    dist = rng.uniform(0, 300, size=orig.size)
+    # Fronteira: exatamente no raio, logo abaixo e logo acima (dentro de meia escala uint16)
+    dist[:9] = [RADIUS, RADIUS, RADIUS - 1e-4, RADIUS - 1e-3, RADIUS + 1e-4,
+                RADIUS + 1e-3, 0.0, 300.0, RADIUS - 2e-3]
+    tempo = dist / 80.0
+    tempo[10:13] = [MAX_TIME, MAX_TIME - 1e-5, MAX_TIME + 1e-5]
+
+    path = tmp_path / 'dist.parquet'
+    pd.DataFrame({'origem': orig, 'destino': dest, 'distancia': dist, 'tempo': tempo}).to_parquet(path)
+    return str(path)
+
+def _pairs(df, col):
+    return sorted(zip(df['origem'].tolist(), df['destino'].tolist(), df[col].tolist()))
+
+@pytest.mark.parametrize('use_km', [True, False])
+@pytest.mark.parametrize('uf', [None, 'MG'])
+def test_adjacency_matches_parquet_at_boundary(distances_parquet, use_km, uf):
+    kwargs = dict(uf_filter=uf, max_dist=RADIUS, max_time=MAX_TIME, use_km=use_km)
+    col = 'distancia' if use_km else 'tempo'
+    expected = data_loader._load_distances(distances_parquet, **kwargs)
+
+    data_loader.convert_distances_to_adjacency(distances_parquet, 300.0, 5.0)
+    assert data_loader._resolve_adjacency(distances_parquet)
+    got = data_loader._load_distances(distances_parquet, **kwargs)
+
+    assert _pairs(got, col) == _pairs(expected, col)
+    limit = RADIUS if use_km else MAX_TIME
+    assert (got[col] <= np.float32(limit)).all()
+    # Pares exatamente no limiar continuam dentro (mesmo após o filtro da matriz esparsa)
+    assert (got[col] == np.float32(limit)).sum() == (expected[col] == np.float32(limit)).sum() > 0
+
+@pytest.fixture
+def distances_csv(tmp_path, distances_parquet):
+    """Mesma matriz em CSV (sep=';', BOM e nomes legados origem_cod/destino_cod)."""
+    df = pd.read_parquet(distances_parquet).rename(columns={'origem': 'origem_cod', 'destino': 'destino_cod'})
+    df['extra'] = 'x'
+    path = tmp_path / 'dist.csv'
+    df.to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+    return str(path)
+
+def _sorted(df):
+    return df.sort_values(['origem', 'destino']).reset_index(drop=True)
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    dict(uf_filter='MG', max_dist=RADIUS, use_km=True),
+    dict(max_time=MAX_TIME, use_km=False, origins=[3100104, 3550308]),
+])
+def test_csv_reader_matches_parquet(distances_parquet, distances_csv, kwargs):
+    expected = _sorted(data_loader._load_distances(distances_parquet, **kwargs))
+    got = _sorted(data_loader._load_distances(distances_csv, **kwargs))
+
+    assert list(got.columns) == ['origem', 'destino', 'distancia', 'tempo']
+    assert got.dtypes.tolist() == expected.dtypes.tolist()
+    pd.testing.assert_frame_equal(got, expected)
+
+def test_csv_parquet_copy_roundtrip(distances_csv):
+    direct = _sorted(data_loader._load_distances(distances_csv))
+    parquet_path = data_loader.convert_distances_csv(distances_csv)
+
+    assert data_loader._resolve_csv_parquet(distances_csv) == parquet_path
+    assert not [p for p in os.listdir(os.path.dirname(parquet_path)) if p.endswith('.tmp')]
+    pd.testing.assert_frame_equal(_sorted(data_loader._load_distances(distances_csv)), direct)
+
+COMPACT = ['int32', 'int32', 'float32', 'float32']
+
+def _wide_reference(path, col, limit, uf=None):
+    """Leitura direta com pandas nos tipos do arquivo, filtrada, depois compactada."""
+    df = pd.read_parquet(path)
+    mask = df[col] <= limit
+    if uf is not None:
+        mask &= (df['origem'] // 100000 == uf) & (df['destino'] // 100000 == uf)
+    return _sorted(df[mask].astype(data_loader.COMPACT_DISTANCE_DTYPES))
+
+@pytest.mark.parametrize('layout', ['parquet', 'legado', 'dataset', 'adjacencia'])
+def test_compact_types_cast_during_scan(distances_parquet, tmp_path, layout, monkeypatch):
+    path = distances_parquet
+    if layout == 'legado':
+        path = str(tmp_path / 'legado.parquet')
+        pd.read_parquet(distances_parquet).rename(
+            columns={'origem': 'origem_cod', 'destino': 'destino_cod'}).to_parquet(path)
+    elif layout == 'dataset':
+        data_loader.convert_distances_to_dataset(path)
+    elif layout == 'adjacencia':
+        data_loader.convert_distances_to_adjacency(path, 300.0, 5.0)
+
+    logged = []
+    monkeypatch.setattr(data_loader, '_log_distance_memory', lambda *args: logged.append(args))
+    got = _sorted(data_loader._load_distances(path, uf_filter='MG', max_dist=RADIUS, use_km=True))
+
+    assert got.dtypes.astype(str).tolist() == COMPACT
+    pd.testing.assert_frame_equal(got, _wide_reference(distances_parquet, 'distancia', RADIUS, uf=31))
+    # Log: tamanho nos tipos do arquivo (int64/float64) e o carregado, que é a metade
+    [(rows, source_row_bytes, nbytes, compact)] = logged
+    assert compact and rows == len(got)
+    # (a tabela Arrow pode somar os bitmaps de validade, um bit por valor)
+    assert source_row_bytes == 32 and rows * 16 <= nbytes <= rows * 16 + 4 * (rows // 8 + 1)
+
+def test_compact_false_keeps_file_types(distances_parquet):
+    got = data_loader._load_distances(distances_parquet, max_dist=RADIUS, compact=False)
+    assert got.dtypes.astype(str).tolist() == ['int64', 'int64', 'float64', 'float64']
+    assert len(got) == len(_wide_reference(distances_parquet, 'distancia', RADIUS))
+
+def _dataset_partitions(dataset_dir):
+    return sorted(os.path.relpath(root, dataset_dir) for root, _, files in os.walk(dataset_dir) if files)
+
+def test_dataset_conversion_replaces_stale_partitions(distances_parquet, tmp_path):
+    dataset_dir = data_loader.convert_distances_to_dataset(distances_parquet)
+    assert 'origem_uf=33/destino_uf=31' in _dataset_partitions(dataset_dir)
+
+    # Nova versão da matriz sem o RJ (33): a partição antiga não pode sobrar
+    df = pd.read_parquet(distances_parquet)
+    df[(df['origem'] // 100000 != 33) & (df['destino'] // 100000 != 33)].to_parquet(distances_parquet)
+    assert data_loader.convert_distances_to_dataset(distances_parquet) == dataset_dir
+    assert not [p for p in _dataset_partitions(dataset_dir) if '33' in p]
+    assert sorted(os.listdir(tmp_path)) == ['dist.parquet', 'dist_particionado']
+
+    got = _sorted(data_loader._load_distances(distances_parquet))
+    assert len(got) == len(pd.read_parquet(distances_parquet))
+
+def test_interrupted_dataset_conversion_is_not_used(distances_parquet, tmp_path, monkeypatch):
+    expected = _sorted(data_loader._load_distances(distances_parquet, max_dist=RADIUS))
+    real_write = data_loader.pq.write_table
+    written = []
+
+    def write_then_fail(*args, **kwargs):
+        if written:
+            raise KeyboardInterrupt
+        written.append(real_write(*args, **kwargs))
+
+    monkeypatch.setattr(data_loader.pq, 'write_table', write_then_fail)
+    with pytest.raises(KeyboardInterrupt):
+        data_loader.convert_distances_to_dataset(distances_parquet)
+
+    # Nada parcial no destino nem temporários esquecidos: a leitura segue no Parquet
+    assert sorted(os.listdir(tmp_path)) == ['dist.parquet']
+    assert data_loader._resolve_distance_dataset(distances_parquet) is None
+    pd.testing.assert_frame_equal(_sorted(data_loader._load_distances(distances_parquet, max_dist=RADIUS)), expected)
@@ -0,0 +1,92 @@
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import report_utils
+
+ROWS = 25
+CHUNK = 7
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Vários blocos (e um bloco final parcial) com poucas linhas
+    monkeypatch.setattr(report_utils, 'EXPORT_CHUNK_ROWS', CHUNK)
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'municipio_id': np.arange(3100000, 3100000 + ROWS, dtype=np.int64),
+        'municipio_nome': [f'São João {i}; "Ação"' for i in range(ROWS)],
+        'populacao': rng.uniform(0, 1e6, ROWS).round(3),
+        # Só nulos no primeiro bloco: o Parquet fixa o esquema no primeiro bloco
+        'campus_mais_proximo': [None] * CHUNK + [f'Campus {i}' for i in range(ROWS - CHUNK)],
+    })
+    df.loc[[3, 15], 'populacao'] = np.nan
+    return df
+
+def read_back(source, fmt):
+    if fmt == 'xlsx':
+        return pd.read_excel(source, sheet_name='Resultados')
+    if fmt == 'parquet':
+        return pd.read_parquet(source)
+    return pd.read_csv(source, sep=';', compression='gzip' if fmt == 'csv.gz' else None)
+
+def assert_same(result, expected):
+    assert list(result.columns) == list(expected.columns)
+    assert len(result) == len(expected)
+    assert (result['municipio_id'].to_numpy() == expected['municipio_id'].to_numpy()).all()
+    assert result['municipio_nome'].tolist() == expected['municipio_nome'].tolist()
+    np.testing.assert_allclose(result['populacao'].to_numpy(dtype=float), expected['populacao'].to_numpy(dtype=float))
+    assert result['campus_mais_proximo'].isna().tolist() == expected['campus_mais_proximo'].isna().tolist()
+    assert result['campus_mais_proximo'].dropna().tolist() == expected['campus_mais_proximo'].dropna().tolist()
+
+@pytest.mark.parametrize('fmt', list(report_utils.EXPORT_WRITERS))
+def test_export_file_round_trip(table, tmp_path, fmt):
+    path = tmp_path / f'solucao.{fmt}'
+    report_utils.export_table(table, str(path), fmt)
+    assert_same(read_back(path, fmt), table)
+
+@pytest.mark.parametrize('fmt', list(report_utils.EXPORT_WRITERS))
+def test_export_bytes_round_trip(table, fmt):
+    content = report_utils.export_bytes(table, fmt)
+    assert_same(read_back(io.BytesIO(content), fmt), table)
+
+@pytest.mark.parametrize('fmt', list(report_utils.EXPORT_WRITERS))
+def test_export_empty_table(table, fmt):
+    empty = table.iloc[:0]
+    result = read_back(io.BytesIO(report_utils.export_bytes(empty, fmt)), fmt)
+    assert list(result.columns) == list(table.columns) and len(result) == 0
+
+def test_parquet_row_group_per_chunk(table):
+    import pyarrow.parquet as pq
+    metadata = pq.ParquetFile(io.BytesIO(report_utils.export_bytes(table, 'parquet'))).metadata
+    assert metadata.num_row_groups == -(-ROWS // CHUNK)
+
+def test_csv_single_header_and_gzip(table):
+    content = report_utils.export_bytes(table, 'csv.gz')
+    text = gzip.decompress(content).decode('utf-8')
+    assert text.count('municipio_id') == 1
+    assert report_utils.export_bytes(table, 'csv').decode('utf-8') == text
+
+def test_unknown_format(table):
+    with pytest.raises(ValueError, match='Formato de exportação desconhecido'):
+        report_utils.export_table(table, io.BytesIO(), 'json')
+
+def test_result_formats_are_exportable():
+    assert set(config.RESULT_FORMATS) <= set(report_utils.EXPORT_WRITERS)
+
+def test_status_table_excel_download():
+    gdf = pd.DataFrame({
+        'id': [1, 2], 'NM_MUN': ['A', 'B'], 'SIGLA_UF': ['MG', 'MG'], 'pop': [10.0, 20.0],
+        'status': ['Novo Campus', 'Sem Cobertura'], 'dist_to_site': [0.0, np.nan], 'geometry': [None, None]
+    })
+    result = pd.read_excel(io.BytesIO(report_utils.generate_excel_download(gdf, 'pop')))
+    assert list(result.columns) == ['ID Município', 'Município', 'UF', 'Demanda', 'Status de Cobertura',
+                                    'Distância/Tempo ao Site (km/min)']
+    assert result['Demanda'].tolist() == [10.0, 20.0]
+    assert result['Status de Cobertura'].tolist() == ['Novo Campus', 'Sem Cobertura']
@@ -0,0 +1,181 @@
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import threading
+import urllib.parse
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import gdown
+import pytest
+
+import config
+import data_manifest
+import fetcher
+
+FILES = {
+    'a.parquet': os.urandom(300_000),
+    'b.parquet': os.urandom(50_000),
+    'c com espaço.parquet': os.urandom(10_000),
+}
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Servidor de arquivos local com suporte a Range e modos de falha por arquivo."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        name = urllib.parse.unquote(self.path.lstrip('/'))
+        server.requests.append((name, self.headers.get('Range')))
+        path = os.path.join(server.root, name)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        offset = 0
+        range_header = self.headers.get('Range')
+        if range_header and server.honor_range:
+            offset = int(range_header.split('=')[1].rstrip('-'))
+            if offset >= len(content):
+                self.send_error(416)
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        body = content[offset:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if name in server.truncate:
+            # Corta a resposta no meio: o cliente recebe IncompleteRead
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+@pytest.fixture
+def mirror(tmp_path):
+    root = tmp_path / 'espelho'
+    root.mkdir()
+    for name, content in FILES.items():
+        (root / name).write_bytes(content)
+    return root
+
+@pytest.fixture
+def server(mirror):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.root = str(mirror)
+    httpd.requests = []
+    httpd.honor_range = True
+    httpd.truncate = set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Pasta de destino com manifesto dos arquivos do espelho."""
+    data = tmp_path / 'clean_data'
+    data.mkdir()
+    manifest = {name: {'tamanho': len(c), 'sha256': hashlib.sha256(c).hexdigest()} for name, c in FILES.items()}
+    manifest_file = tmp_path / 'manifest.json'
+    manifest_file.write_text(json.dumps({'arquivos': manifest}))
+    monkeypatch.setattr(config, 'DATA_DIR', str(data))
+    monkeypatch.setattr(config, 'DATA_MANIFEST_FILE', str(manifest_file))
+    monkeypatch.setattr(data_manifest, '_manifest', None)
+    monkeypatch.setattr(data_manifest, '_results', {})
+    return data
+
+def http_backend(server):
+    return fetcher.HttpBackend(f"http://127.0.0.1:{server.server_address[1]}", timeout=5)
+
+def test_concurrent_fetch_over_http(server, data_dir):
+    paths = [str(data_dir / name) for name in FILES]
+    failures = fetcher.fetch_files(paths, backend=http_backend(server), max_workers=3)
+
+    assert failures == {}
+    for name, content in FILES.items():
+        assert (data_dir / name).read_bytes() == content
+        assert data_manifest.is_verified(data_dir / name)
+    assert not list(data_dir.glob('*.part'))
+
+@pytest.mark.parametrize('honor_range', [True, False])
+def test_resume_from_partial_file(server, data_dir, honor_range):
+    server.honor_range = honor_range
+    content = FILES['a.parquet']
+    (data_dir / 'a.parquet.part').write_bytes(content[:100_000])
+
+    fetcher.fetch_file(str(data_dir / 'a.parquet'), http_backend(server))
+
+    assert (data_dir / 'a.parquet').read_bytes() == content
+    assert server.requests == [('a.parquet', 'bytes=100000-')]
+
+def test_interrupted_response_is_a_fetch_error(server, data_dir):
+    server.truncate.add('b.parquet')
+    paths = [str(data_dir / name) for name in FILES]
+
+    failures = fetcher.fetch_files(paths, backend=http_backend(server), max_workers=3)
+
+    assert list(failures) == [str(data_dir / 'b.parquet')]
+    assert isinstance(failures[str(data_dir / 'b.parquet')], fetcher.FetchError)
+    assert not (data_dir / 'b.parquet').exists()
+    # Os demais arquivos foram baixados normalmente
+    assert (data_dir / 'a.parquet').read_bytes() == FILES['a.parquet']
+
+    # Nova tentativa retoma o .part e completa o arquivo
+    server.truncate.clear()
+    fetcher.fetch_file(str(data_dir / 'b.parquet'), http_backend(server))
+    assert (data_dir / 'b.parquet').read_bytes() == FILES['b.parquet']
+
+def test_incomplete_read_is_wrapped(server, data_dir, monkeypatch):
+    def interrupted_copy(src, dst, length=0):
+        dst.write(src.read(1000))
+        raise http.client.IncompleteRead(b'', 1000)
+    monkeypatch.setattr(shutil, 'copyfileobj', interrupted_copy)
+
+    with pytest.raises(fetcher.FetchError, match='IncompleteRead'):
+        fetcher.fetch_file(str(data_dir / 'a.parquet'), http_backend(server))
+    assert (data_dir / 'a.parquet.part').stat().st_size == 1000
+
+def test_unexpected_backend_error_does_not_escape(data_dir):
+    class BrokenBackend:
+        def fetch(self, name, part_path, offset):
+            raise RuntimeError('erro inesperado')
+
+    failures = fetcher.fetch_files([str(data_dir / 'a.parquet')], backend=BrokenBackend())
+    assert isinstance(failures[str(data_dir / 'a.parquet')], RuntimeError)
+
+def test_hash_mismatch_discards_download(mirror, data_dir):
+    (mirror / 'b.parquet').write_bytes(b'\0' * len(FILES['b.parquet']))
+
+    with pytest.raises(fetcher.FetchError, match='Hash'):
+        fetcher.fetch_file(str(data_dir / 'b.parquet'), fetcher.LocalDirectoryBackend(str(mirror)))
+    assert not (data_dir / 'b.parquet').exists()
+    assert not (data_dir / 'b.parquet.part').exists()
+
+def test_local_directory_backend_resumes(mirror, data_dir):
+    (data_dir / 'a.parquet.part').write_bytes(FILES['a.parquet'][:1234])
+    fetcher.fetch_files([str(data_dir / 'a.parquet')], backend=fetcher.LocalDirectoryBackend(str(mirror)))
+    assert (data_dir / 'a.parquet').read_bytes() == FILES['a.parquet']
+
+def test_missing_file_on_server(server, data_dir):
+    with pytest.raises(fetcher.FetchError, match='HTTP 404'):
+        fetcher.fetch_file(str(data_dir / 'inexistente.parquet'), http_backend(server))
+
+def test_gdown_errors_are_wrapped(data_dir, monkeypatch):
+    def failing_download(*args, **kwargs):
+        raise gdown.exceptions.FileURLRetrievalError('cota excedida')
+    monkeypatch.setattr(gdown, 'download', failing_download)
+    backend = fetcher.GoogleDriveBackend({'a.parquet': 'id-a'})
+
+    with pytest.raises(fetcher.FetchError, match='cota excedida'):
+        backend.fetch('a.parquet', str(data_dir / 'a.parquet.part'), 0)
+    failures = fetcher.fetch_files([str(data_dir / 'a.parquet')], backend=backend)
+    assert isinstance(failures[str(data_dir / 'a.parquet')], fetcher.FetchError)
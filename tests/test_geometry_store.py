@@ -0,0 +1,54 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+import data_loader
+
+TOLERANCES = (0.0, 0.01)
+
+@pytest.fixture
+def shapefile(tmp_path):
+    """Malha sintética: 'círculos' (polígonos com muitos vértices) em MG, SP e RJ."""
+    ids = ['3106200', '3100104', '3550308', '3304557']
+    centers = [(-43.9, -19.9), (-47.0, -18.0), (-46.6, -23.5), (-43.2, -22.9)]
+    gdf = gpd.GeoDataFrame(
+        {'CD_MUN': ids, 'NM_MUN': ['BH', 'Abadia', 'SP', 'Niterói'], 'SIGLA_UF': ['MG', 'MG', 'SP', 'RJ']},
+        geometry=[Point(c).buffer(0.3, quad_segs=64) for c in centers], crs='EPSG:4674'
+    )
+    path = tmp_path / 'municipios.shp'
+    gdf.to_file(path)
+    return str(path)
+
+def _by_id(gdf):
+    return gdf.assign(id=gdf['id'].astype(int)).sort_values('id').reset_index(drop=True)
+
+@pytest.mark.parametrize('uf_filter', [None, 'MG', 35])
+@pytest.mark.parametrize('tolerance', TOLERANCES)
+def test_store_matches_shapefile(shapefile, uf_filter, tolerance):
+    expected = _by_id(data_loader._load_shapefile(shapefile, uf_filter, tolerance))
+    data_loader.convert_shapefile_to_geoparquet(shapefile, TOLERANCES)
+    assert data_loader._load_geometry_store(shapefile, data_loader.uf_code(uf_filter), tolerance) is not None
+
+    got = data_loader._load_shapefile(shapefile, uf_filter, tolerance)
+    assert got['id'].dtype == np.int32
+    got = _by_id(got)
+
+    assert got['id'].tolist() == expected['id'].tolist()
+    assert got['SIGLA_UF'].tolist() == expected['SIGLA_UF'].tolist()
+    assert got.crs == expected.crs
+    assert got.geometry.geom_equals_exact(expected.geometry, tolerance=1e-9).all()
+
+def test_simplification_levels_differ(shapefile):
+    data_loader.convert_shapefile_to_geoparquet(shapefile, TOLERANCES)
+    full = data_loader._load_shapefile(shapefile, 'MG', 0.0)
+    coarse = data_loader._load_shapefile(shapefile, 'MG', 0.01)
+    vertices = lambda g: sum(len(p.exterior.coords) for p in g.geometry)
+    assert vertices(coarse) < vertices(full)
+
+def test_fingerprint_changes_with_store(shapefile):
+    before = data_loader.shapefile_fingerprint(shapefile, 'MG', 0.01)
+    data_loader.convert_shapefile_to_geoparquet(shapefile, TOLERANCES)
+    assert data_loader.shapefile_fingerprint(shapefile, 'MG', 0.01) != before
+    # Sigla e código IBGE da UF apontam para a mesma partição
+    assert data_loader.shapefile_fingerprint(shapefile, 'MG', 0.01) == data_loader.shapefile_fingerprint(shapefile, 31, 0.01)
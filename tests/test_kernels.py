@@ -0,0 +1,69 @@
+import random
+
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+import heuristics
+
+pytest.importorskip('numba')
+
+STRATEGIES = [('best', False), ('best', True), ('first', False)]
+
+def make_instance(seed, num_cand=60, num_nodes=400, density=0.04):
+    """Instância aleatória: matriz de cobertura binária, demandas e cobertura inicial."""
+    rng = np.random.default_rng(seed)
+    cov = sparse_random(num_cand, num_nodes, density=density, format='csr',
+                        random_state=seed, dtype=np.int8)
+    cov.data[:] = 1
+    demand = rng.integers(1, 1000, size=num_nodes).astype(np.int32)
+    initial = (rng.random(num_nodes) < 0.05).astype(np.int32)
+    candidates = list(range(1000, 1000 + num_cand))
+    cand_to_idx = {c: i for i, c in enumerate(candidates)}
+    return candidates, cov, demand, cand_to_idx, initial
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_greedy_backends_match(seed):
+    candidates, cov, demand, cand_to_idx, initial = make_instance(seed)
+    results = {
+        backend: heuristics.greedy_heuristic(candidates, 8, cov, demand, cand_to_idx, initial, backend=backend)
+        for backend in ('numpy', 'numba')
+    }
+    assert results['numpy'] == results['numba']
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+@pytest.mark.parametrize('strategy,random_tie_break', STRATEGIES)
+def test_local_search_backends_match(seed, strategy, random_tie_break):
+    candidates, cov, demand, cand_to_idx, initial = make_instance(seed)
+    start = heuristics.greedy_heuristic(candidates, 8, cov, demand, cand_to_idx, initial, backend='numpy')
+    # Solução inicial fraca para forçar várias trocas
+    start = candidates[:8] if sorted(start) != candidates[:8] else start
+
+    results = {}
+    for backend in ('numpy', 'numba'):
+        np.random.seed(seed)
+        solution, z = heuristics.local_search(
+            start, candidates, cov, demand, cand_to_idx, initial,
+            max_iter=200, strategy=strategy, random_tie_break=random_tie_break, backend=backend)
+        results[backend] = (sorted(solution), int(z))
+
+    assert results['numpy'] == results['numba']
+    solution, z = results['numpy']
+    assert z == heuristics.calculate_z(solution, cov, demand, cand_to_idx, initial)
+
+@pytest.mark.parametrize('ls_strategy', ['best', 'first'])
+def test_vns_backends_match(ls_strategy):
+    candidates, cov, demand, cand_to_idx, initial = make_instance(5)
+    sparse_structures = (cov, demand, cand_to_idx, None, initial)
+
+    results = {}
+    for backend in ('numpy', 'numba'):
+        random.seed(5)
+        np.random.seed(5)
+        solution, z = heuristics.vns(
+            candidates[:8], candidates, None, None, None, k_max=3, max_iter=5, max_no_improv=5,
+            max_time_seconds=None, ls_strategy=ls_strategy,
+            sparse_structures=sparse_structures, backend=backend)
+        results[backend] = (sorted(solution), int(z))
+
+    assert results['numpy'] == results['numba']
@@ -0,0 +1,237 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+import pytest
+from scipy.sparse import random as sparse_random
+from shapely.geometry import box
+
+import coverage_cache
+import map_renderer
+import shared_cache
+
+def make_mesh():
+    """Malha sintética: 2 municípios de MG, 1 de SP e 1 de RJ (quadrados unitários)."""
+    return gpd.GeoDataFrame(
+        {'id': [3106200, 3100104, 3550308, 3304557], 'NM_MUN': ['BH', 'Abadia', 'SP', None],
+         'SIGLA_UF': ['MG', 'MG', 'SP', 'RJ']},
+        geometry=[box(-44, -20, -43, -19), box(-43, -20, -42, -19), box(-47, -24, -46, -23), box(-44, -23, -43, -22)],
+        crs='EPSG:4674'
+    )
+
+# --- Geometria estática (user-042) ---
+
+def test_feature_collection_aligns_attributes_by_id():
+    geometry = map_renderer.StaticGeometry(make_mesh())
+    frame = pd.DataFrame({'id': [3550308, 3106200, 9999999], 'status': ['Novo', 'Existente', 'x'], 'pop': [5.0, np.nan, 1.0]})
+
+    fc = geometry.feature_collection(frame, ['status', 'pop', 'ausente'])
+    props = {f['properties']['NM_MUN']: f['properties'] for f in fc['features']}
+
+    assert len(fc['features']) == 4
+    assert props['SP'] == {'NM_MUN': 'SP', 'SIGLA_UF': 'SP', 'status': 'Novo', 'pop': 5.0}
+    assert props['BH']['status'] == 'Existente' and props['BH']['pop'] is None
+    assert props['Abadia']['status'] is None
+    assert fc['features'][3]['properties']['NM_MUN'] is None
+
+def test_feature_collection_subset_and_geometry():
+    mesh = make_mesh()
+    geometry = map_renderer.StaticGeometry(mesh)
+    fc = geometry.feature_collection(None, ['status'], ids=[3304557])
+
+    assert len(fc['features']) == 1
+    feature = fc['features'][0]
+    assert feature['properties'] == {'NM_MUN': None, 'SIGLA_UF': 'RJ'}
+    assert feature['geometry'] == mesh.to_crs('EPSG:4326').geometry.iloc[3].__geo_interface__
+
+def test_static_geometry_built_once_per_mesh(monkeypatch):
+    cache = shared_cache.SharedCache(10**9)
+    monkeypatch.setattr(shared_cache, 'get_shared_cache', lambda: cache)
+    builds = []
+    monkeypatch.setattr(map_renderer, 'StaticGeometry', lambda gdf: builds.append(1) or object())
+    mesh = make_mesh()
+
+    first = map_renderer.get_static_geometry('malha_inexistente.shp', 'MG', 0.005, mesh)
+    second = map_renderer.get_static_geometry('malha_inexistente.shp', 31, 0.005, mesh)
+    other_level = map_renderer.get_static_geometry('malha_inexistente.shp', 'MG', 0.02, mesh)
+
+    assert first is second and first is not other_level
+    assert len(builds) == 2
+
+# --- Status de cobertura e rótulos "Coberto por" (user-043) ---
+
+def legacy_status(node_ids, coverage_map, existing_ids, new_ids):
+    """Status por município como no laço original (dicionário de conjuntos)."""
+    status = {i: 'Uncovered' for i in node_ids}
+    for site in existing_ids:
+        if site in status:
+            status[site] = 'Existing_Site'
+        for covered in coverage_map.get(site, set()):
+            if covered in status and status[covered] != 'Existing_Site':
+                status[covered] = 'Existing_Covered'
+    for site in new_ids:
+        if status.get(site) != 'Existing_Site':
+            status[site] = 'New_Site_Overlapping' if status.get(site) == 'Existing_Covered' else 'New_Site'
+        for covered in coverage_map.get(site, set()):
+            if status.get(covered) not in ('Existing_Site', 'Existing_Covered', 'New_Site', 'New_Site_Overlapping'):
+                status[covered] = 'New_Covered'
+    return [status[i] for i in node_ids]
+
+def legacy_labels(node_ids, coverage_map, site_labels):
+    campuses = {}
+    for site, label in site_labels.items():
+        for city in coverage_map.get(site, set()):
+            campuses.setdefault(city, []).append(label)
+    return [", ".join(sorted(campuses[i])) if i in campuses else "Nenhum" for i in node_ids]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_status_and_labels_match_legacy_loops(seed):
+    rng = np.random.default_rng(seed)
+    node_ids = list(range(100, 160))
+    existing = [int(x) for x in rng.choice(node_ids, 4, replace=False)]
+    candidates = [i for i in node_ids if i not in existing]
+    new = [int(x) for x in rng.choice(candidates, 5, replace=False)]
+
+    def random_csr(rows):
+        m = sparse_random(rows, len(node_ids), density=0.08, format='csr', random_state=int(rng.integers(1 << 30)))
+        m.data[:] = 1
+        return m.astype(np.int8)
+    sparse_structures = (random_csr(len(candidates)), None, {c: k for k, c in enumerate(candidates)},
+                         {n: k for k, n in enumerate(node_ids)}, None)
+    existing_structures = (random_csr(len(existing)), {s: k for k, s in enumerate(existing)})
+
+    sites = set(existing) | set(new)
+    coverage_map = coverage_cache.site_coverage(sites, sparse_structures, existing_structures)
+    matrix, site_ids, nodes = coverage_cache.coverage_matrix(sites, sparse_structures, existing_structures)
+
+    codes = map_renderer.coverage_status(matrix, site_ids, nodes, existing, new)
+    assert map_renderer.STATUS_LABELS[codes].tolist() == legacy_status(node_ids, coverage_map, existing, new)
+
+    site_labels = {s: f"Campus {s} ({'Existente' if s in existing else 'Novo'})" for s in site_ids.tolist()}
+    labels = map_renderer.covering_labels(matrix, [site_labels[s] for s in site_ids.tolist()])
+    assert labels.tolist() == legacy_labels(node_ids, coverage_map, site_labels)
+
+# --- Escala de calor (user-044) ---
+
+def legacy_heat_color(values):
+    """Cor por valor como no get_heat_color original (apply linha a linha)."""
+    positive = [v for v in values if v > 0]
+    if not positive:
+        return [[200, 200, 200, 50] for _ in values]
+    min_log, max_log = np.log(max(min(positive), 1)), np.log(max(max(positive), 1))
+    colors = []
+    for val in values:
+        if val <= 0:
+            colors.append([200, 200, 200, 50])
+            continue
+        norm = 0.5 if max_log == min_log else (np.log(max(val, 1)) - min_log) / (max_log - min_log)
+        colors.append([255, int(255 * (1 - norm)), int(200 * (1 - norm)), 200])
+    return colors
+
+@pytest.mark.parametrize('values', [
+    np.random.default_rng(0).lognormal(8, 2, size=500),
+    np.array([0.0, -3.0, 10.0, 10.0]),
+    np.array([0.0, 0.0]),
+    np.array([0.5, 1.0, 1e6, np.nan]),
+])
+def test_heat_colors_match_legacy_formula(values):
+    colors = map_renderer.heat_colors(values)
+    expected = np.array(legacy_heat_color(np.nan_to_num(values, nan=0.0)), dtype=np.int64)
+
+    assert colors.dtype == np.uint8 and colors.shape == (len(values), 4)
+    # Diferença máxima de uma unidade (quantização em 256 níveis)
+    assert np.abs(colors.astype(np.int64) - expected).max() <= 1
+    assert (colors[~(values > 0)] == map_renderer.NO_DEMAND_COLOR).all()
+
+def test_heat_colors_cached_per_demand_and_mesh(monkeypatch):
+    cache = shared_cache.SharedCache(10**9)
+    monkeypatch.setattr(shared_cache, 'get_shared_cache', lambda: cache)
+    values = np.array([0.0, 10.0, 1000.0])
+
+    colors, max_value = map_renderer.get_heat_colors('demanda-a', 'malha.shp', 'MG', 'pop', values)
+    again, _ = map_renderer.get_heat_colors('demanda-a', 'malha.shp', 'MG', 'pop', values * 2)
+    other, other_max = map_renderer.get_heat_colors('demanda-b', 'malha.shp', 'MG', 'pop', values * 2)
+
+    assert max_value == 1000.0 and other_max == 2000.0
+    assert again is colors and other is not colors
+    with pytest.raises(ValueError):
+        colors[0, 0] = 1
+
+# --- Busca (user-045) ---
+
+class Coords:
+    def __init__(self, points):
+        self.points = points
+
+    def mean(self, ids):
+        found = [self.points[i] for i in ids if i in self.points]
+        return tuple(np.mean(found, axis=0)) if found else None
+
+def test_search_view_zooms_and_highlights():
+    geometry = map_renderer.StaticGeometry(make_mesh())
+    default = pdk.ViewState(latitude=-15, longitude=-50, zoom=4)
+    coords = Coords({3106200: (-19.5, -43.5)})
+
+    assert map_renderer.search_view(default, geometry, coords, None) == (default, [])
+
+    view, layers = map_renderer.search_view(default, geometry, coords, 3106200)
+    assert (view.latitude, view.longitude, view.zoom) == (-19.5, -43.5, map_renderer.SEARCH_ZOOM)
+    assert len(layers) == 1
+    features = layers[0].data['features']
+    assert [f['properties']['NM_MUN'] for f in features] == ['BH']
+
+    # Sem coordenadas: mantém a vista; sem geometria: sem destaque
+    view, layers = map_renderer.search_view(default, geometry, coords, 3550308)
+    assert view is default and len(layers) == 1
+    view, layers = map_renderer.search_view(default, geometry, coords, 9999999)
+    assert view is default and layers == []
+
+def test_tooltips_reference_demand_column():
+    assert '{pop_15_17}' in map_renderer.coverage_tooltip('pop_15_17')['html']
+    assert '{pop_15_17}' in map_renderer.demand_tooltip('pop_15_17')['html']
+
+# --- Agregados por UF (user-046) ---
+
+def test_uf_aggregates_match_groupby():
+    rng = np.random.default_rng(3)
+    ids = np.concatenate([31 * 100000 + np.arange(40), 35 * 100000 + np.arange(25), 33 * 100000 + np.arange(10)])
+    gdf = pd.DataFrame({'id': ids, 'pop': rng.integers(0, 1000, len(ids)).astype(float),
+                        'status_code': rng.integers(0, 6, len(ids))})
+    gdf.loc[3, 'pop'] = np.nan
+
+    frame = map_renderer.uf_aggregates(gdf, 'pop').set_index('id')
+    pop = gdf['pop'].fillna(0)
+    grouped = gdf.assign(uf=gdf['id'] // 100000, pop=pop, coberta=pop.where(gdf['status_code'] != map_renderer.UNCOVERED, 0))
+    expected = grouped.groupby('uf').agg(municipios=('id', 'size'), pop=('pop', 'sum'), coberta=('coberta', 'sum'))
+
+    assert frame.index.tolist() == [31, 33, 35]
+    np.testing.assert_array_equal(frame['municipios'], expected['municipios'])
+    np.testing.assert_allclose(frame['pop'], expected['pop'])
+    np.testing.assert_allclose(frame['demanda_coberta'], expected['coberta'])
+    for code, column in enumerate(map_renderer.UF_STATUS_COLUMNS):
+        counts = grouped[grouped['status_code'] == code].groupby('uf').size().reindex(frame.index, fill_value=0)
+        np.testing.assert_array_equal(frame[column], counts)
+    share = expected['coberta'] / expected['pop']
+    assert frame['cobertura'].tolist() == [f"{100 * v:.1f}%" for v in share]
+    assert all(len(c) == 4 and all(0 <= x <= 255 for x in c) for c in frame['fill_color'])
+
+def test_uf_geometry_dissolves_municipalities(monkeypatch):
+    cache = shared_cache.SharedCache(10**9)
+    monkeypatch.setattr(shared_cache, 'get_shared_cache', lambda: cache)
+    mesh = make_mesh()
+
+    uf_geometry = map_renderer.get_uf_geometry('malha.shp', 0.005, mesh)
+    assert uf_geometry.ids.tolist() == [31, 33, 35]
+    assert map_renderer.get_uf_geometry('malha.shp', 0.005, mesh) is uf_geometry
+
+    frame = pd.DataFrame({'id': [31, 35], 'municipios': [2, 1]})
+    fc = uf_geometry.feature_collection(frame, ['municipios'])
+    props = [f['properties'] for f in fc['features']]
+    assert [(p['SIGLA_UF'], p['municipios']) for p in props] == [('MG', 2), ('RJ', None), ('SP', 1)]
+    # MG: dois quadrados adjacentes dissolvidos em um único polígono
+    assert fc['features'][0]['geometry']['type'] == 'Polygon'
+
+def test_map_level():
+    assert map_renderer.map_level(None, None) == map_renderer.LEVEL_UF
+    assert map_renderer.map_level('MG', None) == map_renderer.LEVEL_MUNICIPALITY
+    assert map_renderer.map_level(None, 3106200) == map_renderer.LEVEL_MUNICIPALITY
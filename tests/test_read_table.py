@@ -0,0 +1,62 @@
+import io
+
+import pandas as pd
+import pytest
+
+import data_loader
+
+ROWS = pd.DataFrame({
+    'cod_ibge': [3106200, 3550308, 3304557],
+    'nome': ['Belo Horizonte', 'São Paulo', 'Niterói; RJ'],
+    'populacao': [2315560, 11451999, 481749],
+})
+
+class Upload(io.BytesIO):
+    """Imitação do UploadedFile do Streamlit (getvalue + name)."""
+
+    def __init__(self, content, name):
+        super().__init__(content)
+        self.name = name
+
+def csv_bytes(sep, encoding):
+    return ROWS.to_csv(sep=sep, index=False).encode(encoding)
+
+@pytest.mark.parametrize('sep', [';', ',', '\t', '|'])
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'latin1'])
+def test_sniff_and_read_upload(sep, encoding):
+    content = csv_bytes(sep, encoding)
+    assert data_loader.sniff_csv(content[:data_loader.SNIFF_BYTES]) == (
+        sep, 'utf-8' if encoding == 'utf-8' else encoding)
+
+    df = data_loader._read_table(Upload(content, 'demanda.csv'))
+    pd.testing.assert_frame_equal(df, ROWS)
+
+def test_latin1_after_the_sniffed_sample(tmp_path):
+    # Amostra inicial em ASCII puro; o caractere latin1 só aparece depois dela
+    filler = pd.DataFrame({'cod_ibge': range(4000), 'nome': ['x'] * 4000, 'populacao': 1})
+    df = pd.concat([filler, ROWS], ignore_index=True)
+    path = tmp_path / 'demanda.csv'
+    path.write_bytes(df.to_csv(sep=';', index=False).encode('latin1'))
+
+    got = data_loader._read_table(str(path))
+    assert got['nome'].iloc[-1] == 'Niterói; RJ'
+    assert len(got) == len(df)
+
+def test_parquet_path_and_upload(tmp_path):
+    path = tmp_path / 'demanda.parquet'
+    ROWS.to_parquet(path)
+    pd.testing.assert_frame_equal(data_loader._read_table(str(path)), ROWS)
+    pd.testing.assert_frame_equal(data_loader._read_table(Upload(path.read_bytes(), 'x.PARQUET')), ROWS)
+
+def test_read_table_is_read_once_per_content(monkeypatch):
+    calls = []
+    real_read = data_loader._read_table
+    monkeypatch.setattr(data_loader, '_read_table', lambda source: calls.append(1) or real_read(source))
+    content = csv_bytes(';', 'utf-8') + b'9999999;Teste;1\n'   # conteúdo único neste processo
+
+    first = data_loader.read_table(Upload(content, 'a.csv'))
+    second = data_loader.read_table(Upload(content, 'outro_nome.csv'))
+    first['nova'] = 1
+
+    assert len(calls) == 1
+    assert 'nova' not in second.columns and 'nova' not in data_loader.read_table(Upload(content, 'a.csv')).columns
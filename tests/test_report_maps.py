@@ -0,0 +1,69 @@
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from PIL import Image
+from shapely.geometry import MultiPolygon, Polygon, box
+
+import report_utils
+import shared_cache
+
+@pytest.fixture
+def mesh():
+    """Quadrado com buraco, multipolígono de duas partes e quadrado simples."""
+    holed = Polygon([(0, 0), (4, 0), (4, 4), (0, 4)], holes=[[(1, 1), (3, 1), (3, 3), (1, 3)]])
+    multi = MultiPolygon([box(5, 0, 6, 1), box(7, 0, 8, 1)])
+    return gpd.GeoDataFrame(
+        {'id': [3106200, 3100104, 3550308], 'status_code': [0, 2, 5], 'pop': [100.0, 0.0, 5000.0]},
+        geometry=[holed, multi, box(0, 5, 1, 6)], crs='EPSG:4326'
+    )
+
+def test_map_paths_keep_holes_and_parts(mesh):
+    paths = report_utils.MapPaths(mesh.geometry.values)
+
+    assert len(paths.paths) == 3
+    assert paths.extent == (0, 8, 0, 6)
+    # Exterior anti-horário e buraco horário, mesmo com o buraco na mesma orientação na entrada
+    holed = paths.paths[0]
+    ext, hole = holed.vertices[:5], holed.vertices[5:]
+    signed_area = lambda ring: np.sum(ring[:-1, 0] * ring[1:, 1] - ring[1:, 0] * ring[:-1, 1]) / 2
+    assert signed_area(ext) > 0 and signed_area(hole) < 0
+    # Um MOVETO por anel: exterior + buraco, duas partes, um anel
+    moves = [int((p.codes == p.MOVETO).sum()) for p in paths.paths]
+    assert moves == [2, 2, 1]
+
+def test_holes_are_not_filled(mesh):
+    paths = report_utils.MapPaths(mesh.geometry.values[:1])
+    fig, ax = report_utils._map_figure(paths, ['#000000'], 'none', 0, (2, 2))
+    ax.set_position([0, 0, 1, 1])
+    ax.set_aspect('auto')
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba())[..., :3]
+    h, w = pixels.shape[:2]
+    # Centro do buraco (2, 2) em branco; anel (0.5, 0.5) preenchido
+    assert pixels[h // 2, w // 2].min() == 255
+    assert pixels[h - 1 - h // 8, w // 8].max() == 0
+
+def test_map_paths_cached_per_mesh(mesh, monkeypatch):
+    cache = shared_cache.SharedCache(10**9)
+    monkeypatch.setattr(shared_cache, 'get_shared_cache', lambda: cache)
+
+    first = report_utils.get_map_paths(mesh)
+    assert report_utils.get_map_paths(mesh.copy()) is first
+    assert report_utils.get_map_paths(mesh.iloc[:2]) is not first
+
+def test_report_maps_are_rgb_pngs(mesh, monkeypatch):
+    monkeypatch.setattr(shared_cache, 'get_shared_cache', lambda: shared_cache.SharedCache(10**9))
+    coverage_future, heat_future = report_utils.render_report_maps(mesh, 'pop')
+
+    for future in (coverage_future, heat_future):
+        image = Image.open(future.result())
+        assert image.format == 'PNG' and image.mode == 'RGB'
+        assert min(image.size) > 100
+        # Não é uma imagem em branco: há cores da malha
+        assert len(np.unique(np.asarray(image).reshape(-1, 3), axis=0)) > 2
+
+def test_heatmap_without_positive_demand(mesh, monkeypatch):
+    monkeypatch.setattr(shared_cache, 'get_shared_cache', lambda: shared_cache.SharedCache(10**9))
+    image = Image.open(report_utils.create_static_heatmap_image(mesh.assign(pop=0.0), 'pop'))
+    assert image.mode == 'RGB'
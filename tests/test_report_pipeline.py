@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+import report_pipeline
+import shared_cache
+from report_pipeline import FAILED, READY, RUNNING
+
+@pytest.fixture
+def pipeline():
+    return report_pipeline.ReportPipeline(shared_cache.SharedCache(10**9), max_workers=2)
+
+def wait(pipeline, kind, fingerprint, params, builder):
+    """Pede o artefato, espera o job (se agendado) e pede de novo."""
+    pipeline.request(kind, fingerprint, params, builder)
+    future = pipeline._jobs.get((kind, fingerprint, params))
+    if future is not None:
+        future.exception(timeout=10)
+    return pipeline.request(kind, fingerprint, params, builder)
+
+def test_running_then_ready_builds_once(pipeline):
+    release = threading.Event()
+    calls = []
+
+    def builder():
+        calls.append(1)
+        release.wait(10)
+        return b'pdf'
+
+    # Pedidos repetidos enquanto o job roda (várias sessões/atualizações): um único build
+    assert pipeline.request('pdf', 'fp', (), builder) == (RUNNING, None)
+    assert pipeline.request('pdf', 'fp', (), builder) == (RUNNING, None)
+    release.set()
+    assert wait(pipeline, 'pdf', 'fp', (), builder) == (READY, b'pdf')
+    assert pipeline.request('pdf', 'fp', (), builder) == (READY, b'pdf')
+    assert len(calls) == 1
+
+def test_ready_served_from_store_after_job_is_popped(pipeline):
+    assert wait(pipeline, 'xlsx', 'fp', ('pop',), lambda: b'x') == (READY, b'x')
+    assert ('xlsx', 'fp', ('pop',)) not in pipeline._jobs
+    assert pipeline.request('xlsx', 'fp', ('pop',), lambda: pytest.fail('reconstruído')) == (READY, b'x')
+
+    # Descartado do store: gerado de novo
+    pipeline.store.clear()
+    assert wait(pipeline, 'xlsx', 'fp', ('pop',), lambda: b'y') == (READY, b'y')
+
+def test_failed_job_is_kept_during_retry_window(pipeline):
+    calls = []
+
+    def builder():
+        calls.append(1)
+        raise ValueError('sem dados')
+
+    state, error = wait(pipeline, 'html', 'fp', (), builder)
+    assert state == FAILED and isinstance(error, ValueError)
+    for _ in range(3):
+        state, error = pipeline.request('html', 'fp', (), builder)
+        assert state == FAILED and isinstance(error, ValueError)
+    assert len(calls) == 1
+    # A falha não vai para o store e não prende a chave (shared_cache.get_or_load libera o lock)
+    assert pipeline.store.get(('html', 'fp', ())) is None
+
+def test_failed_job_is_rescheduled_after_retry_window(pipeline, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(report_pipeline.time, 'monotonic', lambda: now[0])
+    attempts = []
+
+    def builder():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise MemoryError('dois PDFs ao mesmo tempo')
+        return b'pdf'
+
+    state, error = wait(pipeline, 'pdf', 'fp', (), builder)
+    assert state == FAILED and isinstance(error, MemoryError)
+
+    now[0] += pipeline.retry_seconds - 1
+    assert pipeline.request('pdf', 'fp', (), builder)[0] == FAILED
+    assert len(attempts) == 1
+
+    # Passada a janela: o próximo pedido agenda o job de novo
+    now[0] += 1
+    assert wait(pipeline, 'pdf', 'fp', (), builder) == (READY, b'pdf')
+    assert len(attempts) == 2
+    assert pipeline._failed_at == {} and pipeline._jobs == {}
+
+def test_keys_are_independent(pipeline):
+    assert wait(pipeline, 'pdf', 'a', (), lambda: b'a') == (READY, b'a')
+    assert wait(pipeline, 'pdf', 'b', (), lambda: b'b') == (READY, b'b')
+    assert wait(pipeline, 'pdf', 'a', ('outro',), lambda: b'c') == (READY, b'c')
@@ -0,0 +1,131 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+
+from shared_cache import SharedCache, digest
+
+def test_values_are_read_only():
+    cache = SharedCache(max_bytes=10**9)
+    cache.put('k', (np.arange(3), csr_matrix(np.eye(2)), {1: 10}, pd.DataFrame({'a': [1, 2]})))
+    arr, mat, mapping, df = cache.get('k')
+
+    with pytest.raises(ValueError):
+        arr[0] = 5
+    with pytest.raises(ValueError):
+        mat.data[0] = 5
+    assert isinstance(mapping, MappingProxyType)
+    with pytest.raises(TypeError):
+        mapping[1] = 20
+
+    # Cópia rasa + Copy-on-Write: alterações no DataFrame recebido não chegam ao cache
+    df['b'] = 0
+    df.loc[0, 'a'] = 99
+    cached_df = cache.get('k')[3]
+    assert list(cached_df.columns) == ['a']
+    assert cached_df['a'].tolist() == [1, 2]
+
+def test_loader_runs_once_under_concurrency():
+    cache = SharedCache(max_bytes=10**9)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return np.arange(10)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_load('k', loader), range(16)))
+
+    assert len(calls) == 1
+    assert all((r == np.arange(10)).all() for r in results)
+    assert cache._key_locks == {}
+
+def test_failed_loader_releases_key_lock():
+    cache = SharedCache(max_bytes=10**9)
+
+    def failing():
+        raise RuntimeError('falha')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('k', failing)
+    assert cache._key_locks == {}
+    assert cache.get_or_load('k', lambda: 42) == 42
+
+def test_lru_eviction_by_size():
+    cache = SharedCache(max_bytes=2 * 8000)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, np.zeros(1000))
+    cache.get('b')
+    cache.put('d', np.zeros(1000))
+
+    assert cache.get('a') is None and cache.get('c') is None
+    assert cache.get('b') is not None and cache.get('d') is not None
+    assert cache.total_bytes == 2 * 8000
+
+def test_value_larger_than_budget_is_not_cached():
+    cache = SharedCache(max_bytes=1000)
+    cache.put('small', np.zeros(10))
+    big = cache.put('big', np.zeros(10**6))
+
+    assert big.shape == (10**6,)
+    assert cache.get('big') is None
+    assert cache.get('small') is not None
+    assert cache.total_bytes == 80
+
+    calls = []
+    loader = lambda: calls.append(1) or np.zeros(10**6)
+    cache.get_or_load('big', loader)
+    cache.get_or_load('big', loader)
+    assert len(calls) == 2 and cache._key_locks == {}
+
+def test_waiter_and_new_caller_share_key_lock_after_failure():
+    cache = SharedCache(max_bytes=10**9)
+    started_a, release_a = threading.Event(), threading.Event()
+    started_b, release_b = threading.Event(), threading.Event()
+    active, peak, calls = [0], [0], []
+
+    def failing():
+        started_a.set()
+        release_a.wait(10)
+        raise RuntimeError('falha')
+
+    def loader():
+        calls.append(1)
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        started_b.set()
+        release_b.wait(10)
+        active[0] -= 1
+        return 42
+
+    def call(fn):
+        try:
+            return cache.get_or_load('k', fn)
+        except RuntimeError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        a = pool.submit(call, failing)
+        started_a.wait(10)
+        b = pool.submit(call, loader)      # espera no lock da chave
+        time.sleep(0.1)
+        release_a.set()                    # A falha; B assume o carregamento
+        started_b.wait(10)
+        c = pool.submit(call, loader)      # chega depois da falha: deve esperar B
+        time.sleep(0.1)
+        release_b.set()
+        results = [f.result(10) for f in (a, b, c)]
+
+    assert results == [None, 42, 42]
+    assert peak[0] == 1 and len(calls) == 1
+    assert cache._key_locks == {}
+
+def test_digest_is_deterministic():
+    assert digest('x', (1, 2), None) == digest('x', (1, 2), None)
+    assert digest('x', 1) != digest('x1')